@@ -0,0 +1,90 @@
+"""
+Microbenchmark: cost of validating a STATE_DELTA_JSON against DELTA_SCHEMA.
+
+Times the compiled validator on a typical small delta, a large one and one
+full of rejected fields, next to the shape check the state store already runs
+(check_delta). If the jsonschema package happens to be installed it is timed
+too, for comparison.
+
+Usage:
+  python scripts/bench_delta_schema.py
+  python scripts/bench_delta_schema.py --n 50000
+"""
+
+import argparse
+import time
+
+from delta_schema import DELTA_SCHEMA, validate_delta
+from state_store import check_delta
+
+def small_delta():
+    return {
+        "time_advance": {"watch": "evening"},
+        "facts_add": ["The ford at Greywater is guarded by river wardens."],
+        "npcs_upsert": [{"id": "npc_warden_ilsa", "name": "Ilsa", "role": "warden", "attitude": "wary", "location": "region_001"}],
+    }
+
+def large_delta():
+    return {
+        "time_advance": {"day": 12, "watch": "morning"},
+        "party_move": {"region_id": "region_002", "site_id": None},
+        "discover": {
+            "regions": [{"region_id": f"region_{i:03d}", "party_name": f"Vale {i}"} for i in range(5)],
+            "sites": [{"site_id": f"site_{i}", "region_id": "region_002"} for i in range(10)],
+            "factions": [{"faction_id": "faction_river_wardens"}],
+        },
+        "quests_add": [{"id": f"q{i}", "title": f"Quest {i}", "status": "active"} for i in range(10)],
+        "quests_update": [{"id": f"q{i}", "status": "completed", "notes": "Done."} for i in range(5)],
+        "facts_add": [f"Fact {i} about the corridor." for i in range(30)],
+        "npcs_upsert": [{"id": f"npc_{i}", "name": f"NPC {i}", "attitude": "friendly"} for i in range(20)],
+        "notes_add": [f"Note {i}" for i in range(10)],
+    }
+
+def bad_delta():
+    return {
+        "time_advance": {"day": "three", "watch": "Dusk"},
+        "party_move": {"region_id": 2},
+        "quests_add": [{"title": "No id"}, {"id": "q1", "title": "Ok", "status": "active"}],
+        "facts_add": ["ok", 7, None],
+        "npcs_upsert": [{"name": "Nobody"}],
+        "inventory_add": ["rope"],
+    }
+
+def per_call_us(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000, help="Validations per case")
+    args = ap.parse_args()
+
+    try:
+        import jsonschema
+        js = jsonschema.Draft7Validator(DELTA_SCHEMA)
+    except ImportError:
+        js = None
+
+    header = f"{'delta':<8}{'fields':>7}{'rejected':>10}{'validate_delta':>16}{'check_delta':>13}"
+    print(header + (f"{'jsonschema':>12}" if js else "") + "   (us per delta)")
+    for name, make in (("small", small_delta), ("large", large_delta), ("bad", bad_delta)):
+        delta = make()
+        _, errors = validate_delta(delta)
+        fields = sum(len(v) if isinstance(v, (list, dict)) else 1 for v in delta.values())
+        v_us = per_call_us(lambda: validate_delta(delta), args.n)
+
+        def shape():
+            try:
+                check_delta(delta)
+            except ValueError:
+                pass
+        c_us = per_call_us(shape, args.n)
+        row = f"{name:<8}{fields:>7}{len(errors):>10}{v_us:>16.2f}{c_us:>13.2f}"
+        if js:
+            row += f"{per_call_us(lambda: list(js.iter_errors(delta)), max(1, args.n // 10)):>12.2f}"
+        print(row)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Microbenchmark: label lookups on printed character-sheet text.
+
+Runs every lookup parse_printed_pc makes two ways: rescanning the text per
+label with find_line_value / parse_basic_int (a regex per call), and
+through one LabelIndex built in a single pass. Checks that both give the
+same answers. Sheets are synthetic, padded with filler pages the way long
+multi-page exports are, unless PDFs are given.
+
+Usage:
+  python scripts/bench_label_scan.py
+  python scripts/bench_label_scan.py --pages 1 10 50 --n 50
+  python scripts/bench_label_scan.py sheets/A_PRINTED.pdf
+"""
+
+import argparse
+import time
+
+from pdf_to_party import LabelIndex, find_line_value, parse_basic_int, parse_printed_pc, read_pdf_text
+
+# parse_printed_pc's lookups: ("value", label) or ("int", labels, default).
+LOOKUPS = [
+    ("value", "Character Name"), ("value", "Name"), ("value", "Race"), ("value", "Class"),
+    ("value", "Alignment"), ("value", "Deity"), ("value", "Patron"), ("int", ["Level"], 1),
+    ("value", "Gender"), ("value", "Sex"), ("int", ["Age"], 0), ("value", "Size"), ("value", "Height"),
+    ("value", "Weight"), ("value", "Eyes"), ("value", "Hair"), ("value", "Skin"),
+    ("int", ["HP", "Hit Points", "Current HP"], 0), ("int", ["Max HP", "HP Max", "Total HP"], 0),
+    ("value", "AC"), ("value", "Armor Class"), ("value", "Touch"), ("value", "Touch AC"),
+    ("value", "Flat-Footed"), ("value", "Flat Footed"),
+    ("int", ["Speed", "Base Speed"], 30), ("int", ["Initiative", "Init"], 0),
+    ("value", "Fort"), ("value", "Fortitude"), ("value", "Ref"), ("value", "Reflex"), ("value", "Will"),
+    ("int", ["BAB", "Base Attack Bonus"], 0), ("int", ["Grapple"], 0), ("value", "Languages"),
+    ("value", "Total Weight"), ("value", "Total Wt"), ("value", "Weight Carried"),
+    ("int", ["Light Load"], 0), ("int", ["Medium Load"], 0), ("int", ["Heavy Load"], 0),
+]
+
+SHEET = """Character Name: Aedwen Marris
+Race Human
+Class Cleric
+Level 5
+Alignment Neutral Good
+Deity St. Cuthbert
+Gender Female
+Age 27
+Size Medium
+STR 12 DEX 10 CON 14 INT 10 WIS 17 CHA 13
+HP 31
+Max HP 36
+Armor Class 19
+Touch 10
+Flat-Footed 19
+Fortitude 6
+Reflex 1
+Will 7
+Base Attack Bonus 3
+Grapple 4
+Speed 20
+Initiative 0
+Heavy Mace +4 1d8+1 x2
+Concentration 10
+Heal 9
+Feats
+Extra Turning, Combat Casting
+Languages Common, Celestial
+Total Weight 61.5
+Light Load 43
+Medium Load 86
+Heavy Load 130
+"""
+
+FILLER = "\n".join(
+    f"Spell {i}: Range close (25 ft. + 5 ft./2 levels); Duration {i} rounds; Saving Throw none. "
+    "The caster channels positive energy into a creature touched." for i in range(45)
+)
+
+def sheet_text(pages):
+    return SHEET + "\n".join(FILLER for _ in range(pages - 1))
+
+def rescan(text):
+    out = []
+    for kind, *args in LOOKUPS:
+        out.append(find_line_value(text, args[0]) if kind == "value" else parse_basic_int(text, args[0], args[1]))
+    return out
+
+def indexed(text):
+    labels = LabelIndex(text)
+    out = []
+    for kind, *args in LOOKUPS:
+        out.append(labels.value(args[0]) if kind == "value" else labels.basic_int(args[0], args[1]))
+    return out
+
+def per_call_ms(fn, text, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn(text)
+    return (time.perf_counter() - start) / n * 1000.0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, nargs="+", default=[1, 5, 20, 60], help="Synthetic sheet sizes")
+    ap.add_argument("--n", type=int, default=20, help="Repetitions per case")
+    ap.add_argument("pdfs", nargs="*", help="Benchmark these PDFs' text instead")
+    args = ap.parse_args()
+
+    cases = [(p, read_pdf_text(p)) for p in args.pdfs] or [(f"{p} page(s)", sheet_text(p)) for p in args.pages]
+    print(f"{'sheet':<24}{'chars':>9}{'rescan':>10}{'index':>10}{'speedup':>9}{'parse_pc':>10}{'same':>6}   (ms per sheet)")
+    for name, text in cases:
+        same = rescan(text) == indexed(text)
+        r_ms = per_call_ms(rescan, text, args.n)
+        i_ms = per_call_ms(indexed, text, args.n)
+        p_ms = per_call_ms(lambda t: parse_printed_pc(t, "bench.pdf"), text, args.n)
+        print(f"{name[:23]:<24}{len(text):>9}{r_ms:>10.2f}{i_ms:>10.2f}{r_ms / i_ms:>8.1f}x{p_ms:>10.2f}{'yes' if same else 'NO':>6}")
+
+if __name__ == "__main__":
+    main()
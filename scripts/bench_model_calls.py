@@ -0,0 +1,83 @@
+"""
+Smoke test and benchmark for model-call resilience.
+
+Starts the stub LLM server in-process with injected faults and drives the
+http backend against it: every scenario must complete all calls (retries
+absorb the 503s and dropped connections), and the hedged scenario should cut
+the tail latency that the slow requests cause. The retry and hedge rules
+themselves are asserted by scripts/check_model_calls.py.
+
+Usage:
+  python scripts/bench_model_calls.py
+  python scripts/bench_model_calls.py --calls 200 --stream
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+from llm_backends import OpenAICompatibleBackend
+from stub_llm_server import make_server
+
+MESSAGES = [
+    {"role": "system", "content": "You are a GM."},
+    {"role": "user", "content": "PLAYER ACTIONS / INTENT:\nWe cross the ford at dawn."},
+]
+
+# name, server faults, backend options
+SCENARIOS = [
+    ("clean", {}, {}),
+    ("errors", {"error_rate": 0.15, "drop_rate": 0.05}, {}),
+    ("slow tail", {"slow_rate": 0.03, "slow_ms": 400}, {}),
+    ("slow tail, hedged", {"slow_rate": 0.03, "slow_ms": 400}, {"hedge_after_ms": "p95"}),
+]
+
+def pct(sorted_values, p):
+    return sorted_values[max(0, min(len(sorted_values) - 1, -(-p * len(sorted_values) // 100) - 1))]
+
+def run(name, faults, opts, calls, stream, seed):
+    server = make_server(port=0, latency_ms=20, seed=seed, quiet=True, **faults)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    backend = OpenAICompatibleBackend(base_url=f"http://{host}:{port}/v1", model="stub", backoff_s=0.05, **opts)
+
+    latencies, failures = [], 0
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        try:
+            if stream:
+                text = "".join(backend.stream(MESSAGES))
+            else:
+                text = backend.complete(MESSAGES)
+            assert "GM_NARRATION:" in text and "STATE_DELTA_JSON:" in text
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+        except Exception as e:
+            failures += 1
+            print(f"  [{name}] call failed: {type(e).__name__}: {e}", file=sys.stderr)
+    backend.close()
+    server.shutdown()
+    server.server_close()
+
+    v = sorted(latencies) or [0.0]
+    t = backend.totals
+    print(f"{name:<20}{t['calls']:>6}{failures:>6}{t['retries']:>8}{t['hedges']:>7}{t['hedge_wins']:>6}"
+          f"{pct(v, 50):>9.1f}{pct(v, 95):>9.1f}{pct(v, 99):>9.1f}")
+    return failures
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=100)
+    ap.add_argument("--stream", action="store_true", help="Use streamed calls instead of complete()")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    print(f"{'scenario':<20}{'calls':>6}{'fail':>6}{'retries':>8}{'hedges':>7}{'won':>6}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    failures = sum(run(name, faults, opts, args.calls, args.stream, args.seed) for name, faults, opts in SCENARIOS)
+    if failures:
+        print(f"{failures} calls failed")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Microbenchmark: per-turn cost of applying a STATE_DELTA_JSON as the campaign
+grows.
+
+Compares the old behaviour (deepcopy of the whole state before applying),
+copy-on-write apply_delta, and the StateStore path (in place, persistent
+StateIndex, journal append with fsync). First checks that reopening a store
+(checkpoint + journal replay) gives the same state the live run had, and
+exits non-zero if it doesn't.
+
+Usage:
+  python scripts/bench_state.py
+  python scripts/bench_state.py --turns 500
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+
+from state_store import StateStore, apply_delta
+
+SIZES = [(100, 10), (1000, 100), (10000, 1000)]
+
+def make_state(n_facts, n_npcs):
+    return {
+        "party": {"location": {"region_id": "region_001", "site_id": None}},
+        "time": {"day": 1, "watch": "morning"},
+        "discovered": {"regions": {"region_001": {}}, "sites": {}, "factions": {}},
+        "quests": [{"id": f"q{i}", "title": f"Quest {i}", "status": "active"} for i in range(n_npcs // 2)],
+        "facts": [f"Fact number {i} about the valley corridor." for i in range(n_facts)],
+        "npcs": {f"npc_{i}": {"name": f"NPC {i}", "role": "villager", "location": "region_001"} for i in range(n_npcs)},
+        "notes": [f"Note {i}" for i in range(n_facts // 10)],
+    }
+
+def make_delta(turn, n_npcs):
+    return {
+        "time_advance": {"watch": ["morning", "afternoon", "evening", "night"][turn % 4]},
+        "facts_add": [f"New fact from turn {turn}.", "Fact number 5 about the valley corridor."],
+        "npcs_upsert": [{"id": f"npc_{turn % n_npcs}", "attitude": "friendly"}, {"id": f"new_npc_{turn}", "name": "Stranger"}],
+        "quests_update": [{"id": "q1", "status": "active", "notes": f"turn {turn}"}],
+        "notes_add": [f"Turn {turn} note."],
+    }
+
+# Deltas whose replay has gone wrong before: one that adds a quest and
+# updates it in the same turn.
+REPLAY_DELTAS = [
+    {"quests_add": [{"id": "q_warden", "title": "Meet the warden", "status": "active"}],
+     "quests_update": [{"id": "q_warden", "notes": "met warden"}]},
+    {"quests_update": [{"id": "q_warden", "status": "done", "notes": "paid the toll"}],
+     "facts_add": ["The warden takes tolls in salt."]},
+]
+
+def check_replay(n_facts=100, n_npcs=10, turns=20):
+    """
+    Commit deltas to a store, reopen it from disk and compare. Returns the
+    list of delta indexes after which live and replayed state differ.
+    """
+    deltas = REPLAY_DELTAS + [make_delta(turn, n_npcs) for turn in range(turns)]
+    bad = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "current.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(make_state(n_facts, n_npcs), f)
+        store = StateStore(path, checkpoint_every=10 ** 9).open()
+        for i, delta in enumerate(deltas):
+            live = store.commit(delta, i)
+            replayed = StateStore(path, checkpoint_every=10 ** 9).open()
+            if json.dumps(replayed.state, sort_keys=True) != json.dumps(live, sort_keys=True):
+                bad.append(i)
+            # Not close(): that would checkpoint under the live store.
+            replayed._journal.close()
+        store.close()
+    return bad
+
+def per_turn_us(fn, turns):
+    t0 = time.perf_counter()
+    for turn in range(turns):
+        fn(turn)
+    return (time.perf_counter() - t0) / turns * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=200)
+    args = ap.parse_args()
+
+    bad = check_replay()
+    if bad:
+        print(f"replayed state differs from live state after delta(s) {bad}")
+        sys.exit(1)
+    print("replay check: reopened state matches the live state")
+
+    print(f"{'facts':>7} {'npcs':>6} {'deepcopy':>12} {'copy-on-write':>14} {'store apply':>12} {'store+fsync':>12}   (us/turn)")
+    for n_facts, n_npcs in SIZES:
+        base = make_state(n_facts, n_npcs)
+
+        state = copy.deepcopy(base)
+        def old(turn):
+            nonlocal state
+            state = apply_delta(copy.deepcopy(state), make_delta(turn, n_npcs), in_place=True)
+        t_old = per_turn_us(old, args.turns)
+
+        state = copy.deepcopy(base)
+        def cow(turn):
+            nonlocal state
+            state = apply_delta(state, make_delta(turn, n_npcs))
+        t_cow = per_turn_us(cow, args.turns)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "current.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(base, f)
+            store = StateStore(path, checkpoint_every=10 ** 9).open()
+            t_apply = per_turn_us(lambda turn: store._apply(make_delta(turn, n_npcs)), args.turns)
+            t_commit = per_turn_us(lambda turn: store.commit(make_delta(turn, n_npcs), turn), args.turns)
+            store._journal.close()
+
+        print(f"{n_facts:>7} {n_npcs:>6} {t_old:>12.1f} {t_cow:>14.1f} {t_apply:>12.1f} {t_commit:>12.1f}")
+
+if __name__ == "__main__":
+    main()
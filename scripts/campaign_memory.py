@@ -0,0 +1,208 @@
+"""
+Rolling campaign memory: keeps the prompt roughly constant in size however
+long the campaign runs.
+
+state["facts"] and state["notes"] only ever grow, and every turn's narration
+is new history. When enough has piled up (FOLD_MIN facts or notes past the
+KEEP_* limits, or NARRATION_EVERY turns since the last fold) the GM loop runs
+a compaction in the background:
+
+- the oldest facts and notes, and the narration of the turns since the last
+  fold, are ingested into their own Chroma collection (campaign_memory), so
+  they can still be recalled by similarity when a turn touches them;
+- they are folded into state["memory"]["summary"], a short running summary
+  written by the model (or extractively when there is no model);
+- a "memory_compact" delta drops the folded facts and notes from the state,
+  through the state journal like any other change.
+
+The prompt then carries the summary, the newest KEEP_FACTS facts and
+KEEP_NOTES notes, and the few originals recalled for the current turn.
+"""
+
+import hashlib
+import re
+
+from prompt_builder import estimate_tokens
+
+MEMORY_COLLECTION = "campaign_memory"
+KEEP_FACTS = 40
+KEEP_NOTES = 20
+FOLD_MIN = 20
+NARRATION_EVERY = 25
+SUMMARY_TOKENS = 500
+RECALL_K = 4
+# Narration per turn handed to the summarizer; the full text is ingested.
+NARRATION_EXCERPT = 600
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s")
+
+SUMMARY_RULES = f"""
+You maintain the running memory of a D&D 3.5e campaign.
+You are given the current memory summary and new material: facts, GM notes and narration excerpts from recent turns.
+Rewrite the summary so it also covers the new material.
+- Keep what matters for future play: promises, debts, open threats, relationships, where things are, what the party learned.
+- Drop colour and blow-by-blow detail; the originals stay searchable.
+- Never invent anything that is not in the input.
+- Plain bullet points, at most {SUMMARY_TOKENS * 3 // 4} words. Output only the summary.
+"""
+
+def _hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+def clip_lines(lines, budget=SUMMARY_TOKENS):
+    """
+    Keep the newest lines that fit in budget tokens.
+    """
+    kept, used = [], 0
+    for line in reversed(lines):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return list(reversed(kept))
+
+def first_sentences(text, limit=200):
+    out = ""
+    for sentence in SENTENCE_RE.split(" ".join(text.split())):
+        if out and len(out) + len(sentence) > limit:
+            break
+        out = f"{out} {sentence}".strip()
+    return out[:limit]
+
+class ExtractiveSummarizer:
+    """
+    No-model fallback: appends the new material as bullets and keeps the
+    newest that fit the summary budget.
+    """
+
+    def summarize(self, summary, facts, notes, narrations):
+        lines = [l for l in summary.splitlines() if l.strip()]
+        lines += [f"- {f}" for f in facts]
+        lines += [f"- (note) {n}" for n in notes]
+        lines += [f"- Turn {t:04d}: {first_sentences(text)}" for t, text in narrations if text]
+        return "\n".join(clip_lines(lines))
+
+class ModelSummarizer:
+    def __init__(self, backend, fallback=None):
+        self.backend = backend
+        self.fallback = fallback or ExtractiveSummarizer()
+
+    def summarize(self, summary, facts, notes, narrations):
+        parts = [f"CURRENT SUMMARY:\n{summary or '(empty)'}"]
+        if facts:
+            parts.append("FACTS:\n" + "\n".join(f"- {f}" for f in facts))
+        if notes:
+            parts.append("GM NOTES:\n" + "\n".join(f"- {n}" for n in notes))
+        if narrations:
+            parts.append("NARRATION:\n" + "\n\n".join(
+                f"[Turn {t:04d}] {text[:NARRATION_EXCERPT]}" for t, text in narrations if text
+            ))
+        try:
+            text = self.backend.complete([
+                {"role": "system", "content": SUMMARY_RULES},
+                {"role": "user", "content": "\n\n".join(parts)},
+            ]).strip()
+        except Exception:
+            text = ""
+        if not text:
+            return self.fallback.summarize(summary, facts, notes, narrations)
+        return "\n".join(clip_lines(text.splitlines(), budget=SUMMARY_TOKENS))
+
+def read_narration(entry):
+    """
+    The narration of one turn, read from its public log at the offset the
+    session index recorded.
+    """
+    if not entry or not entry.get("public"):
+        return ""
+    try:
+        with open(entry["public"], "rb") as f:
+            f.seek(entry.get("narration_offset") or 0)
+            return f.read().decode("utf-8", "replace").strip()
+    except OSError:
+        return ""
+
+class CampaignMemory:
+    def __init__(self, client, embedder, summarizer=None, collection_name=MEMORY_COLLECTION):
+        self.collection = client.get_or_create_collection(collection_name)
+        self.embedder = embedder
+        self.summarizer = summarizer or ExtractiveSummarizer()
+        self.size = self.collection.count()
+
+    def plan(self, state, last_turn):
+        """
+        What a compaction would fold now, or None if it isn't due. Call from
+        the thread that owns state; the result is a snapshot.
+        """
+        facts = state.get("facts") or []
+        notes = state.get("notes") or []
+        mem = state.get("memory") or {}
+        through = mem.get("through_turn", 0)
+        n_facts = max(0, len(facts) - KEEP_FACTS)
+        n_notes = max(0, len(notes) - KEEP_NOTES)
+        if n_facts < FOLD_MIN and n_notes < FOLD_MIN and last_turn - through < NARRATION_EVERY:
+            return None
+        return {
+            "summary": mem.get("summary", ""),
+            "facts": list(facts[:n_facts]),
+            "notes": list(notes[:n_notes]),
+            "turns": list(range(through + 1, last_turn + 1)),
+            "through_turn": last_turn,
+        }
+
+    def compact(self, plan, entries):
+        """
+        Ingest the originals and write the new summary (slow: embeddings and
+        a model call; run in a worker thread). entries maps turn -> session
+        index entry. Returns (memory_compact delta, stats).
+        """
+        narrations = [(t, read_narration(entries.get(t))) for t in plan["turns"]]
+        ids, docs, metas = [], [], []
+        for fact in plan["facts"]:
+            ids.append(f"fact:{_hash(fact)}")
+            docs.append(fact)
+            metas.append({"kind": "fact", "turn": plan["through_turn"]})
+        for note in plan["notes"]:
+            ids.append(f"note:{_hash(note)}")
+            docs.append(note)
+            metas.append({"kind": "note", "turn": plan["through_turn"]})
+        for t, text in narrations:
+            if text:
+                ids.append(f"turn:{t:04d}")
+                docs.append(text)
+                metas.append({"kind": "narration", "turn": t})
+        if ids:
+            self.collection.upsert(ids=ids, documents=docs, metadatas=metas, embeddings=self.embedder.embed(docs))
+            self.size = self.collection.count()
+
+        summary = self.summarizer.summarize(plan["summary"], plan["facts"], plan["notes"], narrations)
+        delta = {"memory_compact": {
+            "facts_drop": len(plan["facts"]),
+            "notes_drop": len(plan["notes"]),
+            "summary": summary,
+            "through_turn": plan["through_turn"],
+        }}
+        stats = {
+            "facts": len(plan["facts"]),
+            "notes": len(plan["notes"]),
+            "turns": len(plan["turns"]),
+            "ingested": len(ids),
+            "summary_tokens": estimate_tokens(summary),
+        }
+        return delta, stats
+
+    def recall(self, text, k=RECALL_K):
+        """
+        Up to k folded originals most similar to text, as {id, doc, meta,
+        distance} chunks.
+        """
+        if not self.size:
+            return []
+        vec = self.embedder.embed_query(text)
+        res = self.collection.query(query_embeddings=[vec], n_results=min(k, self.size))
+        distances = (res.get("distances") or [[None] * len(res["ids"][0])])[0]
+        return [
+            {"id": cid, "doc": doc, "meta": meta or {}, "distance": dist}
+            for cid, doc, meta, dist in zip(res["ids"][0], res["documents"][0], res["metadatas"][0], distances)
+        ]
@@ -0,0 +1,292 @@
+"""
+Streaming chapter compiler.
+
+Public turn files are copied into the chapter outputs in fixed-size chunks,
+so memory use does not depend on turn or chapter size, and every requested
+format (markdown, single-file HTML) is written in the same pass over the
+inputs.
+
+The chapter state remembers, per format, which turns are already compiled,
+the byte offset where the footer starts and the size and mtime the file was
+left with. An incremental compile checks that the file is still exactly as
+it was left, truncates the footer, opens the file for appending and writes
+only the new turns and a fresh footer. Markdown keeps the "Compiled from
+turns" line under the title, where it has always been: the line is written
+padded with room for TURN_LIST_ROOM more turns and rewritten in place on
+append. A file that changed on disk, or a turn list that outgrew its room,
+gets a full compile instead.
+"""
+
+import html
+import os
+
+CHUNK_SIZE = 64 * 1024
+TURN_LIST_ROOM = 32
+FORMATS = ("md", "html")
+
+HTML_STYLE = (
+    "body{font-family:Georgia,serif;max-width:46em;margin:2em auto;padding:0 1em;line-height:1.5}"
+    "pre{background:#f4f1ea;padding:.6em;white-space:pre-wrap}"
+    "hr{border:0;border-top:1px solid #ccc;margin:2em 0}"
+)
+
+def turn_list(turns):
+    return ", ".join(f"{t:04d}" for t in turns)
+
+class MarkdownWriter:
+    ext = "md"
+    # The header lists the compiled turns, so an append rewrites it.
+    header_lists_turns = True
+
+    def __init__(self, out):
+        self.out = out
+        self.slot = None
+
+    @staticmethod
+    def turns_line(turns):
+        return f"_Compiled from turns: {turn_list(turns)}_".encode("utf-8")
+
+    def header(self, title, turns):
+        # (offset, width) of the padded turn list line, for rewrite_slot().
+        self.out.write(f"# {title}\n\n".encode("utf-8"))
+        line = self.turns_line(turns)
+        self.slot = (self.out.tell(), len(line) + len(", 0000") * TURN_LIST_ROOM)
+        self.out.write(line.ljust(self.slot[1]) + b"\n\n")
+
+    def begin_turn(self, turn_n):
+        pass
+
+    def feed(self, text):
+        self.out.write(text.encode("utf-8"))
+
+    def end_turn(self):
+        self.out.write(b"\n\n---\n\n")
+
+    def missing(self, turn_n):
+        self.out.write(f"## Missing turn_{turn_n:04d}.md\n\n---\n\n".encode("utf-8"))
+
+    def footer(self, turns):
+        pass
+
+class HtmlWriter:
+    """
+    Minimal line-based markdown -> HTML: headings, fenced code blocks, list
+    items and paragraphs, which is all a public turn file contains.
+    """
+
+    ext = "html"
+    header_lists_turns = False
+
+    def __init__(self, out):
+        self.out = out
+        self.slot = None
+        self.partial = ""
+        self.in_code = False
+        self.in_list = False
+        self.in_para = False
+
+    def _w(self, s):
+        self.out.write(s.encode("utf-8"))
+
+    def header(self, title, turns):
+        t = html.escape(title)
+        self._w(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{t}</title>"
+                f"<style>{HTML_STYLE}</style></head><body>\n<h1>{t}</h1>\n")
+
+    def begin_turn(self, turn_n):
+        self._w(f"<section id=\"turn-{turn_n:04d}\">\n")
+
+    def _close_blocks(self):
+        if self.in_list:
+            self._w("</ul>\n")
+            self.in_list = False
+        if self.in_para:
+            self._w("</p>\n")
+            self.in_para = False
+
+    def _line(self, line):
+        if line.startswith("```"):
+            self._close_blocks()
+            self._w("</pre>\n" if self.in_code else "<pre>")
+            self.in_code = not self.in_code
+            return
+        if self.in_code:
+            self._w(html.escape(line) + "\n")
+            return
+        stripped = line.strip()
+        if not stripped:
+            self._close_blocks()
+            return
+        if stripped.startswith("#"):
+            self._close_blocks()
+            level = min(len(stripped) - len(stripped.lstrip("#")) + 1, 6)
+            self._w(f"<h{level}>{html.escape(stripped.lstrip('#').strip())}</h{level}>\n")
+            return
+        if stripped.startswith("- "):
+            if self.in_para:
+                self._w("</p>\n")
+                self.in_para = False
+            if not self.in_list:
+                self._w("<ul>\n")
+                self.in_list = True
+            self._w(f"<li>{html.escape(stripped[2:])}</li>\n")
+            return
+        if self.in_list:
+            self._w("</ul>\n")
+            self.in_list = False
+        self._w(("" if self.in_para else "<p>") + html.escape(stripped) + "\n")
+        self.in_para = True
+
+    def feed(self, text):
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            self._line(line)
+
+    def end_turn(self):
+        if self.partial:
+            self._line(self.partial)
+            self.partial = ""
+        if self.in_code:
+            self._w("</pre>\n")
+            self.in_code = False
+        self._close_blocks()
+        self._w("</section>\n<hr>\n")
+
+    def missing(self, turn_n):
+        self._w(f"<section><h2>Missing turn_{turn_n:04d}.md</h2></section>\n<hr>\n")
+
+    def footer(self, turns):
+        self._w(f"<p><em>Compiled from turns: {turn_list(turns)}</em></p>\n</body></html>\n")
+
+WRITERS = {"md": MarkdownWriter, "html": HtmlWriter}
+
+def stream_turn(path, writers):
+    """
+    Feed one turn file to every writer in CHUNK_SIZE pieces, with the same
+    leading/trailing whitespace trimming the old f.read().strip() did.
+    Trailing whitespace of each chunk is held back until more text follows.
+    """
+    started = False
+    held = ""
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if not started:
+                chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+                started = True
+            body = chunk.rstrip()
+            if not body:
+                # All whitespace: trailing unless text follows in a later chunk.
+                held += chunk
+                continue
+            text = held + body
+            held = chunk[len(body):]
+            for w in writers:
+                w.feed(text)
+
+def turn_path(turn_n, public_dir, index=None):
+    entry = index.get(turn_n) if index is not None else None
+    if entry and entry.get("public"):
+        return entry["public"]
+    return os.path.join(public_dir, f"turn_{turn_n:04d}.md")
+
+def file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+def rewrite_slot(path, slot, line):
+    """
+    Overwrite the padded header line at slot = (offset, width) in place.
+    """
+    with open(path, "r+b") as f:
+        f.seek(slot[0])
+        f.write(line.ljust(slot[1]))
+
+def compile_chapter(ch, public_dir, chapters_dir, formats=FORMATS, index=None, incremental=True):
+    """
+    Compile the chapter described by chapter state ch into chapters_dir,
+    one file per format. Updates ch["compiled"][fmt] = {"turns", "offset",
+    "stamp", "slot"} (the caller saves ch). Returns {fmt: (path, mode)} with
+    mode "full", "incremental" or "unchanged".
+    """
+    slug = ch.get("slug")
+    title = ch.get("title")
+    turns = list(ch.get("turns", []))
+    compiled = ch.setdefault("compiled", {})
+    os.makedirs(chapters_dir, exist_ok=True)
+
+    results = {}
+    outputs = []
+    # Formats may resume at different turns; the single pass over turns below
+    # feeds each turn file to every format that still needs it.
+    for fmt in formats:
+        writer = WRITERS[fmt]
+        path = os.path.join(chapters_dir, f"{slug}.{writer.ext}")
+        prev = compiled.get(fmt) or {}
+        done = prev.get("turns", [])
+        stamp = file_stamp(path)
+        slot = prev.get("slot")
+        can_append = (
+            incremental
+            and done
+            and turns[:len(done)] == done
+            # Untouched since the last compile: same size and mtime.
+            and stamp is not None
+            and stamp == prev.get("stamp")
+            and 0 < prev.get("offset", 0) <= stamp[0]
+            and (not writer.header_lists_turns or (slot and len(writer.turns_line(turns)) <= slot[1]))
+        )
+        if can_append and len(done) == len(turns):
+            results[fmt] = (path, "unchanged")
+            continue
+        if can_append:
+            os.truncate(path, prev["offset"])  # drop the old footer
+            out = open(path, "ab")
+            w = writer(out)
+            w.slot = slot
+        else:
+            out = open(path, "wb")
+            w = writer(out)
+            w.header(title, turns)
+        start = len(done) if can_append else 0
+        results[fmt] = (path, "incremental" if can_append else "full")
+        outputs.append((fmt, out, w, start, path))
+
+    try:
+        if outputs:
+            first = min(o[3] for o in outputs)
+            for pos in range(first, len(turns)):
+                t = turns[pos]
+                active = [o[2] for o in outputs if pos >= o[3]]
+                p = turn_path(t, public_dir, index)
+                if not os.path.exists(p):
+                    for w in active:
+                        w.missing(t)
+                    continue
+                for w in active:
+                    w.begin_turn(t)
+                stream_turn(p, active)
+                for w in active:
+                    w.end_turn()
+
+        for fmt, out, w, _, _ in outputs:
+            out.flush()
+            offset = out.tell()
+            w.footer(turns)
+            compiled[fmt] = {"turns": turns, "offset": offset, "slot": w.slot}
+    finally:
+        for _, out, _, _, _ in outputs:
+            out.close()
+    for fmt, _, w, start, path in outputs:
+        if start and w.header_lists_turns:
+            rewrite_slot(path, w.slot, w.turns_line(turns))
+        compiled[fmt]["stamp"] = file_stamp(path)
+    return results
@@ -0,0 +1,157 @@
+"""
+Checks for the streaming chapter compiler.
+
+Each check writes public turn files into a temporary directory, compiles a
+chapter with a small CHUNK_SIZE so that turn files span many chunks, and
+compares the markdown with what reading each file whole and stripping it
+gives. The incremental checks also assert that an append leaves the file in
+place (same inode) and that anything else gets a full compile. Exits
+non-zero if any check fails.
+
+Usage:
+  python scripts/check_chapter_compiler.py
+"""
+
+import os
+import sys
+import tempfile
+
+import chapter_compiler
+from chapter_compiler import TURN_LIST_ROOM, compile_chapter, turn_list
+
+CHUNK_SIZE = 8
+
+def expected_markdown(title, texts):
+    out = f"# {title}\n\n_Compiled from turns: {turn_list(sorted(texts))}_\n\n"
+    for t in sorted(texts):
+        out += texts[t].strip() + "\n\n---\n\n"
+    return out
+
+class Chapter:
+    """
+    A temporary public/ and chapters/ pair and the chapter state for one check.
+    """
+
+    def __init__(self, title="The Ford"):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.public_dir = os.path.join(self.tmp.name, "public")
+        self.chapters_dir = os.path.join(self.tmp.name, "chapters")
+        os.makedirs(self.public_dir)
+        self.ch = {"active": True, "slug": "ford", "title": title, "turns": []}
+        self.texts = {}
+
+    def add_turn(self, turn_n, text):
+        with open(os.path.join(self.public_dir, f"turn_{turn_n:04d}.md"), "w", encoding="utf-8") as f:
+            f.write(text)
+        self.texts[turn_n] = text
+        self.ch["turns"].append(turn_n)
+
+    def path(self, fmt="md"):
+        return os.path.join(self.chapters_dir, f"ford.{fmt}")
+
+    def compile(self, formats=("md",), **kwargs):
+        results = compile_chapter(self.ch, self.public_dir, self.chapters_dir, formats=formats, **kwargs)
+        return {fmt: mode for fmt, (_, mode) in results.items()}
+
+    def read(self, fmt="md"):
+        with open(self.path(fmt), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def markdown(self):
+        # The turn list line is padded for in-place rewrites.
+        lines = self.read().split("\n")
+        lines[2] = lines[2].rstrip(" ")
+        return "\n".join(lines)
+
+    def assert_matches(self):
+        got, want = self.markdown(), expected_markdown(self.ch["title"], self.texts)
+        assert got == want, f"compiled markdown differs:\n got {got!r}\nwant {want!r}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.tmp.cleanup()
+
+def check_trailing_whitespace_across_chunks():
+    # The whitespace run starts mid-chunk and fills whole chunks after it.
+    with Chapter() as c:
+        c.add_turn(1, "# Turn 0001\nabc" + " \n" * CHUNK_SIZE * 3)
+        c.add_turn(2, "   \n\n" + "Second turn." + "\n" * (CHUNK_SIZE * 2 + 3))
+        c.compile()
+        c.assert_matches()
+
+def check_inner_whitespace_across_chunks():
+    with Chapter() as c:
+        c.add_turn(1, "one" + " " * (CHUNK_SIZE * 2 + 1) + "two\n\n\n" + "\n" * CHUNK_SIZE + "three\n")
+        c.compile()
+        c.assert_matches()
+
+def check_incremental_appends_in_place():
+    with Chapter() as c:
+        c.add_turn(1, "# Turn 0001\nThe ford.\n")
+        c.add_turn(2, "# Turn 0002\nThe bank.\n")
+        assert c.compile(formats=("md", "html")) == {"md": "full", "html": "full"}
+        inodes = {fmt: os.stat(c.path(fmt)).st_ino for fmt in ("md", "html")}
+        c.add_turn(3, "# Turn 0003\nThe lantern.\n")
+        modes = c.compile(formats=("md", "html"))
+        assert modes == {"md": "incremental", "html": "incremental"}, f"modes {modes}"
+        for fmt in ("md", "html"):
+            assert os.stat(c.path(fmt)).st_ino == inodes[fmt], f"{fmt} was replaced, not appended to"
+        c.assert_matches()
+        # The header padding depends on when the file was last compiled in full.
+        appended = {"md": c.markdown(), "html": c.read("html")}
+        assert c.compile(formats=("md", "html")) == {"md": "unchanged", "html": "unchanged"}
+        assert c.compile(formats=("md", "html"), incremental=False) == {"md": "full", "html": "full"}
+        assert c.markdown() == appended["md"], "incremental md differs from a full compile"
+        assert c.read("html") == appended["html"], "incremental html differs from a full compile"
+
+def check_changed_file_compiles_full():
+    with Chapter() as c:
+        c.add_turn(1, "# Turn 0001\nThe ford.\n")
+        c.compile()
+        with open(c.path(), "a", encoding="utf-8") as f:
+            f.write("edited by hand\n")
+        c.add_turn(2, "# Turn 0002\nThe bank.\n")
+        assert c.compile() == {"md": "full"}, "appended to a file changed since the last compile"
+        c.assert_matches()
+
+def check_turn_list_outgrows_header():
+    with Chapter() as c:
+        c.add_turn(1, "# Turn 0001\n")
+        c.compile()
+        modes = []
+        for t in range(2, TURN_LIST_ROOM + 3):
+            c.add_turn(t, f"# Turn {t:04d}\n")
+            modes.append(c.compile()["md"])
+            c.assert_matches()
+        assert modes[:TURN_LIST_ROOM] == ["incremental"] * TURN_LIST_ROOM, f"modes {modes}"
+        assert modes[TURN_LIST_ROOM] == "full", "appended past the room left in the header"
+
+CHECKS = [
+    check_trailing_whitespace_across_chunks,
+    check_inner_whitespace_across_chunks,
+    check_incremental_appends_in_place,
+    check_changed_file_compiles_full,
+    check_turn_list_outgrows_header,
+]
+
+def main():
+    chapter_compiler.CHUNK_SIZE = CHUNK_SIZE
+    failed = 0
+    for check in CHECKS:
+        name = check.__name__[len("check_"):]
+        try:
+            check()
+        except Exception as exc:
+            failed += 1
+            detail = str(exc) if isinstance(exc, AssertionError) else f"{type(exc).__name__}: {exc}"
+            print(f"FAIL  {name}: {detail}")
+        else:
+            print(f"ok    {name}")
+    print(f"{len(CHECKS) - failed}/{len(CHECKS)} checks passed")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
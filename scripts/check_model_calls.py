@@ -0,0 +1,173 @@
+"""
+Checks for the retry and hedging rules of the model backends.
+
+Each check starts the stub LLM server in-process with a fixed fault script
+(the faults of the first requests, in arrival order) and drives the http
+backend against it, then asserts on the result, the backend's counters and
+the number of requests the server saw. Exits non-zero if any check fails;
+scripts/bench_model_calls.py measures the latencies.
+
+Usage:
+  python scripts/check_model_calls.py
+"""
+
+import sys
+import threading
+import time
+
+from llm_backends import BackendError, OpenAICompatibleBackend, canned_response
+from stub_llm_server import make_server
+
+MESSAGES = [
+    {"role": "system", "content": "You are a GM."},
+    {"role": "user", "content": "PLAYER ACTIONS / INTENT:\nWe cross the ford at dawn."},
+]
+EXPECTED = canned_response(MESSAGES)
+
+HEDGE_MS = 100
+SLOW_MS = 1500
+
+class Stub:
+    """
+    A stub server and an http backend pointed at it, for one check.
+    """
+
+    def __init__(self, script=(), backend_opts=None, **server_opts):
+        self.server = make_server(port=0, script=script, quiet=True, **server_opts)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address
+        self.backend = OpenAICompatibleBackend(
+            base_url=f"http://{host}:{port}/v1", model="stub", backoff_s=0.01, **(backend_opts or {}))
+
+    @property
+    def requests(self):
+        return self.server.stats["requests"]
+
+    def timed(self, fn):
+        t0 = time.perf_counter()
+        result = fn()
+        return result, (time.perf_counter() - t0) * 1000.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.backend.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+def check_retry_then_succeed():
+    # A drop on a reused keep-alive connection is a stale connection, not a
+    # failed call, so the drop comes first, on a fresh one.
+    with Stub(script=["drop", "error"], backend_opts={"retries": 3}) as s:
+        text = s.backend.complete(MESSAGES)
+        assert text == EXPECTED, "wrong text after retries"
+        assert s.backend.last_call["retries"] == 2, f"retries {s.backend.last_call['retries']}, expected 2"
+        assert s.requests == 3, f"server saw {s.requests} requests, expected 3"
+
+def check_retry_limit_raises():
+    with Stub(script=["error"] * 5, backend_opts={"retries": 2}) as s:
+        try:
+            s.backend.complete(MESSAGES)
+        except BackendError as exc:
+            assert exc.status == 503, f"raised status {exc.status}, expected 503"
+        else:
+            raise AssertionError("complete() succeeded past the retry limit")
+        assert s.requests == 3, f"server saw {s.requests} requests, expected 3 (1 + 2 retries)"
+        assert s.backend.totals["retries"] == 2, f"retries {s.backend.totals['retries']}, expected 2"
+        assert s.backend.totals["failures"] == 1, f"failures {s.backend.totals['failures']}, expected 1"
+
+def check_stream_retry_limit_raises():
+    with Stub(script=["error"] * 5, backend_opts={"retries": 1}) as s:
+        try:
+            "".join(s.backend.stream(MESSAGES))
+        except BackendError:
+            pass
+        else:
+            raise AssertionError("stream() succeeded past the retry limit")
+        assert s.requests == 2, f"server saw {s.requests} requests, expected 2 (1 + 1 retry)"
+
+def check_no_hedge_when_fast():
+    with Stub(backend_opts={"hedge_after_ms": HEDGE_MS}) as s:
+        assert s.backend.complete(MESSAGES) == EXPECTED, "wrong text"
+        assert not s.backend.last_call["hedged"], "hedged a call that answered before the threshold"
+        assert s.requests == 1, f"server saw {s.requests} requests, expected 1"
+
+def check_hedge_returns_first_success():
+    with Stub(script=["slow"], slow_ms=SLOW_MS, backend_opts={"hedge_after_ms": HEDGE_MS}) as s:
+        text, ms = s.timed(lambda: s.backend.complete(MESSAGES))
+        call = s.backend.last_call
+        assert text == EXPECTED, "wrong text from hedged call"
+        assert call["hedged"] and call["hedge_won"], f"hedged={call['hedged']} hedge_won={call['hedge_won']}, expected both"
+        assert ms < SLOW_MS, f"took {ms:.0f} ms; waited for the slow primary"
+        assert s.requests == 2, f"server saw {s.requests} requests, expected 2"
+
+def check_hedge_failure_keeps_primary():
+    # The hedge fails fast; the slow primary's answer must still be used.
+    with Stub(script=["slow", "error"], slow_ms=400, backend_opts={"hedge_after_ms": HEDGE_MS}) as s:
+        text = s.backend.complete(MESSAGES)
+        call = s.backend.last_call
+        assert text == EXPECTED, "wrong text"
+        assert call["hedged"] and not call["hedge_won"], f"hedged={call['hedged']} hedge_won={call['hedge_won']}"
+        assert call["retries"] == 0, f"retried {call['retries']} times; the primary succeeded"
+
+def check_stream_hedged_before_first_token():
+    with Stub(script=["slow"], slow_ms=SLOW_MS, backend_opts={"hedge_after_ms": HEDGE_MS}) as s:
+        text, ms = s.timed(lambda: "".join(s.backend.stream(MESSAGES)))
+        call = s.backend.last_call
+        assert text == EXPECTED, "hedged stream text is wrong (mixed or repeated output?)"
+        assert call["hedged"] and call["hedge_won"], f"hedged={call['hedged']} hedge_won={call['hedge_won']}"
+        assert ms < SLOW_MS, f"took {ms:.0f} ms; waited for the slow primary"
+
+def check_stream_not_hedged_after_first_token():
+    # First token at once, then text slower than the threshold in total.
+    with Stub(tokens_per_s=400, backend_opts={"hedge_after_ms": 20}) as s:
+        text, ms = s.timed(lambda: "".join(s.backend.stream(MESSAGES)))
+        assert text == EXPECTED, "wrong text"
+        assert ms > 20 * 3, f"stream took only {ms:.0f} ms; the check needs it slower than the threshold"
+        assert not s.backend.last_call["hedged"], "hedged a stream after its first token"
+        assert s.requests == 1, f"server saw {s.requests} requests, expected 1"
+
+def check_stream_not_retried_after_first_token():
+    with Stub(script=["cut"], backend_opts={"retries": 3}) as s:
+        parts = []
+        try:
+            for piece in s.backend.stream(MESSAGES):
+                parts.append(piece)
+        except Exception:
+            pass
+        else:
+            raise AssertionError("a stream cut off halfway ended without an error")
+        assert parts, "no text arrived before the cut"
+        assert s.requests == 1, f"server saw {s.requests} requests; a stream was retried after its first token"
+
+CHECKS = [
+    check_retry_then_succeed,
+    check_retry_limit_raises,
+    check_stream_retry_limit_raises,
+    check_no_hedge_when_fast,
+    check_hedge_returns_first_success,
+    check_hedge_failure_keeps_primary,
+    check_stream_hedged_before_first_token,
+    check_stream_not_hedged_after_first_token,
+    check_stream_not_retried_after_first_token,
+]
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        name = check.__name__[len("check_"):]
+        try:
+            check()
+        except Exception as exc:
+            failed += 1
+            detail = str(exc) if isinstance(exc, AssertionError) else f"{type(exc).__name__}: {exc}"
+            print(f"FAIL  {name}: {detail}")
+        else:
+            print(f"ok    {name}")
+    print(f"{len(CHECKS) - failed}/{len(CHECKS)} checks passed")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
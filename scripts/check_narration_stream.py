@@ -0,0 +1,116 @@
+"""
+Checks that the GM loop's streamed narration matches the parsed narration.
+
+Each check feeds a model output to NarrationStream in deltas of several
+sizes (whole text, one character, random splits) and asserts that what
+reaches the table is exactly the GM_NARRATION section the response parser
+extracts: no header decoration, engine notes or delta leaking through.
+Exits non-zero if any check fails.
+
+Usage:
+  python scripts/check_narration_stream.py
+"""
+
+import io
+import random
+import sys
+
+from gm_loop import NarrationStream
+from response_parser import parse_response
+
+NARRATION = "The ford runs cold and fast.\n\nOn the far bank, a lantern gutters out."
+DELTA = '```json\n{"facts_add": ["the lantern went out"]}\n```'
+
+def output(narration_header, notes_header, delta_header, narration=NARRATION):
+    return (
+        f"{narration_header}\n{narration}\n\n"
+        f"{notes_header}\n- ford crossing, no roll needed\n\n"
+        f"{delta_header}\n{DELTA}\n"
+    )
+
+def splits(text, seed=7):
+    """
+    The same text cut into deltas a few different ways.
+    """
+    yield [text]
+    yield list(text)
+    rng = random.Random(seed)
+    for _ in range(20):
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(1, 12))))
+        yield [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+def streamed(deltas):
+    out = io.StringIO()
+    stream = NarrationStream(out=out)
+    for d in deltas:
+        stream.feed(d)
+    raw = stream.finish()
+    return out.getvalue(), raw
+
+def assert_streams_narration(text):
+    expected = parse_response(text)["narration"]
+    for deltas in splits(text):
+        shown, raw = streamed(deltas)
+        assert raw == text, "finish() did not return the raw text"
+        assert shown == expected, f"shown {shown!r}, expected {expected!r} (deltas {deltas[:4]!r}...)"
+        for leak in ("ENGINE", "##", "**", "facts_add"):
+            assert leak not in shown, f"{leak!r} reached the table: {shown!r}"
+
+def check_plain_headers():
+    assert_streams_narration(output("GM_NARRATION:", "ENGINE_NOTES:", "STATE_DELTA_JSON:"))
+
+def check_bold_headers():
+    assert_streams_narration(output("**GM_NARRATION:**", "**ENGINE_NOTES**:", "**STATE_DELTA_JSON**:"))
+
+def check_markdown_headings():
+    assert_streams_narration(output("## GM_NARRATION:", "## ENGINE_NOTES:", "## STATE_DELTA_JSON:"))
+
+def check_lowercase_headers():
+    assert_streams_narration(output("gm_narration:", "Engine_Notes:", "state_delta_json:"))
+
+def check_narration_on_header_line():
+    text = "GM_NARRATION: The ford runs cold.\nMore water.\nENGINE_NOTES: none\nSTATE_DELTA_JSON:\n" + DELTA
+    assert_streams_narration(text)
+
+def check_header_words_in_narration():
+    # Header names that don't start a line are just narration.
+    narration = "The clerk scrawls ENGINE_NOTES: in the margin.\n**Bold** words and ## marks stay."
+    text = output("GM_NARRATION:", "ENGINE_NOTES:", "STATE_DELTA_JSON:", narration=narration)
+    expected = parse_response(text)["narration"]
+    assert expected == narration, f"parser narration {expected!r}"
+    for deltas in splits(text):
+        shown, _ = streamed(deltas)
+        assert shown == expected, f"shown {shown!r}, expected {expected!r}"
+
+def check_no_notes_header():
+    # The narration also ends at a delta header.
+    assert_streams_narration("GM_NARRATION:\n" + NARRATION + "\n\n## STATE_DELTA_JSON:\n" + DELTA)
+
+CHECKS = [
+    check_plain_headers,
+    check_bold_headers,
+    check_markdown_headings,
+    check_lowercase_headers,
+    check_narration_on_header_line,
+    check_header_words_in_narration,
+    check_no_notes_header,
+]
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        name = check.__name__[len("check_"):]
+        try:
+            check()
+        except Exception as exc:
+            failed += 1
+            detail = str(exc) if isinstance(exc, AssertionError) else f"{type(exc).__name__}: {exc}"
+            print(f"FAIL  {name}: {detail}")
+        else:
+            print(f"ok    {name}")
+    print(f"{len(CHECKS) - failed}/{len(CHECKS)} checks passed")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
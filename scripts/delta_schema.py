@@ -0,0 +1,175 @@
+"""
+Schema for STATE_DELTA_JSON and a compiled validator for it.
+
+DELTA_SCHEMA is the formal version of the key list in gm_loop's SYSTEM_RULES,
+written in a small JSON-Schema subset (type, properties, required, items,
+enum, minimum, additionalProperties). compile_schema turns it into a tree of
+closures once, at import, so validating a delta is a walk over the delta
+only, with no schema interpretation per turn.
+
+validate_delta never rejects a delta wholesale. Each field that fails is
+reported by its path and removed: an unknown key, an array item that is not
+valid, or a property of the wrong type. An object missing a required field
+is removed as a whole. The rest is returned for apply_delta.
+"""
+
+WATCHES = ("morning", "afternoon", "evening", "night")
+
+_STR = {"type": "string"}
+_OPT_STR = {"type": ["string", "null"]}
+
+def _items(required, **props):
+    return {
+        "type": "array",
+        "items": {"type": "object", "required": list(required), "properties": props},
+    }
+
+DELTA_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "properties": {
+        "time_advance": {
+            "type": "object",
+            "properties": {
+                "day": {"type": ["integer", "null"], "minimum": 0},
+                "watch": {"enum": list(WATCHES) + [None]},
+            },
+        },
+        "party_move": {
+            "type": "object",
+            "properties": {"region_id": _STR, "site_id": _OPT_STR},
+        },
+        "discover": {
+            "type": "object",
+            "properties": {
+                "regions": _items(["region_id"], region_id=_STR, party_name=_OPT_STR),
+                "sites": _items(["site_id"], site_id=_STR, party_name=_OPT_STR, region_id=_OPT_STR),
+                "factions": _items(["faction_id"], faction_id=_STR, party_name=_OPT_STR),
+            },
+        },
+        "quests_add": _items(["id"], id=_STR, title=_STR, status=_STR),
+        "quests_update": _items(["id"], id=_STR, status=_STR, notes=_OPT_STR),
+        "facts_add": {"type": "array", "items": _STR},
+        "npcs_upsert": _items(
+            ["id"], id=_STR, name=_OPT_STR, role=_OPT_STR, attitude=_OPT_STR, location=_OPT_STR,
+        ),
+        "notes_add": {"type": "array", "items": _STR},
+    },
+}
+
+TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None),
+}
+
+_REJECT = object()
+
+def _path(path):
+    # path is a linked list (parent, key), only joined when reporting.
+    parts = []
+    while path is not None:
+        path, key = path
+        parts.append(f"[{key}]" if isinstance(key, int) else f".{key}")
+    return "".join(reversed(parts)).lstrip(".") or "$"
+
+def _type_name(value):
+    for name, t in TYPES.items():
+        if type(value) is t:
+            return name
+    return type(value).__name__
+
+def compile_schema(schema):
+    """
+    Returns check(value, path, errors) -> cleaned value, or _REJECT after
+    appending {"path", "message"} to errors.
+    """
+    names = schema.get("type")
+    if isinstance(names, str):
+        names = [names]
+    # Checked with type(value) in allowed: bool is an int subclass, and an
+    # exact check keeps True out of "integer".
+    allowed = None
+    if names:
+        allowed = ()
+        for n in names:
+            t = TYPES[n]
+            allowed += t if isinstance(t, tuple) else (t,)
+    enum = schema.get("enum")
+    minimum = schema.get("minimum")
+
+    props = {k: compile_schema(v) for k, v in (schema.get("properties") or {}).items()}
+    required = tuple(schema.get("required") or ())
+    extra_ok = schema.get("additionalProperties", True)
+    item_check = compile_schema(schema["items"]) if "items" in schema else None
+
+    if allowed is not None and enum is None and minimum is None and not props and item_check is None:
+        # Plain typed leaf, e.g. a string: the common case, so keep it lean.
+        def check_leaf(value, path, errors):
+            if type(value) in allowed:
+                return value
+            errors.append({"path": _path(path), "message": f"expected {' or '.join(names)}, got {_type_name(value)}"})
+            return _REJECT
+        check_leaf.leaf_types = allowed
+        return check_leaf
+
+    leaf_items = getattr(item_check, "leaf_types", None)
+
+    def check(value, path, errors):
+        if allowed is not None and type(value) not in allowed:
+            errors.append({"path": _path(path), "message": f"expected {' or '.join(names)}, got {_type_name(value)}"})
+            return _REJECT
+        if enum is not None and value not in enum:
+            errors.append({"path": _path(path), "message": f"{value!r} is not one of {', '.join('null' if e is None else str(e) for e in enum)}"})
+            return _REJECT
+        if minimum is not None and value is not None and value < minimum:
+            errors.append({"path": _path(path), "message": f"{value} is below the minimum {minimum}"})
+            return _REJECT
+
+        if type(value) is dict:
+            for key in required:
+                if value.get(key) is None:
+                    errors.append({"path": _path(path), "message": f"missing required field {key!r}"})
+                    return _REJECT
+            out = {}
+            for key, v in value.items():
+                sub = props.get(key)
+                if sub is None:
+                    if not extra_ok:
+                        errors.append({"path": _path((path, key)), "message": "unknown field"})
+                        continue
+                    out[key] = v
+                    continue
+                v = sub(v, (path, key), errors)
+                if v is not _REJECT:
+                    out[key] = v
+            return out
+
+        if type(value) is list and item_check is not None:
+            if leaf_items is not None and all(type(v) in leaf_items for v in value):
+                return value
+            out = []
+            for i, v in enumerate(value):
+                v = item_check(v, (path, i), errors)
+                if v is not _REJECT:
+                    out.append(v)
+            return out
+        return value
+
+    return check
+
+_check_delta = compile_schema(DELTA_SCHEMA)
+
+def validate_delta(delta):
+    """
+    Validate a parsed STATE_DELTA_JSON. Returns (clean_delta, errors): the
+    delta with every rejected field removed (None if the delta itself is not
+    an object), and one {"path", "message"} per rejected field.
+    """
+    errors = []
+    clean = _check_delta(delta, None, errors)
+    return (None if clean is _REJECT else clean), errors
@@ -0,0 +1,108 @@
+"""
+Shared embedding provider for lore ingestion and canon retrieval.
+
+Both ingest_lore.py and gm_loop.py embed through one EmbeddingProvider so the
+model is loaded once per process and the same vectors are used on both sides.
+Vectors are cached on disk in SQLite, keyed by model name + sha256 of the text,
+so unchanged sections and repeated queries are never embedded twice.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+CACHE_PATH = os.path.join("chroma_db", "embedding_cache.sqlite")
+
+# SQLite's default bound-parameter limit is 999 on older builds.
+_LOOKUP_CHUNK = 500
+
+def text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingProvider:
+    def __init__(self, model_name=MODEL_NAME, cache_path=CACHE_PATH):
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+        self._model = None
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, key TEXT NOT NULL, vec BLOB NOT NULL,"
+            " PRIMARY KEY (model, key))"
+        )
+        self._db.commit()
+
+    @property
+    def model(self):
+        # Loaded on first cache miss only; a fully cached run never loads it.
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def _lookup(self, keys):
+        found = {}
+        for i in range(0, len(keys), _LOOKUP_CHUNK):
+            chunk = keys[i:i + _LOOKUP_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            rows = self._db.execute(
+                f"SELECT key, vec FROM embeddings WHERE model = ? AND key IN ({marks})",
+                [self.model_name, *chunk],
+            )
+            for key, blob in rows:
+                vec = array("f")
+                vec.frombytes(blob)
+                found[key] = vec.tolist()
+        return found
+
+    def embed(self, texts):
+        """
+        Embed a list of texts, returning a list of float lists in input order.
+        Only texts missing from the cache are sent to the model, in one batch.
+        """
+        if not texts:
+            return []
+        keys = [text_key(t) for t in texts]
+        with self._lock:
+            found = self._lookup(list(set(keys)))
+
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in found and key not in missing:
+                    missing[key] = text
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+            if missing:
+                vecs = self.model.encode(
+                    list(missing.values()),
+                    normalize_embeddings=True,
+                )
+                rows = []
+                for key, vec in zip(missing.keys(), vecs):
+                    vec = array("f", (float(x) for x in vec))
+                    found[key] = vec.tolist()
+                    rows.append((self.model_name, key, vec.tobytes()))
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, key, vec) VALUES (?, ?, ?)",
+                    rows,
+                )
+                self._db.commit()
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,11 +1,22 @@
+import argparse
+import asyncio
 import json
 import os
 import re
-from copy import deepcopy
+import sys
+import time
 from datetime import datetime
 
-import chromadb
-from openai import OpenAI
+from campaign_memory import CampaignMemory, ExtractiveSummarizer, ModelSummarizer
+from chapter_compiler import FORMATS as CHAPTER_FORMATS, compile_chapter
+from delta_schema import validate_delta
+from llm_backends import add_backend_args, backend_from_args
+from prompt_builder import build_prompt
+from response_parser import FENCE_RE, HEADER_RE, SECTIONS, ResponseParser
+from retrieval import CanonRetriever
+from session_history import HistoryIndex
+from session_index import open_index
+from state_store import StateStore
 
 DB_PATH = "chroma_db"
 STATE_PATH = "state/current.json"
@@ -20,6 +31,7 @@ CHAPTER_STATE_PATH = os.path.join("state", "chapter.json")
 MODEL = "gpt-5-mini"  # working fine; swap later if you want
 TOP_K = 6
 
+# The delta key list below is enforced by delta_schema.DELTA_SCHEMA; keep them in sync.
 SYSTEM_RULES = """
 You are a D&D 3.5e game master assistant running an exploratory campaign.
 
@@ -57,170 +69,135 @@ def ensure_dirs():
     os.makedirs(PUBLIC_DIR, exist_ok=True)
     os.makedirs(CHAPTERS_DIR, exist_ok=True)
 
-def load_state():
-    with open(STATE_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_state(state):
-    with open(STATE_PATH, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=2, ensure_ascii=False)
-
-def next_turn_number():
+def next_turn_number(index=None):
     """
-    Determine next turn number based on existing session logs.
-    Files look like: sessions/turn_0001.md
+    Determine next turn number from the session index (sessions/index.jsonl),
+    which is built from the existing session logs the first time it's needed.
     """
     ensure_dirs()
-    pat = re.compile(r"turn_(\d{4})\.md$")
-    max_n = 0
-    for fn in os.listdir(SESSIONS_DIR):
-        m = pat.search(fn)
-        if m:
-            max_n = max(max_n, int(m.group(1)))
-    return max_n + 1
-
-def snapshot(label="snapshot"):
+    if index is None:
+        index = open_index(os.path.join(SESSIONS_DIR, "index.jsonl"), SESSIONS_DIR, PUBLIC_DIR)
+    return index.next_turn()
+
+def snapshot(label="snapshot", state=None):
+    """
+    Save a copy of the campaign state. Pass the in-memory state from the
+    StateStore; current.json alone may lag behind the journal.
+    """
     ensure_dirs()
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     safe_label = re.sub(r"[^a-zA-Z0-9_\-]+", "_", label).strip("_") or "snapshot"
     out_path = os.path.join(SNAPSHOT_DIR, f"{ts}_{safe_label}.json")
-    with open(STATE_PATH, "r", encoding="utf-8") as f:
-        state_text = f.read()
+    if state is None:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            state = json.load(f)
     with open(out_path, "w", encoding="utf-8") as f:
-        f.write(state_text)
+        json.dump(state, f, indent=2, ensure_ascii=False)
     print(f"[snapshot saved] {out_path}")
 
-def retrieve_canon(query, k=TOP_K):
-    client = chromadb.PersistentClient(path=DB_PATH)
-    col = client.get_collection(COLLECTION_NAME)
-    res = col.query(query_texts=[query], n_results=k)
-
-    chunks = []
-    for doc, meta in zip(res["documents"][0], res["metadatas"][0]):
-        tag = f"{meta.get('type','?')}:{meta.get('name','?')}:{meta.get('section','?')}"
-        chunks.append(f"[{tag}]\n{doc}")
-    return "\n\n".join(chunks)
+_retriever = None
 
-def split_sections(text):
+def get_retriever():
     """
-    Extract GM_NARRATION and ENGINE_NOTES sections.
+    One long-lived CanonRetriever per process (client, collection handle and
+    embedding model are opened once).
     """
-    # non-greedy capture up to next header
-    narr = ""
-    notes = ""
-
-    mn = re.search(r"GM_NARRATION:\s*(.*?)(?:\nENGINE_NOTES:|\Z)", text, re.DOTALL | re.IGNORECASE)
-    if mn:
-        narr = mn.group(1).strip()
-
-    me = re.search(r"ENGINE_NOTES:\s*(.*?)(?:\nSTATE_DELTA_JSON:|\Z)", text, re.DOTALL | re.IGNORECASE)
-    if me:
-        notes = me.group(1).strip()
+    global _retriever
+    if _retriever is None:
+        _retriever = CanonRetriever(db_path=DB_PATH, collection_name=COLLECTION_NAME)
+    return _retriever
 
-    return narr, notes
+def retrieve_canon(query, k=TOP_K):
+    return get_retriever().retrieve(query, k=k)
 
-def extract_delta(text):
+class NarrationStream:
     """
-    Extract JSON from a fenced block under STATE_DELTA_JSON.
+    Streams GM_NARRATION to the table as text deltas arrive and goes quiet at
+    the next section header. Headers are found line by line with the
+    response parser's HEADER_RE, so decorated ones (**ENGINE_NOTES**:,
+    ## ENGINE_NOTES:) end the narration exactly where the parser ends it.
+    The full raw output is buffered for the session log. The start of a line
+    that could still become a header is held back until it can't.
     """
-    m = re.search(r"STATE_DELTA_JSON:\s*```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL | re.IGNORECASE)
-    if not m:
-        raise ValueError("Could not find STATE_DELTA_JSON fenced JSON block.")
-    return json.loads(m.group(1))
-
-def apply_delta(state, delta):
-    s = deepcopy(state)
-
-    # time advance
-    ta = delta.get("time_advance")
-    if ta:
-        s.setdefault("time", {})
-        for key in ("day", "watch"):
-            if key in ta and ta[key] is not None:
-                s["time"][key] = ta[key]
-
-    # party move
-    pm = delta.get("party_move")
-    if pm:
-        s.setdefault("party", {}).setdefault("location", {})
-        for key in ("region_id", "site_id"):
-            if key in pm:
-                s["party"]["location"][key] = pm[key]
-
-    # discoveries
-    disc = delta.get("discover", {})
-    if disc:
-        s.setdefault("discovered", {}).setdefault("regions", {})
-        s.setdefault("discovered", {}).setdefault("sites", {})
-        s.setdefault("discovered", {}).setdefault("factions", {})
-
-        for r in disc.get("regions", []) or []:
-            rid = r.get("region_id")
-            if rid:
-                s["discovered"]["regions"].setdefault(rid, {})
-                if r.get("party_name"):
-                    s["discovered"]["regions"][rid]["party_name"] = r["party_name"]
-
-        for site in disc.get("sites", []) or []:
-            sid = site.get("site_id")
-            if sid:
-                s["discovered"]["sites"].setdefault(sid, {})
-                if site.get("party_name"):
-                    s["discovered"]["sites"][sid]["party_name"] = site["party_name"]
-                if site.get("region_id"):
-                    s["discovered"]["sites"][sid]["region_id"] = site["region_id"]
-
-        for f in disc.get("factions", []) or []:
-            fid = f.get("faction_id")
-            if fid:
-                s["discovered"]["factions"].setdefault(fid, {})
-                if f.get("party_name"):
-                    s["discovered"]["factions"][fid]["party_name"] = f["party_name"]
-
-    # quests
-    if delta.get("quests_add"):
-        s.setdefault("quests", [])
-        existing_ids = {q.get("id") for q in s["quests"]}
-        for q in delta["quests_add"]:
-            if q.get("id") and q["id"] not in existing_ids:
-                s["quests"].append(q)
-
-    if delta.get("quests_update"):
-        by_id = {q.get("id"): q for q in s.get("quests", []) if q.get("id")}
-        for upd in delta["quests_update"]:
-            qid = upd.get("id")
-            if qid and qid in by_id:
-                if "status" in upd:
-                    by_id[qid]["status"] = upd["status"]
-                if "notes" in upd and upd["notes"]:
-                    by_id[qid].setdefault("notes", [])
-                    by_id[qid]["notes"].append(upd["notes"])
-
-    # facts
-    if delta.get("facts_add"):
-        s.setdefault("facts", [])
-        for fact in delta["facts_add"]:
-            if fact and fact not in s["facts"]:
-                s["facts"].append(fact)
-
-    # npcs
-    if delta.get("npcs_upsert"):
-        s.setdefault("npcs", {})
-        for npc in delta["npcs_upsert"]:
-            nid = npc.get("id")
-            if not nid:
-                continue
-            s["npcs"].setdefault(nid, {})
-            s["npcs"][nid].update({k: v for k, v in npc.items() if v is not None})
-
-    # notes
-    if delta.get("notes_add"):
-        s.setdefault("notes", [])
-        for n in delta["notes_add"]:
-            if n:
-                s["notes"].append(n)
-
-    return s
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.parts = []
+        self.pending = ""  # the current line, not yet shown
+        self.mid_line = False  # the current line's start is already shown
+        self.in_fence = False
+        self.held_ws = ""  # trailing whitespace, shown only if narration follows
+        self.phase = "before"  # before -> narration -> after
+        self.printed = False
+
+    def _emit(self, text):
+        if not self.printed:
+            text = text.lstrip()
+        if text:
+            self.out.write(text)
+            self.out.flush()
+            self.printed = True
+
+    def _narrate(self, text):
+        # Blank lines before the next header never reach the table.
+        text = self.held_ws + text
+        body = text.rstrip()
+        self.held_ws = text[len(body):]
+        if body:
+            self._emit(body)
+
+    @staticmethod
+    def _could_be_header(partial):
+        rest = partial.lstrip(" \t#>*_`").upper()
+        return any(name.startswith(rest[:len(name)]) for name in SECTIONS)
+
+    def _line(self, line, end="\n"):
+        if not self.mid_line and not self.in_fence:
+            m = HEADER_RE.match(line)
+            if m:
+                if m.group(1).upper() != "GM_NARRATION":
+                    if self.phase == "narration":
+                        self.phase = "after"
+                    return
+                if self.phase == "before":
+                    self.phase = "narration"
+                if self.phase == "narration" and m.group(2).strip():
+                    self._narrate(m.group(2) + end)
+                return
+        self.mid_line = False
+        if self.phase != "narration":
+            return
+        if FENCE_RE.match(line):
+            self.in_fence = not self.in_fence
+        self._narrate(line + end)
+
+    def feed(self, delta):
+        self.parts.append(delta)
+        if self.phase == "after":
+            return
+        self.pending += delta
+        while "\n" in self.pending and self.phase != "after":
+            line, self.pending = self.pending.split("\n", 1)
+            self._line(line)
+        if self.phase == "after":
+            self.pending = ""
+            return
+        # Show the start of a line early once it can't be a header.
+        if self.pending and self.phase == "narration" and (
+            self.mid_line or self.in_fence or not self._could_be_header(self.pending)
+        ):
+            self._narrate(self.pending)
+            self.pending = ""
+            self.mid_line = True
+
+    def finish(self):
+        """
+        Flush any narration still held back and return the full raw text.
+        """
+        if self.pending and self.phase != "after":
+            self._line(self.pending, end="")
+            self.pending = ""
+        return "".join(self.parts)
 
 def read_multiline_or_command():
     """
@@ -260,7 +237,59 @@ def read_multiline_or_command():
 
     return text
 
-def write_session_log(turn_n, player_input, model_raw, narration, engine_notes, delta, canon_used):
+class ReplayInput:
+    """
+    Scripted input for --replay: the file uses the interactive format, with
+    blank lines separating turns and !commands on their own. Each call
+    returns the next turn or command (echoed, so the output reads like a
+    session) and "!quit" once the script is exhausted.
+    """
+
+    def __init__(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            blocks = re.split(r"\n\s*\n", f.read())
+        self.items = [b.strip() for b in blocks if b.strip()]
+        self.pos = 0
+
+    def __call__(self):
+        if self.pos >= len(self.items):
+            return "!quit"
+        text = self.items[self.pos]
+        self.pos += 1
+        print(f"\n>>> [{self.pos}/{len(self.items)}] {text}")
+        return text
+
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list.
+    i = max(0, min(len(sorted_values) - 1, -(-p * len(sorted_values) // 100) - 1))
+    return sorted_values[i]
+
+def latency_report(latencies):
+    """
+    Per-stage latency percentiles, as {stage: {"n", "p50", ..., "max"}} in ms.
+    """
+    report = {}
+    for stage, values in latencies.items():
+        if not values:
+            continue
+        v = sorted(values)
+        row = {"n": len(v)}
+        for p in LATENCY_PERCENTILES:
+            row[f"p{p}"] = round(percentile(v, p), 2)
+        row["max"] = round(v[-1], 2)
+        report[stage] = row
+    return report
+
+def print_latency_report(report):
+    cols = [f"p{p}" for p in LATENCY_PERCENTILES] + ["max"]
+    print("\n--- LATENCY (ms) ---")
+    print(f"{'stage':<14}{'n':>6}" + "".join(f"{c:>10}" for c in cols))
+    for stage, row in report.items():
+        print(f"{stage:<14}{row['n']:>6}" + "".join(f"{row[c]:>10.2f}" for c in cols))
+
+def write_session_log(turn_n, player_input, model_raw, narration, engine_notes, delta, canon_used, stats=None):
     ensure_dirs()
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     path = os.path.join(SESSIONS_DIR, f"turn_{turn_n:04d}.md")
@@ -295,6 +324,13 @@ def write_session_log(turn_n, player_input, model_raw, narration, engine_notes,
         f.write(model_raw.strip() + "\n")
         f.write("```\n")
 
+        if stats:
+            f.write("\n## TURN_STATS (silent)\n")
+            f.write("```json\n")
+            f.write(json.dumps(stats, indent=2, ensure_ascii=False))
+            f.write("\n```\n")
+    return path
+
 def load_chapter_state():
     ensure_dirs()
     if not os.path.exists(CHAPTER_STATE_PATH):
@@ -310,6 +346,7 @@ def save_chapter_state(ch):
 def write_public_turn(turn_n, player_input, narration, state):
     """
     Write a clean, shareable turn log (no engine notes, no canon, no raw output).
+    Returns (path, byte offset where the narration starts).
     """
     ensure_dirs()
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -335,20 +372,31 @@ def write_public_turn(turn_n, player_input, narration, state):
         f.write("```\n\n")
 
         f.write("## Narration\n")
+        f.flush()
+        narration_offset = f.tell()
         f.write(narration.strip() + "\n")
+    return path, narration_offset
+
+def compile_and_report(ch, index=None, full=False, formats=None):
+    results = compile_chapter(
+        ch, PUBLIC_DIR, CHAPTERS_DIR,
+        formats=formats or CHAPTER_FORMATS, index=index, incremental=not full,
+    )
+    for path, mode in results.values():
+        print(f"[chapter compiled] {path} ({mode})")
 
-def handle_chapter_command(cmd_text):
+def handle_chapter_command(cmd_text, index=None):
     """
     Commands:
       !chapter start <slug> "<Title>"
-      !chapter compile
+      !chapter compile [full] [md] [html]
       !chapter status
     """
     ch = load_chapter_state()
     parts = cmd_text.split(maxsplit=2)
 
     if len(parts) < 2:
-        print("Usage: !chapter start <slug> \"<Title>\" | !chapter compile | !chapter status")
+        print("Usage: !chapter start <slug> \"<Title>\" | !chapter compile [full] [md] [html] | !chapter status")
         return
 
     sub = parts[1].strip().lower()
@@ -394,24 +442,9 @@ def handle_chapter_command(cmd_text):
         if not ch.get("active"):
             print("No active chapter to compile.")
             return
-        slug = ch.get("slug")
-        title = ch.get("title")
-        turns = ch.get("turns", [])
-
-        out_path = os.path.join(CHAPTERS_DIR, f"{slug}.md")
-        with open(out_path, "w", encoding="utf-8") as out:
-            out.write(f"# {title}\n\n")
-            out.write(f"_Compiled from turns: {', '.join([f'{t:04d}' for t in turns])}_\n\n")
-
-            for t in turns:
-                p = os.path.join(PUBLIC_DIR, f"turn_{t:04d}.md")
-                if os.path.exists(p):
-                    with open(p, "r", encoding="utf-8") as f:
-                        out.write(f.read().strip() + "\n\n---\n\n")
-                else:
-                    out.write(f"## Missing turn_{t:04d}.md\n\n---\n\n")
-
-        print(f"[chapter compiled] {out_path}")
+        opts = parts[2].lower().split() if len(parts) > 2 else []
+        compile_and_report(ch, index, full="full" in opts, formats=[o for o in opts if o in CHAPTER_FORMATS])
+        save_chapter_state(ch)
         return
 
     if sub == "end":
@@ -420,25 +453,8 @@ def handle_chapter_command(cmd_text):
             return
 
         # Optional: auto-compile on end (nice default)
-        slug = ch.get("slug")
-        title = ch.get("title")
-        turns = ch.get("turns", [])
-
-        if turns:
-            out_path = os.path.join(CHAPTERS_DIR, f"{slug}.md")
-            with open(out_path, "w", encoding="utf-8") as out:
-                out.write(f"# {title}\n\n")
-                out.write(f"_Compiled from turns: {', '.join([f'{t:04d}' for t in turns])}_\n\n")
-
-                for t in turns:
-                    p = os.path.join(PUBLIC_DIR, f"turn_{t:04d}.md")
-                    if os.path.exists(p):
-                        with open(p, "r", encoding="utf-8") as f:
-                            out.write(f.read().strip() + "\n\n---\n\n")
-                    else:
-                        out.write(f"## Missing turn_{t:04d}.md\n\n---\n\n")
-
-            print(f"[chapter compiled] {out_path}")
+        if ch.get("turns"):
+            compile_and_report(ch, index)
         else:
             print("[chapter ended] (no turns were added)")
 
@@ -450,101 +466,346 @@ def handle_chapter_command(cmd_text):
 
     print("Unknown chapter command. Use: start|add|compile|status")
 
-def main():
-    ensure_dirs()
-    client = OpenAI()
-
-    print("GM loop ready. (Multi-line input; blank line to submit.)")
-
-    while True:
-        user_text = read_multiline_or_command()
-
-        if user_text == "!quit":
-            print("Bye.")
-            return
-
-        if user_text.startswith("!snapshot"):
-            parts = user_text.split(maxsplit=1)
-            label = parts[1] if len(parts) > 1 else "snapshot"
-            snapshot(label)
-            continue
-
-        if user_text.startswith("!chapter"):
-            handle_chapter_command(user_text)
-            continue
-
-        if not user_text:
-            # no-op; continue loop
-            continue
-
-        # Load state fresh each turn
-        state = load_state()
-
-        # Retrieve canon based on the player's input
-        canon = retrieve_canon(user_text)
-
-        prompt = f"""
-CANON CONTEXT:
-{canon}
-
-CURRENT STATE (JSON):
-{json.dumps(state, indent=2, ensure_ascii=False)}
-
-PLAYER ACTIONS / INTENT:
-{user_text}
-"""
+class TurnEngine:
+    """
+    Asyncio turn pipeline.
+
+    - The state store opens (checkpoint + journal replay) while the retriever
+      warms up, and each turn's query is embedded while the previous turn's
+      writes settle.
+    - Post-turn I/O (state journal, public turn, session log, chapter) runs
+      in the background after narration is shown, and the next input prompt
+      appears immediately.
+    - Post-turn writes run strictly in order, and every command or turn that
+      reads state awaits them first (settle()), so nothing observes a
+      half-written turn.
+    - Campaign memory compaction (summary model call, ingesting originals)
+      runs as its own background task across turns; its state change is
+      committed at the start of the next post-turn, in order with the rest.
+    - Each turn is added to the session history index as the last post-turn
+      write; past turns relevant to the input are recalled with the memory.
+    """
 
-        resp = client.responses.create(
-            model=MODEL,
-            input=[
-                {"role": "system", "content": SYSTEM_RULES},
-                {"role": "user", "content": prompt}
-            ],
+    def __init__(self, backend, retriever, store, stream=True, read_input=read_multiline_or_command, memory=None, history=None):
+        self.backend = backend
+        self.retriever = retriever
+        self.store = store
+        self.stream = stream
+        self.read_input = read_input
+        self.memory = memory
+        self.compaction = None
+        self.history = history
+        # Per-stage durations in ms, for the replay latency report.
+        self.latencies = {stage: [] for stage in ("state_ready", "retrieval", "prompt", "ttft", "model", "turn", "post_turn")}
+        self.pending = None
+        self.index = None
+        # Turn numbers are handed out here from the session index, because the
+        # previous turn's log may still be in flight.
+        self.last_turn = 0
+
+    async def settle(self):
+        if self.pending is not None:
+            task, self.pending = self.pending, None
+            await task
+
+    async def start(self):
+        # Open the lore DB, load the embedding model and replay the state
+        # journal concurrently, before the first turn.
+        warm_ms, _, self.index = await asyncio.gather(
+            asyncio.to_thread(self.retriever.warm),
+            asyncio.to_thread(self.store.open),
+            asyncio.to_thread(open_index, os.path.join(SESSIONS_DIR, "index.jsonl"), SESSIONS_DIR, PUBLIC_DIR),
         )
-
-        raw = resp.output_text
-        narration, engine_notes = split_sections(raw)
-
-        # Parse & apply delta silently
-        delta = {}
-        state_updated = False
+        self.last_turn = next_turn_number(self.index) - 1
+        print(f"[retriever warm] {warm_ms:.0f} ms")
+        if self.history is not None:
+            added = await asyncio.to_thread(self.history.sync, self.index)
+            if added:
+                print(f"[session history] indexed {added} earlier turns")
+
+    async def run(self):
+        await self.start()
+        print("GM loop ready. (Multi-line input; blank line to submit.)")
+        try:
+            while True:
+                user_text = await asyncio.to_thread(self.read_input)
+
+                if user_text == "!quit":
+                    await self.settle()
+                    print("Bye.")
+                    return
+
+                if user_text.startswith("!snapshot"):
+                    await self.settle()
+                    parts = user_text.split(maxsplit=1)
+                    label = parts[1] if len(parts) > 1 else "snapshot"
+                    snapshot(label, state=self.store.state)
+                    continue
+
+                if user_text.startswith("!chapter"):
+                    await self.settle()
+                    handle_chapter_command(user_text, self.index)
+                    continue
+
+                if not user_text:
+                    # no-op; continue loop
+                    continue
+
+                await self.turn(user_text)
+        finally:
+            await self.settle()
+            if self.compaction is not None:
+                await asyncio.wait([self.compaction])
+                await self.apply_compaction()
+            # Fold the journal into current.json so it is complete between sessions.
+            await asyncio.to_thread(self.store.close)
+
+    async def maybe_compact(self, turn_n):
+        """
+        Start a background compaction if one is due and none is running.
+        Runs at the end of post_turn, when nothing else touches state.
+        """
+        if self.memory is None or self.compaction is not None:
+            return
+        plan = self.memory.plan(self.store.state, turn_n)
+        if plan is None:
+            return
+        entries = {t: self.index.get(t) for t in plan["turns"]}
+        self.compaction = asyncio.create_task(asyncio.to_thread(self.memory.compact, plan, entries))
+
+    async def apply_compaction(self):
+        """
+        Commit a finished compaction's memory_compact delta. Returns its
+        stats, or None if there was nothing to apply.
+        """
+        if self.compaction is None or not self.compaction.done():
+            return None
+        task, self.compaction = self.compaction, None
         try:
-            delta = extract_delta(raw)
-            new_state = apply_delta(state, delta)
-            save_state(new_state)
-            state_updated = True
-        except Exception:
-            # We still proceed; state just won't update.
-            delta = {}
-
-        # Print ONLY narration to the table
+            delta, stats = task.result()
+            await asyncio.to_thread(self.store.commit, delta, None)
+        except Exception as e:
+            # Nothing was dropped from state; the next compaction retries.
+            return {"error": f"{type(e).__name__}: {e}"}
+        return stats
+
+    def recall(self, text):
+        """
+        Folded campaign memory plus the most relevant past turns, skipping
+        turns whose narration the memory already recalled.
+        """
+        recalled = self.memory.recall(text) if self.memory is not None else []
+        if self.history is not None:
+            seen = {c["meta"].get("turn") for c in recalled if c["meta"].get("kind") == "narration"}
+            recalled += self.history.search(text, exclude_turns=seen)
+        return recalled
+
+    def generate(self, model_input):
+        """
+        Blocking model call (run in a worker thread). Streams narration to
+        the table unless streaming is off. The response is parsed as it
+        arrives. Returns (raw, parsed) with parsed from ResponseParser.finish().
+        """
+        parser = ResponseParser()
+        if not self.stream:
+            raw = self.backend.complete(model_input)
+            parser.feed(raw)
+            parsed = parser.finish()
+
+            # Print ONLY narration to the table
+            print("\n--- GM NARRATION ---\n")
+            print(parsed["narration"] or "(No GM_NARRATION found; check session log.)")
+            print()
+            return raw, parsed
+
+        # Print ONLY narration to the table, as it arrives
         print("\n--- GM NARRATION ---\n")
-        print(narration if narration else "(No GM_NARRATION found; check session log.)")
-        print()
-
-        # Write a session log (silent info preserved)
-        # Determine turn number first
-        turn_n = next_turn_number()
+        stream = NarrationStream()
+        for delta in self.backend.stream(model_input):
+            stream.feed(delta)
+            parser.feed(delta)
+        raw = stream.finish()
+        parsed = parser.finish()
+        if not stream.printed:
+            print(parsed["narration"] or "(No GM_NARRATION found; check session log.)")
+        print("\n")
+        return raw, parsed
+
+    async def turn(self, user_text):
+        timings = {}
+        t0 = time.perf_counter()
+
+        # Embed the query while the previous turn settles.
+        prefetch = asyncio.create_task(asyncio.to_thread(self.retriever.embedder.embed_query, user_text))
+        await self.settle()
+        state = self.store.state
+        # The store updates state in place; the public turn header shows the
+        # time the turn started at, so keep a copy of it.
+        turn_time = dict(state.get("time", {}))
+        timings["state_ready_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+        await prefetch
+
+        # Retrieve canon based on the player's input, narrowed by where the party is
+        t_retrieval = time.perf_counter()
+        # and recall folded campaign memory for the same input alongside it.
+        chunks, recalled = await asyncio.gather(
+            asyncio.to_thread(self.retriever.query_planned, user_text, state, TOP_K),
+            asyncio.to_thread(self.recall, user_text),
+        )
+        t_prompt = time.perf_counter()
+        stats = {"retrieval": dict(self.retriever.last_timings), "retrieval_cache": self.retriever.cache_stats()}
+        if self.history is not None:
+            stats["history"] = dict(self.history.last_timings)
+
+        prompt, canon, stats["prompt"] = build_prompt(state, chunks, user_text, recalled=recalled)
+        model_input = [
+            {"role": "system", "content": SYSTEM_RULES},
+            {"role": "user", "content": prompt}
+        ]
+        timings["prompt_ready_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+
+        t_model = time.perf_counter()
+        try:
+            raw, parsed = await asyncio.to_thread(self.generate, model_input)
+        except Exception as e:
+            # Retries are exhausted or the error is permanent; nothing was
+            # recorded, so the table can simply resubmit the turn.
+            print(f"\n[model call failed] {type(e).__name__}: {e}")
+            print("Nothing was recorded for this turn; resubmit it to try again.")
+            return
+        t_done = time.perf_counter()
+        timings["narration_done_ms"] = round((t_done - t0) * 1000.0, 2)
+        stats["model"] = dict(self.backend.last_call)
+
+        for stage, ms in (
+            ("state_ready", timings["state_ready_ms"]),
+            ("retrieval", (t_prompt - t_retrieval) * 1000.0),
+            ("prompt", (t_model - t_prompt) * 1000.0),
+            ("ttft", stats["model"].get("ttft_ms")),
+            ("model", (t_done - t_model) * 1000.0),
+            ("turn", timings["narration_done_ms"]),
+        ):
+            if ms is not None:
+                self.latencies[stage].append(ms)
+
+        # The delta (None if nothing was recoverable) is applied and journaled
+        # after the narration; parse problems go to the session log.
+        if parsed["diagnostics"]:
+            stats["parse"] = parsed["diagnostics"]
+        delta = parsed["delta"]
+        if delta is not None:
+            # Fields that don't match the schema are dropped and reported;
+            # the rest of the delta still applies.
+            delta, rejected = validate_delta(delta)
+            if rejected:
+                stats["schema_rejected"] = rejected
+        stats["timings"] = timings
+
+        self.last_turn += 1
+        self.pending = asyncio.create_task(self.post_turn(
+            turn_n=self.last_turn,
+            user_text=user_text,
+            raw=raw,
+            narration=parsed["narration"],
+            engine_notes=parsed["engine_notes"],
+            delta=delta,
+            state={"time": turn_time},
+            canon=canon,
+            stats=stats,
+        ))
+
+    async def post_turn(self, turn_n, user_text, raw, narration, engine_notes, delta, state, canon, stats):
+        """
+        Background writes for one turn, in a fixed order: state journal first,
+        then the public turn, the session log, the chapter and finally the
+        session index entry that makes the turn visible to lookups, then its
+        session history chunks. If the loop dies before the index entry, the
+        next open_index() indexes the turn from its logs.
+        """
+        t0 = time.perf_counter()
+        compacted = await self.apply_compaction()
+        if compacted:
+            stats["memory_compaction"] = compacted
+        notes = [f"[PARSE {d['level']}] {d['code']}: {d['message']}" for d in stats.get("parse", [])]
+        notes += [f"[SCHEMA] rejected {e['path']}: {e['message']}" for e in stats.get("schema_rejected", [])]
+        if delta is not None:
+            try:
+                await asyncio.to_thread(self.store.commit, delta, turn_n)
+            except Exception as e:
+                # A delta that doesn't apply is logged but never journaled.
+                notes.append(f"[NOTE] State was NOT updated (delta rejected: {e}).")
+                delta = {}
+        else:
+            notes.append("[NOTE] State was NOT updated (no usable STATE_DELTA_JSON).")
 
         # Write public journal turn (clean)
-        write_public_turn(turn_n, user_text, narration, state)
+        public_path, narration_offset = await asyncio.to_thread(write_public_turn, turn_n, user_text, narration, state)
 
         # Write private session log (full trace)
-        write_session_log(
+        private_path = await asyncio.to_thread(
+            write_session_log,
             turn_n=turn_n,
             player_input=user_text,
             model_raw=raw,
             narration=narration,
-            engine_notes=engine_notes + ("\n\n[NOTE] State was NOT updated (delta parse failed)." if not state_updated else ""),
-            delta=delta,
-            canon_used=canon
+            engine_notes=engine_notes + ("\n\n" + "\n".join(notes) if notes else ""),
+            delta=delta or {},
+            canon_used=canon,
+            stats=stats
         )
 
         # Chapter auto-add logic
-        ch = load_chapter_state()
+        ch = await asyncio.to_thread(load_chapter_state)
         if ch.get("active"):
             ch["turns"].append(turn_n)
-            save_chapter_state(ch)
+            await asyncio.to_thread(save_chapter_state, ch)
+
+        entry = await asyncio.to_thread(
+            self.index.record,
+            turn_n,
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            ch.get("slug") if ch.get("active") else None,
+            public_path,
+            private_path,
+            narration_offset,
+        )
+        if self.history is not None:
+            await asyncio.to_thread(self.history.add_turn, turn_n, user_text, narration, entry["chapter"], entry["ts"])
+        self.latencies["post_turn"].append((time.perf_counter() - t0) * 1000.0)
+        await self.maybe_compact(turn_n)
+
+def main():
+    ap = argparse.ArgumentParser(description="Interactive GM loop.")
+    ap.add_argument("--no-stream", action="store_true",
+                    help="Wait for the full model response instead of streaming narration")
+    add_backend_args(ap)
+    ap.add_argument("--replay", metavar="FILE",
+                    help="Run the turns and !commands in FILE (blank-line separated) instead of reading the keyboard")
+    ap.add_argument("--latency-json", metavar="PATH",
+                    help="With --replay, also write the latency percentiles to PATH as JSON")
+    args = ap.parse_args()
+
+    ensure_dirs()
+    backend = backend_from_args(args, model=MODEL)
+    store = StateStore(STATE_PATH)
+    read_input = ReplayInput(args.replay) if args.replay else read_multiline_or_command
+
+    retriever = get_retriever()
+    # The summarizer gets its own backend so its calls never mix with the
+    # turn's timing stats; the fake backend's canned text is no summary.
+    summarizer = ExtractiveSummarizer() if args.backend == "fake" else ModelSummarizer(backend_from_args(args, model=MODEL))
+    memory = CampaignMemory(retriever.client, retriever.embedder, summarizer)
+    history = HistoryIndex(retriever.client, retriever.embedder)
+
+    engine = TurnEngine(backend, retriever, store, stream=not args.no_stream, read_input=read_input, memory=memory, history=history)
+    asyncio.run(engine.run())
+
+    if args.replay:
+        report = latency_report(engine.latencies)
+        print_latency_report(report)
+        if args.latency_json:
+            with open(args.latency_json, "w", encoding="utf-8") as f:
+                json.dump({"backend": args.backend, "script": args.replay, "stages": report}, f, indent=2)
 
 if __name__ == "__main__":
     main()
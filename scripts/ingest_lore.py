@@ -1,14 +1,60 @@
-import os
+import argparse
 import glob
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import chromadb
-from sentence_transformers import SentenceTransformer
+
+from embeddings import EmbeddingProvider
+from lexical_index import LexicalIndex
 
 DB_PATH = "chroma_db"
 LORE_ROOT = "lore"
+MANIFEST_PATH = os.path.join(DB_PATH, "ingest_manifest.json")
+LEXICAL_PATH = os.path.join(DB_PATH, "lexical_index.json")
+MANIFEST_VERSION = 2
+BATCH_SIZE = 256
+
+# Opened in main() only: parse workers import this module and must not load
+# the model or the DB themselves.
+embedder = None
+client = None
+collection = None
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
-client = chromadb.PersistentClient(path=DB_PATH)
-collection = client.get_or_create_collection("lore")
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def empty_manifest(generation=0):
+    return {"version": MANIFEST_VERSION, "generation": generation, "files": {}}
+
+def load_manifest():
+    """
+    Manifest layout:
+      {"version": 2, "generation": <bumped on every change>,
+       "files": {<path>: {"hash": <file sha256>, "sections": {<id>: <section sha256>},
+                          "type": str, "name": str, "regions": [<region ids referenced>]}}}
+    The type/name/regions entries let the GM loop plan state-aware retrieval
+    without scanning the collection.
+    """
+    if not os.path.exists(MANIFEST_PATH):
+        return empty_manifest()
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return empty_manifest(manifest.get("generation", 0))
+    return manifest
+
+def save_manifest(manifest):
+    # write-then-rename so an interrupted run never leaves a half-written manifest
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, MANIFEST_PATH)
 
 def parse_markdown_sections(text):
     sections = []
@@ -40,10 +86,25 @@ def infer_metadata(filepath):
         "canon": "hard"
     }
 
-def ingest_file(filepath):
-    with open(filepath, "r", encoding="utf-8") as f:
-        text = f.read()
+REGION_REF_RE = re.compile(r"(?i)\bregion[\s_]+(\d{3})\b")
+REGION_RANGE_RE = re.compile(r"(?i)\bregions\s+(\d{3})\s*[\u2013\-]\s*(\d{3})\b")
+
+def find_region_refs(text):
+    """
+    Region ids a lore file talks about: "Region 001", "region_001" and
+    ranges like "regions 001–004".
+    """
+    found = {f"region_{n}" for n in REGION_REF_RE.findall(text)}
+    for lo, hi in REGION_RANGE_RE.findall(text):
+        for n in range(int(lo), int(hi) + 1):
+            found.add(f"region_{n:03d}")
+    return sorted(found)
 
+def build_sections(filepath, text):
+    """
+    Split a lore file into (ids, docs, metadatas). Ids stay "{filepath}:{i}"
+    where i is the section's position in the file.
+    """
     sections = parse_markdown_sections(text)
     docs, metadatas, ids = [], [], []
 
@@ -61,14 +122,188 @@ def ingest_file(filepath):
         metadatas.append(meta)
         ids.append(f"{filepath}:{i}")
 
-    if docs:
-        collection.add(documents=docs, metadatas=metadatas, ids=ids)
+    return ids, docs, metadatas
+
+def parse_file(job):
+    """
+    Process-pool worker: read, hash and split one lore file.
+    job is (filepath, previous_file_hash, full). Returns
+    (filepath, file_hash, sections) where sections is None when the file is
+    unchanged, else a list of (id, doc, meta, section_hash). Changed files also
+    carry the region ids they reference.
+    """
+    filepath, previous_hash, full = job
+    with open(filepath, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    file_hash = content_hash(text)
+    if not full and previous_hash == file_hash:
+        return filepath, file_hash, None, None
+
+    ids, docs, metadatas = build_sections(filepath, text)
+    sections = []
+    for sid, doc, meta in zip(ids, docs, metadatas):
+        # metadata is part of what gets stored, so it is part of the hash
+        h = content_hash(doc + "\0" + json.dumps(meta, sort_keys=True))
+        sections.append((sid, doc, meta, h))
+    return filepath, file_hash, sections, find_region_refs(text)
+
+def diff_file(manifest, filepath, file_hash, sections, regions, full=False):
+    """
+    Compare parsed sections against the manifest. Returns (changed, stale):
+    the (id, doc, meta) triples to upsert and the ids to delete. The manifest
+    entry is updated in place.
+    """
+    previous = manifest["files"].get(filepath, {"hash": None, "sections": {}})
+    section_hashes = {}
+    changed = []
+    for sid, doc, meta, h in sections:
+        section_hashes[sid] = h
+        if full or previous["sections"].get(sid) != h:
+            changed.append((sid, doc, meta))
+
+    stale = [sid for sid in previous["sections"] if sid not in section_hashes]
+    base_meta = infer_metadata(filepath)
+    manifest["files"][filepath] = {
+        "hash": file_hash,
+        "sections": section_hashes,
+        "type": base_meta["type"],
+        "name": base_meta["name"],
+        "regions": regions,
+    }
+    return changed, stale
+
+class BatchWriter:
+    """
+    Accumulates sections across files and upserts them in large batches so
+    the embedding function sees big inputs instead of one file at a time.
+    """
+
+    def __init__(self, col, embedder, batch_size):
+        self.col = col
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def add(self, items):
+        self.pending.extend(items)
+        while len(self.pending) >= self.batch_size:
+            self.flush(self.pending[:self.batch_size])
+            self.pending = self.pending[self.batch_size:]
+
+    def flush(self, items=None):
+        if items is None:
+            items, self.pending = self.pending, []
+        if not items:
+            return
+        docs = [doc for _, doc, _ in items]
+        t0 = time.perf_counter()
+        vectors = self.embedder.embed(docs)
+        t1 = time.perf_counter()
+        self.col.upsert(
+            ids=[sid for sid, _, _ in items],
+            documents=docs,
+            metadatas=[meta for _, _, meta in items],
+            embeddings=vectors,
+        )
+        self.embed_seconds += t1 - t0
+        self.write_seconds += time.perf_counter() - t1
+        self.written += len(items)
+        print(f"  upserted batch of {len(items)} ({self.written} total)")
+
+def remove_missing_files(manifest, present, lexical):
+    """
+    Drop sections belonging to files that were deleted from the lore tree.
+    """
+    deleted = 0
+    for path in [p for p in manifest["files"] if p not in present]:
+        ids = list(manifest["files"][path]["sections"])
+        if ids:
+            collection.delete(ids=ids)
+        for sid in ids:
+            lexical.remove(sid)
+        deleted += len(ids)
+        del manifest["files"][path]
+        print(f"Removed {path} ({len(ids)} sections)")
+    return deleted
+
+def open_collection():
+    global embedder, client, collection
+    embedder = EmbeddingProvider()
+    client = chromadb.PersistentClient(path=DB_PATH)
+    collection = client.get_or_create_collection("lore")
+    return collection
 
 def main():
-    md_files = glob.glob(f"{LORE_ROOT}/**/*.md", recursive=True)
-    for path in md_files:
-        print(f"Ingesting {path}")
-        ingest_file(path)
+    ap = argparse.ArgumentParser(description="Ingest lore/ into the Chroma lore collection.")
+    ap.add_argument("--full", action="store_true",
+                    help="Re-embed every section even if its content hash is unchanged")
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                    help=f"Sections per embedding/upsert batch (default {BATCH_SIZE})")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="Parse worker processes (default: CPU count)")
+    args = ap.parse_args()
+
+    manifest = load_manifest()
+    col = open_collection()
+    batch_size = args.batch_size
+    max_batch = getattr(client, "get_max_batch_size", None)
+    if max_batch:
+        batch_size = min(batch_size, max_batch())
+
+    # Without a lexical index on disk every file is re-parsed to rebuild it;
+    # the Chroma side still only receives sections whose hash changed.
+    rebuild_lexical = args.full or not os.path.exists(LEXICAL_PATH)
+    lexical = LexicalIndex() if rebuild_lexical else LexicalIndex.load(LEXICAL_PATH)
+
+    md_files = sorted(glob.glob(f"{LORE_ROOT}/**/*.md", recursive=True))
+    jobs = [
+        (p, None if rebuild_lexical else manifest["files"].get(p, {}).get("hash"), args.full)
+        for p in md_files
+    ]
+
+    writer = BatchWriter(col, embedder, batch_size)
+    stale_ids = []
+    parsed = 0
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for path, file_hash, sections, regions in pool.map(parse_file, jobs, chunksize=8):
+            if sections is None:
+                continue
+            parsed += len(sections)
+            changed, stale = diff_file(manifest, path, file_hash, sections, regions, full=args.full)
+            if changed or stale:
+                print(f"Ingesting {path} (+{len(changed)} changed, -{len(stale)} removed)")
+            writer.add(changed)
+            stale_ids.extend(stale)
+            for sid, doc, meta, _ in sections:
+                lexical.add(sid, doc, meta)
+    writer.flush()
+
+    if stale_ids:
+        col.delete(ids=stale_ids)
+        for sid in stale_ids:
+            lexical.remove(sid)
+    deleted = len(stale_ids) + remove_missing_files(manifest, set(md_files), lexical)
+    if parsed or deleted or rebuild_lexical:
+        lexical.save(LEXICAL_PATH)
+    elapsed = time.perf_counter() - t0
+
+    if writer.written or deleted or args.full:
+        manifest["generation"] = manifest.get("generation", 0) + 1
+    save_manifest(manifest)
+
+    busy = writer.embed_seconds + writer.write_seconds
+    rate = writer.written / busy if busy else 0.0
+    print(f"Done: {writer.written} sections upserted, {deleted} removed "
+          f"(manifest generation {manifest['generation']}).")
+    print(f"Parsed {parsed} sections from {len(md_files)} files in {elapsed:.2f}s; "
+          f"embed {writer.embed_seconds:.2f}s + write {writer.write_seconds:.2f}s "
+          f"({rate:.1f} sections/s, batch size {batch_size}).")
+    print(f"Embedding cache: {embedder.hits} hits, {embedder.misses} misses.")
 
 if __name__ == "__main__":
     main()
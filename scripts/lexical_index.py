@@ -0,0 +1,167 @@
+"""
+Small on-disk BM25 inverted index, kept alongside the Chroma collection.
+
+Dense MiniLM embeddings are weakest on proper nouns and ids (region_001,
+faction names, story seed titles); this index catches those exactly. It stores
+the section text and metadata too, so a lexical hit can go straight into the
+prompt without a round-trip to the vector store.
+"""
+
+import json
+import math
+import os
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:_[a-z0-9]+)*")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "to", "was", "we", "with",
+}
+INDEX_VERSION = 1
+
+def tokenize(text):
+    """
+    Lowercased word tokens. Underscored ids are kept whole and also split,
+    so "region_001" matches both "region_001" and "Region 001".
+    """
+    out = []
+    for tok in TOKEN_RE.findall(text.lower()):
+        if "_" in tok:
+            out.append(tok)
+            out.extend(p for p in tok.split("_") if p not in STOPWORDS)
+        elif tok not in STOPWORDS:
+            out.append(tok)
+    return out
+
+def matches_where(meta, where):
+    """
+    Evaluate the subset of Chroma's where syntax the retriever uses:
+    {"field": value}, {"field": {"$eq"|"$ne"|"$in"|"$nin": ...}}, $and, $or.
+    """
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches_where(meta, w) for w in cond):
+                return False
+        elif key == "$or":
+            if not any(matches_where(meta, w) for w in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = meta.get(key)
+            for op, arg in cond.items():
+                if op == "$eq" and value != arg:
+                    return False
+                if op == "$ne" and value == arg:
+                    return False
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$nin" and value in arg:
+                    return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+class LexicalIndex:
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = {}      # id -> {"doc", "meta", "tf": {term: count}, "len"}
+        self.postings = {}  # term -> {id: tf}
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc_id, text, meta):
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        tf = {}
+        # The file name (e.g. faction_river_wardens) is searchable in every section.
+        tokens = tokenize(text) + tokenize(str(meta.get("name", "")))
+        for tok in tokens:
+            tf[tok] = tf.get(tok, 0) + 1
+        self._insert(doc_id, {"doc": text, "meta": meta, "tf": tf, "len": len(tokens)})
+
+    def _insert(self, doc_id, entry):
+        self.docs[doc_id] = entry
+        self.total_len += entry["len"]
+        for tok, n in entry["tf"].items():
+            self.postings.setdefault(tok, {})[doc_id] = n
+
+    def remove(self, doc_id):
+        entry = self.docs.pop(doc_id, None)
+        if entry is None:
+            return
+        self.total_len -= entry["len"]
+        for tok in entry["tf"]:
+            plist = self.postings.get(tok)
+            if plist is not None:
+                plist.pop(doc_id, None)
+                if not plist:
+                    del self.postings[tok]
+
+    def search(self, query, k=10, where=None):
+        """
+        BM25 top-k as a list of (id, score), best first.
+        """
+        if not self.docs:
+            return []
+        n_docs = len(self.docs)
+        avg_len = self.total_len / n_docs or 1.0
+        scores = {}
+        for tok in set(tokenize(query)):
+            plist = self.postings.get(tok)
+            if not plist:
+                continue
+            idf = math.log(1.0 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for doc_id, tf in plist.items():
+                dl = self.docs[doc_id]["len"]
+                denom = tf + self.k1 * (1.0 - self.b + self.b * dl / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / denom
+
+        ranked = sorted(scores.items(), key=lambda t: (-t[1], t[0]))
+        if where:
+            ranked = [t for t in ranked if matches_where(self.docs[t[0]]["meta"], where)]
+        return ranked[:k]
+
+    def get(self, doc_id):
+        entry = self.docs[doc_id]
+        return entry["doc"], entry["meta"]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        payload = {"version": INDEX_VERSION, "k1": self.k1, "b": self.b, "docs": self.docs}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved by save(); a missing or outdated file gives an
+        empty index. Postings are rebuilt from the stored term frequencies.
+        """
+        idx = cls()
+        if not os.path.exists(path):
+            return idx
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("version") != INDEX_VERSION:
+            return idx
+        idx.k1 = payload.get("k1", idx.k1)
+        idx.b = payload.get("b", idx.b)
+        for doc_id, entry in payload["docs"].items():
+            idx._insert(doc_id, entry)
+        return idx
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several ranked id lists into one: score(id) = sum 1 / (k + rank).
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda d: (-scores[d], d))
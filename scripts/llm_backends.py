@@ -0,0 +1,590 @@
+"""
+Model backends for the GM loop.
+
+A backend turns the model input (system + user messages) into the raw
+GM_NARRATION / ENGINE_NOTES / STATE_DELTA_JSON text, either all at once
+(complete) or as text deltas (stream). Three implementations:
+
+- openai: the OpenAI Responses API (needs OPENAI_API_KEY).
+- http:   any OpenAI-compatible /v1/chat/completions endpoint, e.g. a local
+          model server or scripts/stub_llm_server.py.
+- fake:   in-process canned responses with configurable latency and token
+          rate, for replaying and profiling the rest of the turn pipeline.
+
+After every call, backend.last_call holds its timing (time to first token,
+total) and token counts. Counts come from the API's usage report when it
+gives one and are estimated (~4 characters per token) otherwise.
+
+Every backend keeps one client (one keep-alive connection pool) for its
+lifetime. Failed calls are retried with bounded exponential backoff when the
+error is transient (connection errors, timeouts, 408/409/429/5xx), and only
+while nothing has been streamed to the table yet. With hedging on, a second
+identical request is fired once the first has been waiting longer than the
+threshold (fixed, or the p95 of recent calls) and whichever answers first
+wins. Retry and hedge counts are part of last_call.
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from urllib.parse import urlsplit
+
+from prompt_builder import estimate_tokens
+
+MODEL = "gpt-5-mini"
+DEFAULT_BASE_URL = os.environ.get("OPENAI_BASE_URL", "http://127.0.0.1:8080/v1")
+WATCHES = ("morning", "afternoon", "evening", "night")
+
+RETRIES = 3
+BACKOFF_S = 0.5
+BACKOFF_MAX_S = 8.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Latency samples kept for the p95 hedge threshold, and how many are needed
+# before hedging starts.
+HEDGE_WINDOW = 100
+HEDGE_MIN_SAMPLES = 20
+POOL_SIZE = 4
+
+class BackendError(RuntimeError):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+def is_retryable(exc):
+    status = getattr(exc, "status", None) or getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, (OSError, HTTPException, TimeoutError)):
+        return True
+    # openai's connection/timeout errors carry no status code.
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+def backoff_delay(attempt, base=BACKOFF_S, cap=BACKOFF_MAX_S):
+    # Exponential with "equal jitter": between half and all of base * 2^attempt.
+    d = min(cap, base * (2 ** attempt))
+    return d / 2 + random.uniform(0, d / 2)
+
+def player_text(model_input):
+    """
+    The player's input from a GM loop prompt (the text after the last
+    PLAYER ACTIONS / INTENT: header), or the whole last message.
+    """
+    if isinstance(model_input, str):
+        content = model_input
+    else:
+        content = model_input[-1]["content"] if model_input else ""
+    head, sep, tail = content.rpartition("PLAYER ACTIONS / INTENT:")
+    return (tail if sep else content).strip()
+
+def canned_response(model_input):
+    """
+    Deterministic GM response: it depends only on the player text, so a
+    replayed script produces the same logs and state every run.
+    """
+    text = player_text(model_input)
+    h = zlib.crc32(text.encode("utf-8"))
+    first = text.splitlines()[0] if text else "(nothing)"
+    delta = {
+        "time_advance": {"watch": WATCHES[h % len(WATCHES)]},
+        "facts_add": [f"Party: {first[:80]}"],
+    }
+    return (
+        "GM_NARRATION:\n"
+        f"The world answers your intent ({first[:80]}). The wind shifts; nothing else stirs.\n\n"
+        "ENGINE_NOTES:\n"
+        f"Canned response {h:08x}.\n\n"
+        "STATE_DELTA_JSON:\n"
+        f"```json\n{json.dumps(delta, ensure_ascii=False)}\n```\n"
+    )
+
+def input_text(model_input):
+    if isinstance(model_input, str):
+        return model_input
+    return "\n".join(m.get("content", "") for m in model_input)
+
+def as_messages(model_input):
+    if isinstance(model_input, str):
+        return [{"role": "user", "content": model_input}]
+    return list(model_input)
+
+class ModelBackend:
+    """
+    Subclasses implement _complete(model_input) -> (text, usage) and
+    _stream(model_input), a generator of text deltas that may also yield one
+    usage dict. usage is {"input_tokens", "output_tokens"} or None. Both may
+    be called from several threads at once when hedging.
+
+    hedge_after_ms is None (off), a number of milliseconds, or "p95".
+    """
+
+    name = "base"
+
+    def __init__(self, model=MODEL, retries=RETRIES, backoff_s=BACKOFF_S, hedge_after_ms=None):
+        self.model = model
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.hedge_after_ms = hedge_after_ms
+        self.samples = {"stream": deque(maxlen=HEDGE_WINDOW), "complete": deque(maxlen=HEDGE_WINDOW)}
+        self.totals = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+        self.last_call = {}
+
+    def hedge_threshold(self, kind):
+        """
+        Seconds to wait before hedging a call of this kind, or None.
+        """
+        if self.hedge_after_ms is None:
+            return None
+        if self.hedge_after_ms != "p95":
+            return float(self.hedge_after_ms) / 1000.0
+        samples = sorted(self.samples[kind])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, -(-95 * len(samples) // 100) - 1)]
+
+    def _failed(self, exc, attempt, emitted, info):
+        # Decide whether to retry; sleeps the backoff when it does.
+        if emitted or attempt >= self.retries or not is_retryable(exc):
+            self.totals["failures"] += 1
+            return False
+        info["retries"] += 1
+        self.totals["retries"] += 1
+        time.sleep(backoff_delay(attempt, self.backoff_s))
+        return True
+
+    def complete(self, model_input):
+        info = {"retries": 0, "hedged": False, "hedge_won": False}
+        self.totals["calls"] += 1
+        t0 = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                text, usage = self._race_complete(model_input, info)
+                break
+            except Exception as exc:
+                if not self._failed(exc, attempt, False, info):
+                    raise
+                attempt += 1
+        t1 = time.perf_counter()
+        self.samples["complete"].append(t1 - t0)
+        self._record(model_input, text, usage, t0, t1, t1, False, info)
+        return text
+
+    def stream(self, model_input):
+        info = {"retries": 0, "hedged": False, "hedge_won": False}
+        self.totals["calls"] += 1
+        t0 = time.perf_counter()
+        first = None
+        parts = []
+        usage = None
+        attempt = 0
+        while True:
+            try:
+                for item in self._race_stream(model_input, info):
+                    if isinstance(item, dict):
+                        usage = item
+                        continue
+                    if not item:
+                        continue
+                    if first is None:
+                        first = time.perf_counter()
+                        self.samples["stream"].append(first - t0)
+                    parts.append(item)
+                    yield item
+                break
+            except Exception as exc:
+                # Once text has reached the table a retry would repeat it.
+                if not self._failed(exc, attempt, first is not None, info):
+                    raise
+                attempt += 1
+        t1 = time.perf_counter()
+        self._record(model_input, "".join(parts), usage, t0, first or t1, t1, True, info)
+
+    def _start_hedge(self, info, start, tag):
+        info["hedged"] = True
+        self.totals["hedges"] += 1
+        start(tag)
+
+    def _won(self, info, tag):
+        if tag == 1:
+            info["hedge_won"] = True
+            self.totals["hedge_wins"] += 1
+
+    def _race_complete(self, model_input, info):
+        threshold = self.hedge_threshold("complete")
+        if threshold is None:
+            return self._complete(model_input)
+
+        results = queue.Queue()
+
+        def run(tag):
+            try:
+                results.put((tag, True, self._complete(model_input)))
+            except Exception as exc:
+                results.put((tag, False, exc))
+
+        def start(tag):
+            threading.Thread(target=run, args=(tag,), daemon=True).start()
+
+        start(0)
+        running, hedged, error = 1, False, None
+        while running:
+            try:
+                tag, ok, value = results.get(timeout=None if hedged else threshold)
+            except queue.Empty:
+                hedged = True
+                self._start_hedge(info, start, 1)
+                running += 1
+                continue
+            running -= 1
+            if ok:
+                self._won(info, tag)
+                return value
+            # The primary failing before the threshold goes to the retry loop.
+            error = value
+        raise error
+
+    def _race_stream(self, model_input, info):
+        """
+        Stream from the first request to produce text; a hedge is fired if
+        the primary has produced nothing after the threshold. The loser is
+        told to stop and its output ignored.
+        """
+        threshold = self.hedge_threshold("stream")
+        if threshold is None:
+            yield from self._stream(model_input)
+            return
+
+        events = queue.Queue()
+        cancelled = [threading.Event(), threading.Event()]
+
+        def pump(tag):
+            gen = self._stream(model_input)
+            try:
+                for item in gen:
+                    if cancelled[tag].is_set():
+                        break
+                    events.put((tag, "item", item))
+                events.put((tag, "done", None))
+            except Exception as exc:
+                events.put((tag, "error", exc))
+            finally:
+                gen.close()
+
+        def start(tag):
+            threading.Thread(target=pump, args=(tag,), daemon=True).start()
+
+        start(0)
+        running, hedged, winner, held, error = 1, False, None, {0: [], 1: []}, None
+        try:
+            while True:
+                waiting = winner is None and not hedged
+                try:
+                    tag, kind, value = events.get(timeout=threshold if waiting else None)
+                except queue.Empty:
+                    hedged = True
+                    self._start_hedge(info, start, 1)
+                    running += 1
+                    continue
+                if winner is not None and tag != winner:
+                    continue
+                if kind == "error":
+                    if winner is not None:
+                        raise value
+                    running -= 1
+                    error = value
+                    if running == 0:
+                        raise error
+                    continue
+                if winner is None and (kind == "done" or not isinstance(value, dict)):
+                    winner = tag
+                    cancelled[1 - tag].set()
+                    self._won(info, tag)
+                    yield from held[tag]
+                if winner is None:
+                    held[tag].append(value)  # usage before any text
+                    continue
+                if kind == "done":
+                    return
+                yield value
+        finally:
+            cancelled[0].set()
+            cancelled[1].set()
+
+    def _record(self, model_input, text, usage, t0, t_first, t1, stream, info):
+        estimated = not usage
+        if estimated:
+            usage = {"input_tokens": estimate_tokens(input_text(model_input)), "output_tokens": estimate_tokens(text)}
+        gen_s = t1 - t_first
+        self.last_call = {
+            "backend": self.name,
+            "model": self.model,
+            "stream": stream,
+            "ttft_ms": round((t_first - t0) * 1000.0, 2),
+            "total_ms": round((t1 - t0) * 1000.0, 2),
+            "input_tokens": usage["input_tokens"],
+            "output_tokens": usage["output_tokens"],
+            "tokens_estimated": estimated,
+            "tokens_per_s": round(usage["output_tokens"] / gen_s, 1) if gen_s > 0 else None,
+            **info,
+        }
+
+class OpenAIBackend(ModelBackend):
+    name = "openai"
+
+    def __init__(self, model=MODEL, client=None, **opts):
+        super().__init__(model, **opts)
+        if client is None:
+            from openai import OpenAI
+            # Retries are done here, so the SDK's own are turned off.
+            client = OpenAI(max_retries=0)
+        self.client = client
+
+    @staticmethod
+    def _usage(usage):
+        if usage is None:
+            return None
+        return {"input_tokens": usage.input_tokens, "output_tokens": usage.output_tokens}
+
+    def _complete(self, model_input):
+        resp = self.client.responses.create(model=self.model, input=model_input)
+        return resp.output_text, self._usage(getattr(resp, "usage", None))
+
+    def _stream(self, model_input):
+        for event in self.client.responses.create(model=self.model, input=model_input, stream=True):
+            if event.type == "response.output_text.delta":
+                yield event.delta
+            elif event.type == "response.completed":
+                usage = self._usage(getattr(event.response, "usage", None))
+                if usage:
+                    yield usage
+
+# Errors from reusing a keep-alive connection the server has since closed.
+STALE_CONNECTION_ERRORS = (ConnectionResetError, BrokenPipeError, HTTPException)
+
+class OpenAICompatibleBackend(ModelBackend):
+    """
+    Chat Completions over a small pool of persistent HTTP/1.1 connections
+    (keep-alive), using only the standard library. A hedged call borrows a
+    second connection.
+    """
+
+    name = "http"
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, model=MODEL, api_key=None, timeout=120.0, **opts):
+        super().__init__(model, **opts)
+        u = urlsplit(base_url)
+        self.scheme = u.scheme or "http"
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port
+        self.path = u.path.rstrip("/") + "/chat/completions"
+        self.api_key = api_key if api_key is not None else os.environ.get("OPENAI_API_KEY", "")
+        self.timeout = timeout
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def _new_connection(self):
+        cls = HTTPSConnection if self.scheme == "https" else HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, conn):
+        with self.lock:
+            if len(self.idle) < POOL_SIZE:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+    def _post(self, body):
+        """
+        Send one request; returns (connection, response). The caller reads
+        the response fully and then releases the connection.
+        """
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        data = json.dumps(body).encode("utf-8")
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        reused = conn is not None
+        if conn is None:
+            conn = self._new_connection()
+        while True:
+            try:
+                conn.request("POST", self.path, body=data, headers=headers)
+                resp = conn.getresponse()
+                break
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                # The server dropped an idle connection; that is not a failed call.
+                conn, reused = self._new_connection(), False
+            except Exception:
+                conn.close()
+                raise
+        if resp.status >= 400:
+            detail = resp.read().decode("utf-8", "replace")[:500]
+            self._release(conn)
+            raise BackendError(f"{self.host}:{self.port}{self.path} returned HTTP {resp.status}: {detail}", resp.status)
+        return conn, resp
+
+    @staticmethod
+    def _usage(usage):
+        if not usage:
+            return None
+        return {"input_tokens": usage.get("prompt_tokens", 0), "output_tokens": usage.get("completion_tokens", 0)}
+
+    def _complete(self, model_input):
+        conn, resp = self._post({"model": self.model, "messages": as_messages(model_input)})
+        try:
+            data = json.loads(resp.read())
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn)
+        text = "".join((c.get("message") or {}).get("content") or "" for c in data.get("choices", []))
+        return text, self._usage(data.get("usage"))
+
+    def _stream(self, model_input):
+        conn, resp = self._post({
+            "model": self.model,
+            "messages": as_messages(model_input),
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        })
+        drained = finished = False
+        try:
+            for line in resp:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == b"[DONE]":
+                    finished = True
+                    break
+                chunk = json.loads(payload)
+                usage = self._usage(chunk.get("usage"))
+                if usage:
+                    yield usage
+                for c in chunk.get("choices") or []:
+                    content = (c.get("delta") or {}).get("content")
+                    if content:
+                        yield content
+                    finished = finished or bool(c.get("finish_reason"))
+            if not finished:
+                # http.client ends a chunked body quietly when the peer hangs
+                # up; a truncated response must not pass for a whole one.
+                raise ConnectionError(f"{self.host}:{self.port}{self.path} stream ended before [DONE]")
+            resp.read()
+            drained = True
+        finally:
+            # A response abandoned halfway (error, or a losing hedge) leaves
+            # the connection unusable.
+            if drained:
+                self._release(conn)
+            else:
+                conn.close()
+
+def token_pieces(text, chars_per_token=4):
+    return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+
+class FakeBackend(ModelBackend):
+    """
+    In-process canned responses (canned_response). latency_ms is the time to
+    the first token; tokens_per_s paces the rest (0 = as fast as possible).
+    """
+
+    name = "fake"
+
+    def __init__(self, model="fake", latency_ms=0.0, tokens_per_s=0.0, respond=canned_response, **opts):
+        super().__init__(model, **opts)
+        self.latency_ms = latency_ms
+        self.tokens_per_s = tokens_per_s
+        self.respond = respond
+
+    def _usage(self, model_input, pieces):
+        return {"input_tokens": estimate_tokens(input_text(model_input)), "output_tokens": len(pieces)}
+
+    def _complete(self, model_input):
+        pieces = token_pieces(self.respond(model_input))
+        delay = self.latency_ms / 1000.0
+        if self.tokens_per_s:
+            delay += len(pieces) / self.tokens_per_s
+        if delay:
+            time.sleep(delay)
+        return "".join(pieces), self._usage(model_input, pieces)
+
+    def _stream(self, model_input):
+        pieces = token_pieces(self.respond(model_input))
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        start = time.perf_counter()
+        for i, piece in enumerate(pieces):
+            if self.tokens_per_s and i:
+                wait = start + i / self.tokens_per_s - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            yield piece
+        yield self._usage(model_input, pieces)
+
+BACKENDS = ("openai", "http", "fake")
+
+def make_backend(name, model=MODEL, base_url=DEFAULT_BASE_URL, latency_ms=0.0, tokens_per_s=0.0,
+                 retries=RETRIES, hedge_after_ms=None):
+    opts = {"retries": retries, "hedge_after_ms": hedge_after_ms}
+    if name == "openai":
+        return OpenAIBackend(model=model, **opts)
+    if name == "http":
+        return OpenAICompatibleBackend(base_url=base_url, model=model, **opts)
+    if name == "fake":
+        return FakeBackend(latency_ms=latency_ms, tokens_per_s=tokens_per_s, **opts)
+    raise ValueError(f"unknown backend {name!r} (choose from {', '.join(BACKENDS)})")
+
+def parse_hedge(value):
+    """
+    --hedge value: "off", "p95" or a number of milliseconds.
+    """
+    if value in (None, "", "off"):
+        return None
+    if value == "p95":
+        return value
+    return float(value)
+
+def add_backend_args(ap, default="openai"):
+    """
+    The --backend options shared by gm_loop.py and openai_smoke_test.py.
+    """
+    ap.add_argument("--backend", choices=BACKENDS, default=default,
+                    help="openai | http (OpenAI-compatible endpoint) | fake (in-process, no network)")
+    ap.add_argument("--base-url", default=DEFAULT_BASE_URL,
+                    help="Endpoint for --backend http (default: $OPENAI_BASE_URL, else http://127.0.0.1:8080/v1)")
+    ap.add_argument("--fake-latency-ms", type=float, default=0.0,
+                    help="--backend fake: delay before the first token")
+    ap.add_argument("--fake-tokens-per-s", type=float, default=0.0,
+                    help="--backend fake: output token rate (0 = unthrottled)")
+    ap.add_argument("--retries", type=int, default=RETRIES,
+                    help="Retries for transient model-call errors, with exponential backoff (default %(default)s)")
+    ap.add_argument("--hedge", type=parse_hedge, default=None, metavar="off|p95|MS",
+                    help="Fire a second request when the first is slower than MS, or than the recent p95")
+
+def backend_from_args(args, model=MODEL):
+    return make_backend(
+        args.backend,
+        model=model,
+        base_url=args.base_url,
+        latency_ms=args.fake_latency_ms,
+        tokens_per_s=args.fake_tokens_per_s,
+        retries=args.retries,
+        hedge_after_ms=args.hedge,
+    )
@@ -1,13 +1,17 @@
-from openai import OpenAI
+import argparse
+import json
 
-client = OpenAI()
+from llm_backends import add_backend_args, backend_from_args
 
 def main():
-    resp = client.responses.create(
-        model="gpt-5-mini",
-        input="Write one sentence describing a dwarven valley without naming it."
-    )
-    print(resp.output_text)
+    ap = argparse.ArgumentParser(description="One-sentence round trip through a model backend.")
+    add_backend_args(ap)
+    args = ap.parse_args()
+
+    backend = backend_from_args(args, model="gpt-5-mini")
+    text = backend.complete("Write one sentence describing a dwarven valley without naming it.")
+    print(text)
+    print(json.dumps(backend.last_call))
 
 if __name__ == "__main__":
     main()
@@ -8,6 +8,13 @@ Supports:
 
 Usage:
   python scripts/pdf_to_party.py --out state/party.json A_PRINTED.pdf B_PRINTED.pdf
+  python scripts/pdf_to_party.py --jobs 0 sheets/*.pdf     # one worker per CPU
+
+Each PDF is opened once; its form fields and text come from the same reader.
+Attack and skill tables are rebuilt by column from positioned text
+(--tables layout, the default), with a 0-1 confidence per row.
+With --jobs, PDFs are imported in a process pool. A PDF that fails is
+reported in the summary and skipped; the others are still written.
 
 Debug:
   python scripts/pdf_to_party.py --debug-text A_PRINTED.pdf
@@ -16,13 +23,24 @@ Debug:
 from __future__ import annotations
 
 import argparse
+import bisect
 import json
 import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from typing import Any, Dict, List, Optional, Tuple
 
 from pypdf import PdfReader
 
+try:
+    # AFM widths of the 14 standard fonts, which sheets use without a
+    # /Widths array. The module is private to pypdf, so it is optional.
+    from pypdf._codecs.core_font_metrics import CORE_FONT_METRICS
+except ImportError:
+    CORE_FONT_METRICS = {}
+
 
 # --------------------------
 # Utilities
@@ -52,8 +70,7 @@ def first_int(s: str) -> Optional[int]:
 def clean_spaces(s: str) -> str:
     return re.sub(r"[ \t]+", " ", s).strip()
 
-def read_pdf_text(pdf_path: str) -> str:
-    reader = PdfReader(pdf_path)
+def text_from_reader(reader: PdfReader) -> str:
     parts: List[str] = []
     for p in reader.pages:
         try:
@@ -64,8 +81,187 @@ def read_pdf_text(pdf_path: str) -> str:
             parts.append(t)
     return "\n".join(parts)
 
-def read_pdf_fields(pdf_path: str) -> Dict[str, Any]:
-    reader = PdfReader(pdf_path)
+# A positioned piece of page text: (x, y, font size, text, end x), in page
+# units.
+Fragment = Tuple[float, float, float, str, float]
+
+# Glyph width, in thousandths of the font size, when the font doesn't say.
+DEFAULT_GLYPH_WIDTH = 500.0
+# Text on one baseline closer than this many font sizes is one table cell.
+CELL_GAP = 0.6
+
+def _mat_mult(a: List[float], b: List[float]) -> List[float]:
+    return [
+        a[0] * b[0] + a[1] * b[2], a[0] * b[1] + a[1] * b[3],
+        a[2] * b[0] + a[3] * b[2], a[2] * b[1] + a[3] * b[3],
+        a[4] * b[0] + a[5] * b[2] + b[4], a[4] * b[1] + a[5] * b[3] + b[5],
+    ]
+
+def _squash(text: str) -> str:
+    return "".join(text.split())
+
+def font_glyph_widths(font: Any) -> Optional[Dict[str, float]]:
+    """
+    Character -> advance width (thousandths of the font size) of a simple
+    font resource, keyed by the Latin-1 reading of its codes like
+    _shown_pieces: the font's /Widths, or the AFM metrics of the standard font
+    it names. None for composite fonts and fonts that say neither; their
+    widths are estimated.
+    """
+    try:
+        font = font.get_object()
+        if font.get("/Subtype") == "/Type0":
+            return None
+        widths = font.get("/Widths")
+        if widths is not None:
+            first = int(font.get("/FirstChar", 0))
+            out = {chr(first + i): float(w) for i, w in enumerate(widths.get_object())}
+            missing = (font.get("/FontDescriptor") or {}).get("/MissingWidth")
+            out["default"] = float(missing) if missing else DEFAULT_GLYPH_WIDTH
+            return out
+        base = str(font.get("/BaseFont", "")).lstrip("/").split("+")[-1]
+        metrics = CORE_FONT_METRICS.get(base)
+        return dict(metrics.character_widths) if metrics else None
+    except Exception:
+        return None
+
+def text_width(text: str, size: float, widths: Optional[Dict[str, float]]) -> float:
+    """
+    Advance width of text at size, in text space. Without widths, half the
+    font size per character, which is close for proportional fonts.
+    """
+    if widths is None:
+        return len(text) * size * 0.5
+    default = widths.get("default", DEFAULT_GLYPH_WIDTH)
+    return sum(map(widths.get, text, repeat(default, len(text)))) * size / 1000.0
+
+def _shown_pieces(operator: bytes, operands: List[Any], size: float,
+                  widths: Optional[Dict[str, float]]) -> Tuple[List[Tuple[float, float, str]], float]:
+    """
+    A guess at what a Tj/TJ operator shows, as (start, end, text) pieces in
+    text space from the pen, and how far it moves the pen (TJ's kerning
+    included). Strings are read as Latin-1: right for the simple fonts
+    sheets are printed with; for anything else the pieces won't add up to
+    pypdf's decoded run, and the caller keeps the run whole. A TJ is cut
+    where its kerning opens a gap as wide as the one between two cells.
+    """
+    items = operands[0] if operator == b"TJ" else [operands[0]]
+    pieces: List[Tuple[float, float, str]] = []
+    pen = 0.0
+    cur: Optional[List[Any]] = None
+    for item in items:
+        if isinstance(item, (bytes, str)):
+            text = item.decode("latin-1") if isinstance(item, bytes) else item
+            width = text_width(text, size, widths)
+            if cur is None:
+                cur = [pen, pen + width, text]
+            else:
+                cur[1], cur[2] = pen + width, cur[2] + text
+            pen += width
+        elif isinstance(item, (int, float)):
+            gap = -float(item) * size / 1000.0
+            pen += gap
+            if cur is not None and gap >= size * CELL_GAP:
+                pieces.append((cur[0], cur[1], cur[2]))
+                cur = None
+    if cur is not None:
+        pieces.append((cur[0], cur[1], cur[2]))
+    return pieces, pen
+
+def text_and_layout_from_reader(reader: PdfReader) -> Tuple[str, List[List[Fragment]]]:
+    """
+    text_from_reader plus, from the same extraction pass, every page's text
+    fragments with their positions. pypdf's visitor_text reports one run per
+    line, positioned at its start, so the position of each text-showing
+    operator is recorded too (visitor_operand_before); when the operators'
+    strings add up to the run, the run is split back into them, which is
+    what keeps table cells apart.
+
+    Each fragment's end comes from the font's glyph widths where it has
+    them. pypdf doesn't move the text matrix past shown text, so operators
+    shown back to back without a new position are placed by the same
+    widths.
+    """
+    parts: List[str] = []
+    pages: List[List[Fragment]] = []
+    for p in reader.pages:
+        frags: List[Fragment] = []
+        shown: List[Tuple[float, float, float, Optional[str], float]] = []
+        try:
+            fonts = p["/Resources"]["/Font"]
+        except Exception:
+            fonts = {}
+        state: Dict[str, Any] = {"size": 1.0, "widths": None, "tm": None, "advance": 0.0, "fonts": {}, "runs": {}}
+
+        def before(operator, operands, cm, tm, shown=shown, state=state, fonts=fonts):
+            if operator == b"Tf" and len(operands) >= 2:
+                try:
+                    state["size"] = float(operands[1])
+                except (TypeError, ValueError):
+                    pass
+                name = str(operands[0])
+                if name not in state["fonts"]:
+                    state["fonts"][name] = font_glyph_widths(fonts[name]) if name in fonts else None
+                state["widths"] = state["fonts"][name]
+            elif operator in (b"Tj", b"TJ"):
+                if tm != state["tm"]:
+                    state["tm"], state["advance"] = list(tm), 0.0
+                if not operands:
+                    shown.append((0.0, 0.0, 0.0, None, 0.0))
+                    return
+                m = _mat_mult(tm, cm)
+                scale = abs(m[0]) or 1.0
+                size, widths = state["size"], state["widths"]
+                pieces, advance = _shown_pieces(operator, operands, size, widths)
+                pen = m[4] + state["advance"] * scale
+                state["advance"] += advance
+                for start, end, t in pieces:
+                    # Surrounding spaces move the pen but aren't the cell.
+                    if t[:1].isspace():
+                        start += text_width(t[:len(t) - len(t.lstrip())], size, widths)
+                    if t[-1:].isspace():
+                        end -= text_width(t[len(t.rstrip()):], size, widths)
+                    shown.append((pen + start * scale, m[5], size * (abs(m[3]) or 1.0), t, pen + end * scale))
+            elif operator in (b"'", b'"'):
+                # These move to the next line first; let the run stand whole.
+                shown.append((0.0, 0.0, 0.0, None, 0.0))
+
+        def visit(text, cm, tm, font, size, frags=frags, shown=shown, state=state):
+            target = _squash(text or "")
+            if not target:
+                return
+            acc, n = "", 0
+            while n < len(shown) and len(acc) < len(target) and shown[n][3] is not None:
+                acc += _squash(shown[n][3])
+                n += 1
+            if acc == target and n > 1:
+                frags.extend((x, y, fs, t.strip(), end) for x, y, fs, t, end in shown[:n] if t.strip())
+                del shown[:n]
+                return
+            # The run may be reported after the next Tf, so its own font
+            # gives the widths, not the current one.
+            key = id(font)
+            if key not in state["runs"]:
+                state["runs"][key] = (font, font_glyph_widths(font) if font else None)
+            widths = state["runs"][key][1]
+            m = _mat_mult(tm, cm)
+            fs = (size or 1.0) * (abs(m[3]) or 1.0)
+            for j, piece in enumerate(text.split("\n")):
+                if piece.strip():
+                    end = m[4] + text_width(piece.strip(), size or 1.0, widths) * (abs(m[0]) or 1.0)
+                    frags.append((m[4], m[5] - j * fs * 1.2, fs, piece.strip(), end))
+            del shown[:max(n, 1)]
+
+        try:
+            t = p.extract_text(visitor_operand_before=before, visitor_text=visit) or ""
+        except Exception:
+            t = ""
+        if t:
+            parts.append(t)
+        pages.append(frags)
+    return "\n".join(parts), pages
+
+def fields_from_reader(reader: PdfReader) -> Dict[str, Any]:
     fields: Dict[str, Any] = {}
     try:
         raw = reader.get_fields() or {}
@@ -85,18 +281,59 @@ def read_pdf_fields(pdf_path: str) -> Dict[str, Any]:
         fields = {}
     return fields
 
-def pick_field(fields: Dict[str, Any], candidates: List[str]) -> Optional[Any]:
+def read_pdf_text(pdf_path: str) -> str:
+    return text_from_reader(PdfReader(pdf_path))
+
+def read_pdf_fields(pdf_path: str) -> Dict[str, Any]:
+    return fields_from_reader(PdfReader(pdf_path))
+
+class FieldIndex:
+    """
+    Form fields indexed once per PDF for pick_field: a normalized-name map
+    for exact hits, and every normalized name joined into one string for the
+    substring fallback. A miss is then one str.find over that string plus a
+    bisect back to the field, instead of a Python loop over hundreds of
+    names. find returns the leftmost hit, so the fallback still picks the
+    first field, in field order, whose name contains the candidate.
+    """
+
+    def __init__(self, fields: Dict[str, Any]):
+        self.fields = fields
+        self.norm_map = {norm(k): k for k in fields.keys()}
+        self.names = list(self.norm_map)
+        # norm() leaves only [a-z0-9], so the separator never takes part in a match.
+        self.haystack = "\0".join(self.names)
+        self.starts: List[int] = []
+        offset = 0
+        for nk in self.names:
+            self.starts.append(offset)
+            offset += len(nk) + 1
+
+    def __bool__(self) -> bool:
+        return bool(self.fields)
+
+    def pick(self, candidates: List[str]) -> Optional[Any]:
+        for c in candidates:
+            cn = norm(c)
+            if cn in self.norm_map:
+                return self.fields[self.norm_map[cn]]
+            if cn:
+                at = self.haystack.find(cn)
+                if at >= 0:
+                    nk = self.names[bisect.bisect_right(self.starts, at) - 1]
+                    return self.fields[self.norm_map[nk]]
+        return None
+
+def pick_field(fields: Any, candidates: List[str]) -> Optional[Any]:
+    """
+    Value of the first candidate found among fields: exact normalized name
+    first, then a name containing it. fields is a dict or, to look up many
+    candidates on one PDF, a FieldIndex built once.
+    """
     if not fields:
         return None
-    norm_map = {norm(k): k for k in fields.keys()}
-    for c in candidates:
-        cn = norm(c)
-        if cn in norm_map:
-            return fields[norm_map[cn]]
-        for nk, orig in norm_map.items():
-            if cn and cn in nk:
-                return fields[orig]
-    return None
+    index = fields if isinstance(fields, FieldIndex) else FieldIndex(fields)
+    return index.pick(candidates)
 
 
 # --------------------------
@@ -118,6 +355,105 @@ def find_line_value(text: str, label: str) -> str:
         return clean_spaces(m.group(1))
     return ""
 
+# Every label parse_printed_pc looks up. LabelIndex finds all of them in one
+# pass; other labels still work, through find_line_value.
+SHEET_LABELS = (
+    "Character Name", "Name", "Race", "Class", "Alignment", "Deity", "Patron", "Level",
+    "Gender", "Sex", "Age", "Size", "Height", "Weight", "Eyes", "Hair", "Skin",
+    "HP", "Hit Points", "Current HP", "Max HP", "HP Max", "Total HP",
+    "AC", "Armor Class", "Touch", "Touch AC", "Flat-Footed", "Flat Footed",
+    "Fort", "Fortitude", "Ref", "Reflex", "Will",
+    "Speed", "Base Speed", "Initiative", "Init", "BAB", "Base Attack Bonus", "Grapple",
+    "Languages", "Total Weight", "Total Wt", "Weight Carried", "Light Load", "Medium Load", "Heavy Load",
+)
+
+def _label_alternation(labels) -> str:
+    # Longest first, so the alternation reports the longest label at a position.
+    return "|".join(re.escape(l) for l in sorted(labels, key=len, reverse=True))
+
+def _shorter_prefixes(labels) -> Dict[str, List[str]]:
+    """
+    For each label (lowercased), the other labels that are a prefix of it:
+    wherever the long one matches, those match too ("HP Max" -> "HP").
+    """
+    low = sorted({l.lower() for l in labels}, key=len, reverse=True)
+    return {l: [p for p in low if p != l and l.startswith(p)] for l in low}
+
+LINE_LABEL_RE = re.compile(rf"^[^\S\n]*({_label_alternation(SHEET_LABELS)})", re.IGNORECASE | re.MULTILINE)
+# The rest of find_line_value's pattern, matched from the end of the label.
+LINE_VALUE_RE = re.compile(r"\s*[:\-]?\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+# parse_basic_int's inline fallback; a lookahead, so overlapping hits
+# ("Max HP 30" holds "HP 30") are all seen. The first-letter class lets most
+# word starts fail before the alternation is tried.
+_LABEL_INITIALS = "".join(sorted({l[0].lower() for l in SHEET_LABELS}))
+INLINE_LABEL_RE = re.compile(
+    rf"\b(?=[{_LABEL_INITIALS}])(?=({_label_alternation(SHEET_LABELS)})\b\s*[:\-]?\s*(-?\d+)\b)", re.IGNORECASE,
+)
+INLINE_VALUE_RE = {
+    l.lower(): re.compile(rf"{re.escape(l)}\b\s*[:\-]?\s*(-?\d+)\b", re.IGNORECASE) for l in SHEET_LABELS
+}
+LABEL_PREFIXES = _shorter_prefixes(SHEET_LABELS)
+
+class LabelIndex:
+    """
+    One pass over a printed sheet's text: the value of the first line that
+    starts with each known label, so a lookup is a dict hit instead of a
+    compile-and-rescan per label. Gives the same answers as
+    find_line_value / parse_basic_int on the same text.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.values: Dict[str, str] = {}
+        self._inline: Optional[Dict[str, int]] = None
+        for m in LINE_LABEL_RE.finditer(text):
+            start = m.start(1)
+            longest = m.group(1).lower()
+            for label in [longest] + LABEL_PREFIXES[longest]:
+                if label in self.values:
+                    continue
+                vm = LINE_VALUE_RE.match(text, start + len(label))
+                if vm:
+                    self.values[label] = clean_spaces(vm.group(1))
+
+    def value(self, label: str) -> str:
+        key = label.lower()
+        if key in LABEL_PREFIXES:
+            return self.values.get(key, "")
+        if key not in self.values:
+            self.values[key] = find_line_value(self.text, label)
+        return self.values[key]
+
+    def inline(self) -> Dict[str, int]:
+        # Only needed when a label has no line of its own; built on first use.
+        if self._inline is None:
+            self._inline = {}
+            for m in INLINE_LABEL_RE.finditer(self.text):
+                longest = m.group(1).lower()
+                self._inline.setdefault(longest, int(m.group(2)))
+                for label in LABEL_PREFIXES[longest]:
+                    if label not in self._inline:
+                        im = INLINE_VALUE_RE[label].match(self.text, m.start())
+                        if im:
+                            self._inline[label] = int(im.group(1))
+        return self._inline
+
+    def basic_int(self, label_variants: List[str], default: int = 0) -> int:
+        """
+        parse_basic_int over the index.
+        """
+        for lab in label_variants:
+            v = first_int(self.value(lab))
+            if v is not None:
+                return v
+        for lab in label_variants:
+            key = lab.lower()
+            if key not in LABEL_PREFIXES:
+                return parse_basic_int(self.text, label_variants, default)
+            if key in self.inline():
+                return self.inline()[key]
+        return default
+
 def find_block_after(text: str, header: str, stop_headers: List[str], max_lines: int = 40) -> str:
     """
     Extract a block of text after a header until another header is found or max_lines hit.
@@ -155,17 +491,17 @@ def parse_ability_scores(text: str) -> Tuple[Dict[str, int], Dict[str, int]]:
     mods = {k: (v - 10) // 2 for k, v in scores.items()}
     return scores, mods
 
-def parse_ac(text: str) -> Dict[str, int]:
+def parse_ac(labels: LabelIndex) -> Dict[str, int]:
     # Total AC, Touch, Flat-Footed are often present as separate labeled values.
-    total = first_int(find_line_value(text, "AC")) or first_int(find_line_value(text, "Armor Class")) or 10
-    touch = first_int(find_line_value(text, "Touch")) or first_int(find_line_value(text, "Touch AC")) or 10
-    flat = first_int(find_line_value(text, "Flat-Footed")) or first_int(find_line_value(text, "Flat Footed")) or 10
+    total = first_int(labels.value("AC")) or first_int(labels.value("Armor Class")) or 10
+    touch = first_int(labels.value("Touch")) or first_int(labels.value("Touch AC")) or 10
+    flat = first_int(labels.value("Flat-Footed")) or first_int(labels.value("Flat Footed")) or 10
     return {"total": total, "touch": touch, "flat_footed": flat}
 
-def parse_saves(text: str) -> Dict[str, int]:
-    fort = first_int(find_line_value(text, "Fort")) or first_int(find_line_value(text, "Fortitude")) or 0
-    ref = first_int(find_line_value(text, "Ref")) or first_int(find_line_value(text, "Reflex")) or 0
-    will = first_int(find_line_value(text, "Will")) or 0
+def parse_saves(labels: LabelIndex) -> Dict[str, int]:
+    fort = first_int(labels.value("Fort")) or first_int(labels.value("Fortitude")) or 0
+    ref = first_int(labels.value("Ref")) or first_int(labels.value("Reflex")) or 0
+    will = first_int(labels.value("Will")) or 0
     return {"fort": fort, "ref": ref, "will": will}
 
 def parse_basic_int(text: str, label_variants: List[str], default: int = 0) -> int:
@@ -180,6 +516,11 @@ def parse_basic_int(text: str, label_variants: List[str], default: int = 0) -> i
             return int(m.group(1))
     return default
 
+# Rows found by the line heuristics below have no columns to check against,
+# so they never score as high as a layout row that parsed completely.
+TEXT_ATTACK_CONFIDENCE = 0.5
+TEXT_SKILL_CONFIDENCE = 0.4
+
 def parse_weapons(text: str) -> List[Dict[str, str]]:
     """
     Printed sheets often list attacks in a table. Since table layouts vary,
@@ -223,7 +564,8 @@ def parse_weapons(text: str) -> List[Dict[str, str]]:
             "critical": crit,
             "range": rng,
             "type": "",
-            "notes": ""
+            "notes": "",
+            "confidence": TEXT_ATTACK_CONFIDENCE + (0.1 if crit else 0.0)
         })
 
     # De-dup by name+to_hit+damage
@@ -236,8 +578,8 @@ def parse_weapons(text: str) -> List[Dict[str, str]]:
         seen.add(key)
         out.append(a)
 
-    # Keep first few likely weapons (most sheets list 2–4)
-    return out[:6]
+    # Every match, like the layout table: both paths list the whole table.
+    return out
 
 def parse_listish_block(block: str) -> List[str]:
     if not block.strip():
@@ -251,7 +593,7 @@ def parse_listish_block(block: str) -> List[str]:
             out.append(x)
     return out
 
-def parse_skills(text: str, top_n: int = 6) -> List[Dict[str, int]]:
+def parse_skills(text: str, top_n: Optional[int] = 6) -> List[Dict[str, int]]:
     """
     Skills tables are hard across PDFs. We do a simple heuristic:
     find lines like "Climb 6" or "Search 5" or "Craft (Alchemy) 3".
@@ -277,10 +619,10 @@ def parse_skills(text: str, top_n: int = 6) -> List[Dict[str, int]]:
 
     # Sort by absolute bonus descending
     skills.sort(key=lambda t: abs(t[1]), reverse=True)
-    out = [{"name": n, "bonus": v} for (n, v) in skills[:top_n]]
+    out = [{"name": n, "bonus": v, "confidence": TEXT_SKILL_CONFIDENCE} for (n, v) in skills[:top_n]]
     return out
 
-def parse_encumbrance(text: str) -> Optional[Dict[str, float]]:
+def parse_encumbrance(labels: LabelIndex) -> Optional[Dict[str, float]]:
     """
     If the printed sheet includes weights/loads. We look for:
       "Total Weight 69.5"
@@ -288,7 +630,7 @@ def parse_encumbrance(text: str) -> Optional[Dict[str, float]]:
     """
     total = None
     for lab in ["Total Weight", "Total Wt", "Weight Carried"]:
-        v = find_line_value(text, lab)
+        v = labels.value(lab)
         if v:
             try:
                 total = float(re.search(r"(\d+(?:\.\d+)?)", v).group(1))  # type: ignore
@@ -299,43 +641,51 @@ def parse_encumbrance(text: str) -> Optional[Dict[str, float]]:
     if total is None:
         return None
 
-    light = parse_basic_int(text, ["Light Load"], default=0)
-    medium = parse_basic_int(text, ["Medium Load"], default=0)
-    heavy = parse_basic_int(text, ["Heavy Load"], default=0)
+    light = labels.basic_int(["Light Load"], default=0)
+    medium = labels.basic_int(["Medium Load"], default=0)
+    heavy = labels.basic_int(["Heavy Load"], default=0)
     return {"total_weight": total, "light_load": light, "medium_load": medium, "heavy_load": heavy}
 
-def parse_printed_pc(text: str, source_pdf: str) -> Dict[str, Any]:
+def parse_printed_pc(text: str, source_pdf: str, layout: Optional[List[List[Fragment]]] = None) -> Dict[str, Any]:
+    """
+    layout is text_and_layout_from_reader's positioned text; with it, the
+    attack and skill tables are read by column (extract_tables), and the
+    line heuristics are only used for a table that wasn't found, or inside
+    one whose columns read nothing. table_sources says which ran.
+    """
+    labels = LabelIndex(text)
+
     # Identity
-    name = find_line_value(text, "Character Name") or find_line_value(text, "Name")
-    race = find_line_value(text, "Race")
-    clazz = find_line_value(text, "Class")
-    alignment = find_line_value(text, "Alignment")
-    deity = find_line_value(text, "Deity") or find_line_value(text, "Patron")
-    level = parse_basic_int(text, ["Level"], default=1)
+    name = labels.value("Character Name") or labels.value("Name")
+    race = labels.value("Race")
+    clazz = labels.value("Class")
+    alignment = labels.value("Alignment")
+    deity = labels.value("Deity") or labels.value("Patron")
+    level = labels.basic_int(["Level"], default=1)
 
     # Physical
-    gender = find_line_value(text, "Gender") or find_line_value(text, "Sex")
-    age = parse_basic_int(text, ["Age"], default=0) or None
-    size = find_line_value(text, "Size")
-    height = find_line_value(text, "Height")
-    weight = find_line_value(text, "Weight")
-    eyes = find_line_value(text, "Eyes")
-    hair = find_line_value(text, "Hair")
-    skin = find_line_value(text, "Skin")
+    gender = labels.value("Gender") or labels.value("Sex")
+    age = labels.basic_int(["Age"], default=0) or None
+    size = labels.value("Size")
+    height = labels.value("Height")
+    weight = labels.value("Weight")
+    eyes = labels.value("Eyes")
+    hair = labels.value("Hair")
+    skin = labels.value("Skin")
 
     # Core stats
     ability_scores, ability_mods = parse_ability_scores(text)
 
-    hp_cur = parse_basic_int(text, ["HP", "Hit Points", "Current HP"], default=0)
-    hp_max = parse_basic_int(text, ["Max HP", "HP Max", "Total HP"], default=hp_cur)
+    hp_cur = labels.basic_int(["HP", "Hit Points", "Current HP"], default=0)
+    hp_max = labels.basic_int(["Max HP", "HP Max", "Total HP"], default=hp_cur)
 
-    ac = parse_ac(text)
-    speed = parse_basic_int(text, ["Speed", "Base Speed"], default=30)
-    initiative = parse_basic_int(text, ["Initiative", "Init"], default=0)
+    ac = parse_ac(labels)
+    speed = labels.basic_int(["Speed", "Base Speed"], default=30)
+    initiative = labels.basic_int(["Initiative", "Init"], default=0)
 
-    saves = parse_saves(text)
-    bab = parse_basic_int(text, ["BAB", "Base Attack Bonus"], default=0)
-    grapple = parse_basic_int(text, ["Grapple"], default=0)
+    saves = parse_saves(labels)
+    bab = labels.basic_int(["BAB", "Base Attack Bonus"], default=0)
+    grapple = labels.basic_int(["Grapple"], default=0)
 
     # Blocks that are often present as headings
     feats_block = find_block_after(
@@ -359,13 +709,16 @@ def parse_printed_pc(text: str, source_pdf: str) -> Dict[str, Any]:
     gear = [clean_spaces(x) for x in gear_block.splitlines() if x.strip()]
 
     # Language lines vary; try some heuristics
-    langs_line = find_line_value(text, "Languages")
+    langs_line = labels.value("Languages")
     languages = parse_listish_block(langs_line)
 
-    attacks = parse_weapons(text)
-    skills = parse_skills(text, top_n=6)
+    tables, found = extract_tables(layout) if layout else ({"attacks": [], "skills": []}, {})
+    attacks = tables["attacks"] or parse_weapons(text)
+    skills = tables["skills"] or parse_skills(text, top_n=None)
+    table_sources = {kind: found[kind] if tables[kind] else "text" for kind in ("attacks", "skills")}
+    highlights = sorted(skills, key=lambda sk: abs(sk["bonus"]), reverse=True)[:6]
 
-    enc = parse_encumbrance(text)
+    enc = parse_encumbrance(labels)
 
     pc: Dict[str, Any] = {
         "name": name or os.path.splitext(os.path.basename(source_pdf))[0],
@@ -397,13 +750,15 @@ def parse_printed_pc(text: str, source_pdf: str) -> Dict[str, Any]:
         "base_attack_bonus": bab,
         "grapple": grapple,
         "attack_options": attacks,
-        "skills_highlights": skills,
+        "skills_highlights": [{"name": sk["name"], "bonus": sk["bonus"]} for sk in highlights],
+        "skills": skills,
         "feats": feats,
         "special": [],
         "spells_prepared_or_known": [],
         "gear_highlights": gear,
         "limits": [],
-        "source_pdf": os.path.basename(source_pdf)
+        "source_pdf": os.path.basename(source_pdf),
+        "table_sources": table_sources
     }
 
     if enc is not None:
@@ -412,6 +767,235 @@ def parse_printed_pc(text: str, source_pdf: str) -> Dict[str, Any]:
     return pc
 
 
+# --------------------------
+# Layout tables (positioned text)
+# --------------------------
+
+DICE_RE = re.compile(r"\d*d\d+(?:\s*[+\-]\s*\d+)?", re.IGNORECASE)
+CRIT_RE = re.compile(r"\d{2}\s*-\s*\d{2}(?:\s*/\s*[x\u00d7]\s*\d)?|[x\u00d7]\s*\d", re.IGNORECASE)
+RANGE_RE = re.compile(r"(\d+)\s*(?:ft|')", re.IGNORECASE)
+SIGNED_INT_RE = re.compile(r"[+\-]?\d+")
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+ABILITY_NAMES = {"str", "dex", "con", "int", "wis", "cha"}
+
+def attack_role(label: str) -> Optional[str]:
+    """
+    The attack-table column a header cell names, if any.
+    """
+    l = label.lower()
+    if "bonus" in l or "to hit" in l or l in {"atk", "ab", "hit"}:
+        return "to_hit"
+    if "damage" in l or l == "dmg":
+        return "damage"
+    if "crit" in l:
+        return "critical"
+    if "range" in l:
+        return "range"
+    if l == "type":
+        return "type"
+    if "note" in l or l == "special" or "ammunition" in l:
+        return "notes"
+    if "weapon" in l or "attack" in l or l == "name":
+        return "name"
+    return None
+
+def skill_role(label: str) -> Optional[str]:
+    """
+    The skill-table column a header cell names, if any.
+    """
+    l = label.lower()
+    if "key" in l or l in {"ability", "abil"}:
+        return "ability"
+    if "ability" in l and "mod" in l:
+        return "ability_mod"
+    if "rank" in l:
+        return "ranks"
+    if "misc" in l:
+        return "misc"
+    if "mod" in l or "total" in l or "bonus" in l:
+        return "bonus"
+    if "skill" in l or l == "name":
+        return "name"
+    return None
+
+def layout_rows(frags: List[Fragment]) -> List[List[Tuple[float, float, str]]]:
+    """
+    Group one page's fragments into rows (top to bottom) of cells
+    (left x, center x, text). Fragments on one baseline that nearly touch
+    (by their end x, which is only estimated for fonts without widths) are
+    one cell.
+    """
+    rows: List[List[Fragment]] = []
+    for f in sorted(frags, key=lambda f: (-f[1], f[0])):
+        if rows and abs(rows[-1][0][1] - f[1]) <= max(1.0, rows[-1][0][2] * 0.45):
+            rows[-1].append(f)
+        else:
+            rows.append([f])
+    out = []
+    for row in rows:
+        row.sort(key=lambda f: f[0])
+        cells: List[List[Any]] = []
+        for x, _, size, text, end in row:
+            if cells and x - cells[-1][1] < size * CELL_GAP:
+                cells[-1][1] = max(cells[-1][1], end)
+                cells[-1][2] += " " + text
+            else:
+                cells.append([x, end, text])
+        out.append([(left, (left + right) / 2.0, text) for left, right, text in cells])
+    return out
+
+def _header_groups(row, classify) -> List[List[Tuple[float, float, str]]]:
+    """
+    If row is a table header, its columns as [(left, center, role)] per
+    table: sheets often print two skill tables side by side, so every
+    "name" column starts a new group. [] if row isn't a header.
+    """
+    cols = [(left, center, classify(text)) for left, center, text in row]
+    cols = [c for c in cols if c[2]]
+    if len(cols) < 2 or not any(c[2] == "name" for c in cols):
+        return []
+    groups: List[List[Tuple[float, float, str]]] = []
+    for c in cols:
+        if c[2] == "name" or not groups:
+            groups.append([])
+        groups[-1].append(c)
+    return [g for g in groups if len(g) >= 2]
+
+def _span_cells(row, group, next_left: Optional[float]):
+    # A data row's cells that fall inside group's span.
+    start = group[0][0] - 4.0
+    return [c for c in row if c[1] >= start and (next_left is None or c[1] < next_left - 4.0)]
+
+def _row_cells(row, group, next_left: Optional[float]) -> Dict[str, str]:
+    """
+    Assign a data row's cells that fall inside group's span to its nearest
+    column; returns role -> text.
+    """
+    out: Dict[str, str] = {}
+    for left, center, text in _span_cells(row, group, next_left):
+        role = min(group, key=lambda c: abs(c[1] - center))[2]
+        out[role] = f"{out[role]} {text}" if role in out else text
+    return out
+
+def _attack_row(cells: Dict[str, str], roles: set) -> Optional[Dict[str, Any]]:
+    name = cells.get("name", "").strip(" :")
+    if not re.search(r"[A-Za-z]{2}", name) or attack_role(name):
+        return None
+    m_hit = SIGNED_INT_RE.search(cells.get("to_hit", ""))
+    m_dmg = DICE_RE.search(cells.get("damage", ""))
+    if not m_hit and not m_dmg:
+        return None
+    m_crit = CRIT_RE.search(cells.get("critical", ""))
+    m_rng = RANGE_RE.search(cells.get("range", ""))
+    checks = [True, bool(m_hit), bool(m_dmg)]
+    if "critical" in roles:
+        checks.append(bool(m_crit))
+    return {
+        "name": clean_spaces(name),
+        "to_hit": int(m_hit.group(0)) if m_hit else None,
+        "damage": m_dmg.group(0).replace(" ", "") if m_dmg else "",
+        "critical": m_crit.group(0).replace(" ", "") if m_crit else "",
+        "range": f"{m_rng.group(1)} ft" if m_rng else "",
+        "type": clean_spaces(cells.get("type", "")),
+        "notes": clean_spaces(cells.get("notes", "")),
+        "confidence": round(sum(checks) / len(checks), 2),
+    }
+
+def _skill_row(cells: Dict[str, str], roles: set) -> Optional[Dict[str, Any]]:
+    # Leading checkbox glyphs and trailing trained-only marks aren't the name.
+    name = re.sub(r"^[^A-Za-z]+|[^A-Za-z)]+$", "", cells.get("name", ""))
+    m_bonus = SIGNED_INT_RE.search(cells.get("bonus", ""))
+    if len(name) < 3 or skill_role(name) or not m_bonus:
+        return None
+    row: Dict[str, Any] = {"name": clean_spaces(name), "bonus": int(m_bonus.group(0))}
+    checks = [True, True]
+    if "ranks" in roles:
+        m_ranks = NUMBER_RE.search(cells.get("ranks", ""))
+        checks.append(bool(m_ranks))
+        if m_ranks:
+            ranks = float(m_ranks.group(0))
+            row["ranks"] = int(ranks) if ranks.is_integer() else ranks
+    if "ability" in roles:
+        ability = cells.get("ability", "").strip().lower()[:3]
+        checks.append(ability in ABILITY_NAMES)
+        if ability in ABILITY_NAMES:
+            row["ability"] = ability
+    row["confidence"] = round(sum(checks) / len(checks), 2)
+    return row
+
+def _text_skills(line: str) -> List[Dict[str, Any]]:
+    return parse_skills(line, top_n=None)
+
+# kind, header cell classifier, layout row parser, line parser for a table
+# whose columns didn't work out.
+TABLE_KINDS = (
+    ("attacks", attack_role, _attack_row, parse_weapons),
+    ("skills", skill_role, _skill_row, _text_skills),
+)
+
+def extract_tables(layout: List[List[Fragment]]) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, str]]:
+    """
+    Attack and skill tables rebuilt from positioned text, one pass over each
+    page's rows: a header row fixes the columns, and the rows under it are
+    read by column until a row doesn't parse twice in a row or another
+    header starts. Tables come out in page order, side-by-side ones left
+    first. Every row carries a 0-1 confidence: the share of its columns
+    whose value looked right (a bonus that is a number, damage that is
+    dice, ...).
+
+    A table whose columns yield no row at all (a header misread, so a
+    needed column is missing) falls back to the line heuristics, run on the
+    text inside its own span only. Returns (rows per kind, source per kind
+    found): "layout", or "layout+text" when any of its tables fell back.
+    """
+    tables: List[Tuple[str, List[Dict[str, Any]]]] = []
+    fell_back = set()
+    seen = set()
+    for frags in layout:
+        # [kind, parse_row, parse_text, columns, next table's left edge,
+        #  rows, misses, rows read by column]
+        active: List[List[Any]] = []
+        for row in layout_rows(frags):
+            header = None
+            for kind, classify, parse_row, parse_text in TABLE_KINDS:
+                groups = _header_groups(row, classify)
+                if groups:
+                    header = [
+                        [kind, parse_row, parse_text, g, groups[n + 1][0][0] if n + 1 < len(groups) else None, [], 0, 0]
+                        for n, g in enumerate(groups)
+                    ]
+                    break
+            if header:
+                tables.extend((t[0], t[5]) for t in header)
+                active = header
+                continue
+            for t in active:
+                kind, parse_row, parse_text, group, next_left, rows, _, by_column = t
+                parsed = parse_row(_row_cells(row, group, next_left), {c[2] for c in group})
+                if parsed is not None:
+                    t[7] += 1
+                elif not by_column:
+                    fell_back.add(kind)
+                    hits = parse_text(" ".join(c[2] for c in _span_cells(row, group, next_left)))
+                    parsed = hits[0] if hits else None
+                if parsed is None:
+                    t[6] += 1
+                    continue
+                t[6] = 0
+                key = (kind, parsed["name"].lower(), parsed.get("to_hit"), parsed.get("damage"), parsed.get("bonus"))
+                if key not in seen:
+                    seen.add(key)
+                    rows.append(parsed)
+            active = [t for t in active if t[6] < 2]
+
+    out: Dict[str, List[Dict[str, Any]]] = {kind: [] for kind, _, _, _ in TABLE_KINDS}
+    sources: Dict[str, str] = {}
+    for kind, rows in tables:
+        out[kind].extend(rows)
+        sources[kind] = "layout+text" if kind in fell_back else "layout"
+    return out, sources
+
+
 # --------------------------
 # Fillable-form parsing
 # --------------------------
@@ -423,13 +1007,15 @@ def parse_fillable_pc(fields: Dict[str, Any], source_pdf: str) -> Optional[Dict[
     """
     if not fields:
         return None
+    # ~30 lookups per sheet; index the (often hundreds of) fields once.
+    index = FieldIndex(fields)
 
     def f(*cands: str) -> str:
-        v = pick_field(fields, list(cands))
+        v = index.pick(list(cands))
         return safe_str(v) if v is not None else ""
 
     def fi(*cands: str) -> Optional[int]:
-        v = pick_field(fields, list(cands))
+        v = index.pick(list(cands))
         return safe_int(v) if v is not None else None
 
     name = f("Character Name", "Name", "PC Name")
@@ -519,10 +1105,100 @@ def merge_party(existing: Dict[str, Any], pcs: List[Dict[str, Any]]) -> Dict[str
     return merged
 
 
+# --------------------------
+# Import (one PDF, or many in parallel)
+# --------------------------
+
+def import_pdf(pdf_path: str, tables: str = "layout") -> Dict[str, Any]:
+    """
+    Open one PDF once and parse it: form fields first, printed text if the
+    fields aren't meaningful. tables="layout" also collects positioned text
+    in the same extraction pass, for extract_tables; "text" uses the line
+    heuristics only. Never raises; a failure is returned in "error" so one
+    bad file cannot stop a batch. Timings are in milliseconds.
+    """
+    result: Dict[str, Any] = {"pdf": pdf_path, "pc": None, "mode": None, "pages": 0, "error": None, "ms": {}}
+    ms = result["ms"]
+    t0 = time.perf_counter()
+    try:
+        reader = PdfReader(pdf_path)
+        result["pages"] = len(reader.pages)
+        t1 = time.perf_counter()
+        ms["open"] = round((t1 - t0) * 1000.0, 1)
+
+        fields = fields_from_reader(reader)
+        pc = parse_fillable_pc(fields, pdf_path)
+        t2 = time.perf_counter()
+        ms["fields"] = round((t2 - t1) * 1000.0, 1)
+        if pc:
+            result["mode"] = "fillable"
+        else:
+            if tables == "layout":
+                text, layout = text_and_layout_from_reader(reader)
+            else:
+                text, layout = text_from_reader(reader), None
+            t3 = time.perf_counter()
+            ms["text"] = round((t3 - t2) * 1000.0, 1)
+            if not text.strip():
+                raise RuntimeError("no extractable text found. If this is an image scan, you'll need OCR.")
+            pc = parse_printed_pc(text, pdf_path, layout)
+            ms["parse"] = round((time.perf_counter() - t3) * 1000.0, 1)
+            result["mode"] = "printed"
+        result["pc"] = pc
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    ms["total"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    return result
+
+def import_pdfs(pdf_paths: List[str], jobs: int = 1, tables: str = "layout") -> List[Dict[str, Any]]:
+    """
+    import_pdf over many files, in input order. jobs > 1 uses a process pool
+    (parsing is CPU-bound pure Python, so threads would not help); a worker
+    that dies only fails its own file.
+    """
+    jobs = min(jobs, len(pdf_paths))
+    if jobs <= 1:
+        return [import_pdf(p, tables) for p in pdf_paths]
+
+    results: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [(p, pool.submit(import_pdf, p, tables)) for p in pdf_paths]
+        for p, fut in futures:
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                results.append({"pdf": p, "pc": None, "mode": None, "pages": 0, "error": f"{type(e).__name__}: {e}", "ms": {}})
+    return results
+
+def print_summary(results: List[Dict[str, Any]], wall_ms: float, jobs: int) -> None:
+    print(f"{'pdf':<32}{'mode':>9}{'pages':>6}{'atk':>5}{'skl':>5}{'open':>8}{'fields':>8}{'text':>8}{'parse':>8}{'total':>9}  (ms)")
+    for r in results:
+        ms = r["ms"]
+        cells = "".join(f"{ms[k]:>8.1f}" if k in ms else f"{'-':>8}" for k in ("open", "fields", "text", "parse"))
+        name = os.path.basename(r["pdf"])[:31]
+        pc = r["pc"] or {}
+        # Rows per table; "~" marks one read (in part) by the line heuristics.
+        counts = ""
+        for key, table in (("attack_options", "attacks"), ("skills", "skills")):
+            n = len(pc.get(key) or [])
+            mark = "~" if "text" in (pc.get("table_sources") or {}).get(table, "") else ""
+            counts += f"{mark}{n}".rjust(5) if pc else f"{'-':>5}"
+        print(f"{name:<32}{r['mode'] or 'FAILED':>9}{r['pages']:>6}{counts}{cells}{ms.get('total', 0.0):>9.1f}")
+        if r["error"]:
+            print(f"  ! {r['error']}")
+    cpu_ms = sum(r["ms"].get("total", 0.0) for r in results)
+    ok = sum(1 for r in results if r["pc"])
+    print(f"{ok}/{len(results)} imported with {jobs} worker(s): wall {wall_ms:.0f} ms, sum of per-file {cpu_ms:.0f} ms")
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--out", default="state/party.json", help="Output path")
     ap.add_argument("--debug-text", action="store_true", help="Print extracted text from PDFs and exit")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = one per CPU)")
+    ap.add_argument("--tables", choices=["layout", "text"], default="layout",
+                    help="Read attack/skill tables by column from positioned text (falls back to text per table), or from text lines only")
+    ap.add_argument("--summary-json", help="Also write the per-file results and timings here")
     ap.add_argument("pdfs", nargs="+", help="One or more PDFs")
     args = ap.parse_args()
 
@@ -532,28 +1208,29 @@ def main():
             print(read_pdf_text(p))
         return
 
-    pcs: List[Dict[str, Any]] = []
-
-    for pdf in args.pdfs:
-        fields = read_pdf_fields(pdf)
-        fillable = parse_fillable_pc(fields, pdf)
-        if fillable:
-            pcs.append(fillable)
-            continue
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    t0 = time.perf_counter()
+    results = import_pdfs(args.pdfs, jobs=jobs, tables=args.tables)
+    wall_ms = (time.perf_counter() - t0) * 1000.0
+    pcs: List[Dict[str, Any]] = [r["pc"] for r in results if r["pc"]]
 
-        text = read_pdf_text(pdf)
-        if not text.strip():
-            raise RuntimeError(f"No extractable text found in {pdf}. If this is an image scan, you'll need OCR.")
-        pcs.append(parse_printed_pc(text, pdf))
+    if pcs:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        existing = load_party(args.out)
+        merged = merge_party(existing, pcs)
 
-    os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    existing = load_party(args.out)
-    merged = merge_party(existing, pcs)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(merged, f, indent=2, ensure_ascii=False)
 
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(merged, f, indent=2, ensure_ascii=False)
+    print_summary(results, wall_ms, min(jobs, len(args.pdfs)))
+    if args.summary_json:
+        with open(args.summary_json, "w", encoding="utf-8") as f:
+            summary = [{k: v for k, v in r.items() if k != "pc"} for r in results]
+            json.dump({"wall_ms": round(wall_ms, 1), "jobs": jobs, "files": summary}, f, indent=2, ensure_ascii=False)
 
     print(f"Wrote {len(pcs)} character(s) into {args.out}")
+    if len(pcs) < len(results):
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
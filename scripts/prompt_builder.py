@@ -0,0 +1,204 @@
+"""
+Token-budgeted prompt assembly for the GM loop.
+
+Instead of sending the whole state JSON plus every retrieved chunk, the prompt
+is filled in priority order: player input, where/when the party is, active
+quests, NPCs at the party's location, the campaign memory summary,
+deduplicated canon, memories recalled for this turn, then the most recent
+facts and notes. Whatever does not fit is dropped (older facts and notes first)
+and counted, and the token cost of every section is reported for the session
+log.
+"""
+
+import json
+
+PROMPT_TOKEN_BUDGET = 6000
+CLOSED_QUEST_STATUSES = {"completed", "complete", "done", "failed", "abandoned", "resolved"}
+NEAR_DUPLICATE = 0.8
+RECALLED_CHARS = 400
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for English prose and JSON.
+    return (len(text) + 3) // 4
+
+def compact(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(", ", ": "))
+
+def _shingles(text, n=5):
+    words = text.lower().split()
+    return {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+def dedupe_chunks(chunks):
+    """
+    Drop chunks with a repeated id, and chunks whose word 5-grams mostly
+    overlap an earlier (higher-ranked) chunk.
+    """
+    kept, seen_ids, kept_shingles = [], set(), []
+    for c in chunks:
+        if c["id"] in seen_ids:
+            continue
+        sh = _shingles(c["doc"])
+        if any(len(sh & other) / min(len(sh), len(other)) >= NEAR_DUPLICATE for other in kept_shingles):
+            continue
+        seen_ids.add(c["id"])
+        kept_shingles.append(sh)
+        kept.append(c)
+    return kept
+
+def format_chunk(c):
+    meta = c["meta"]
+    tag = f"{meta.get('type','?')}:{meta.get('name','?')}:{meta.get('section','?')}"
+    return f"[{tag}]\n{c['doc']}"
+
+class _Budget:
+    def __init__(self, total):
+        self.total = total
+        self.used = 0
+        self.sections = {}
+
+    @property
+    def left(self):
+        return self.total - self.used
+
+    def take(self, name, text):
+        cost = estimate_tokens(text)
+        self.used += cost
+        self.sections[name] = self.sections.get(name, 0) + cost
+        return text
+
+    def fill(self, name, items, render, cap=None):
+        """
+        Keep items (already in priority order) while they fit, spending at
+        most cap tokens. Returns (kept_lines, dropped_count).
+        """
+        limit = self.left if cap is None else min(cap, self.left)
+        lines = []
+        for i, item in enumerate(items):
+            line = render(item)
+            cost = estimate_tokens(line) + 1
+            if cost > limit:
+                return lines, len(items) - i
+            limit -= cost
+            self.used += cost
+            self.sections[name] = self.sections.get(name, 0) + cost
+            lines.append(line)
+        return lines, 0
+
+def format_recalled(c):
+    meta = c["meta"]
+    turn = f" turn {meta['turn']:04d}" if isinstance(meta.get("turn"), int) else ""
+    doc = " ".join(c["doc"].split())
+    if len(doc) > RECALLED_CHARS:
+        doc = doc[:RECALLED_CHARS].rsplit(" ", 1)[0] + " …"
+    return f"- [{meta.get('kind', '?')}{turn}] {doc}"
+
+def build_prompt(state, canon_chunks, player_text, budget=PROMPT_TOKEN_BUDGET, recalled=None):
+    """
+    Returns (prompt, canon_used, report). canon_used is the canon text that
+    actually went into the prompt; report has per-section token estimates
+    and how many items of each kind were dropped. recalled are chunks from
+    the campaign memory collection.
+    """
+    b = _Budget(budget)
+    dropped = {}
+
+    player = b.take("player", player_text.strip())
+
+    location = (state.get("party") or {}).get("location") or {}
+    situation = b.take("situation", compact({"time": state.get("time", {}), "location": location}))
+    party = {k: v for k, v in (state.get("party") or {}).items() if k != "location"}
+    party_line = b.take("party", compact(party)) if party else ""
+
+    quests = state.get("quests") or []
+    active = [q for q in quests if str(q.get("status", "")).lower() not in CLOSED_QUEST_STATUSES]
+    quest_lines, n = b.fill("quests", active, lambda q: "- " + compact(q))
+    dropped["quests_active"] = n
+    dropped["quests_closed"] = len(quests) - len(active)
+
+    here = {location.get("region_id"), location.get("site_id")} - {None}
+    npcs = state.get("npcs") or {}
+    nearby = [dict(npc, id=nid) for nid, npc in npcs.items() if npc.get("location") in here]
+    npc_lines, n = b.fill("npcs", nearby, lambda npc: "- " + compact(npc))
+    dropped["npcs"] = len(npcs) - len(nearby) + n
+
+    summary = ((state.get("memory") or {}).get("summary") or "").strip()
+    summary_text = ""
+    if summary:
+        if estimate_tokens(summary) <= b.left:
+            summary_text = b.take("memory", summary)
+        else:
+            dropped["memory"] = 1
+
+    chunks = dedupe_chunks(canon_chunks)
+    dropped["canon_duplicates"] = len(canon_chunks) - len(chunks)
+    canon_parts, n = b.fill("canon", chunks, format_chunk)
+    dropped["canon"] = n
+
+    recalled_lines, n = b.fill("recalled", recalled or [], format_recalled)
+    dropped["recalled"] = n
+
+    discovered = state.get("discovered") or {}
+    disc_line = ""
+    if discovered:
+        text = compact({k: sorted(v) for k, v in discovered.items() if isinstance(v, dict)})
+        if estimate_tokens(text) <= b.left:
+            disc_line = b.take("discovered", text)
+
+    known = {"party", "time", "quests", "npcs", "discovered", "facts", "notes", "memory"}
+    other = {k: v for k, v in state.items() if k not in known}
+    other_line = ""
+    if other:
+        text = compact(other)
+        if estimate_tokens(text) <= b.left:
+            other_line = b.take("other_state", text)
+        else:
+            dropped["other_state"] = len(other)
+
+    # Facts may use two thirds of what is left so recent notes still fit.
+    facts = state.get("facts") or []
+    fact_lines, n = b.fill("facts", list(reversed(facts)), lambda f: f"- {f}", cap=b.left * 2 // 3)
+    dropped["facts"] = n
+    notes = state.get("notes") or []
+    note_lines, n = b.fill("notes", list(reversed(notes)), lambda x: f"- {x}")
+    dropped["notes"] = n
+
+    canon = "\n\n".join(canon_parts)
+    state_lines = [f"Time and location: {situation}"]
+    if party_line:
+        state_lines.append(f"Party: {party_line}")
+    if quest_lines:
+        state_lines.append("Active quests:\n" + "\n".join(quest_lines))
+    if npc_lines:
+        state_lines.append("NPCs here:\n" + "\n".join(npc_lines))
+    if summary_text:
+        state_lines.append(f"Campaign memory (earlier play, summarized):\n{summary_text}")
+    if recalled_lines:
+        state_lines.append("Recalled from earlier play:\n" + "\n".join(recalled_lines))
+    if disc_line:
+        state_lines.append(f"Discovered: {disc_line}")
+    if fact_lines:
+        omitted = f" ({dropped['facts']} older omitted)" if dropped["facts"] else ""
+        state_lines.append(f"Known facts, newest first{omitted}:\n" + "\n".join(fact_lines))
+    if note_lines:
+        omitted = f" ({dropped['notes']} older omitted)" if dropped["notes"] else ""
+        state_lines.append(f"Notes, newest first{omitted}:\n" + "\n".join(note_lines))
+    if other_line:
+        state_lines.append(f"Other: {other_line}")
+
+    prompt = f"""
+CANON CONTEXT:
+{canon}
+
+CURRENT STATE:
+{chr(10).join(state_lines)}
+
+PLAYER ACTIONS / INTENT:
+{player}
+"""
+    report = {
+        "budget": budget,
+        "estimated_tokens": estimate_tokens(prompt),
+        "sections": b.sections,
+        "dropped": {k: v for k, v in dropped.items() if v},
+    }
+    return prompt, canon, report
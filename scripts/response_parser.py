@@ -0,0 +1,292 @@
+"""
+Incremental parser for the GM model's structured response.
+
+The response has three sections (GM_NARRATION, ENGINE_NOTES and
+STATE_DELTA_JSON). ResponseParser is fed the text as it streams in and
+assigns each completed line to its section in a single pass, so the result
+is ready as soon as the stream ends without re-scanning the whole text.
+
+Models drift from the format in predictable ways, so the parser tolerates
+them instead of dropping the delta:
+- markdown-decorated headers ("## GM_NARRATION", "**ENGINE_NOTES:**")
+- a missing GM_NARRATION header: the text before the first header is used
+- a missing STATE_DELTA_JSON header: the last fenced JSON block is used
+- an unfenced delta: the text from the first "{" is used
+- JSON faults: trailing commas, // comments, Python literals, raw newlines
+  in strings, and unclosed brackets are repaired in one scan
+- a delta still invalid after repair: every top-level key that parses on
+  its own is kept and the rest are reported
+
+Everything that was repaired or dropped is reported in "diagnostics" as
+{"level": "warning"|"error", "code", "message"}.
+"""
+
+import json
+import re
+
+SECTIONS = ("GM_NARRATION", "ENGINE_NOTES", "STATE_DELTA_JSON")
+HEADER_RE = re.compile(r"^[\s#>*_`]*(GM_NARRATION|ENGINE_NOTES|STATE_DELTA_JSON)[\s*_`]*:[\s*_`]*(.*)$", re.IGNORECASE)
+FENCE_RE = re.compile(r"^\s*```")
+LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+def _diag(level, code, message):
+    return {"level": level, "code": code, "message": message}
+
+def repair_json(text):
+    """
+    One string-aware pass over text fixing the faults models commonly emit.
+    Returns (fixed_text, sorted list of repair codes applied).
+    """
+    out = []
+    fixes = set()
+    closers = []
+    in_str = False
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if in_str:
+            if c == "\\" and i + 1 < n:
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            if c == '"':
+                in_str = False
+            elif c == "\n":
+                c = "\\n"
+                fixes.add("newline_in_string")
+            out.append(c)
+            i += 1
+            continue
+
+        if c == '"':
+            in_str = True
+        elif c == "/" and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            fixes.add("comment")
+            continue
+        elif c in "{[":
+            closers.append("}" if c == "{" else "]")
+        elif c in "}]":
+            if _drop_trailing_comma(out):
+                fixes.add("trailing_comma")
+            if closers and closers[-1] == c:
+                closers.pop()
+        elif c in "TFN" and (i == 0 or not (text[i - 1].isalnum() or text[i - 1] == "_")):
+            for word, lit in LITERALS.items():
+                end = i + len(word)
+                if text.startswith(word, i) and (end == n or not (text[end].isalnum() or text[end] == "_")):
+                    out.append(lit)
+                    fixes.add("python_literal")
+                    i = end
+                    break
+            else:
+                out.append(c)
+                i += 1
+            continue
+        out.append(c)
+        i += 1
+
+    if in_str:
+        out.append('"')
+        fixes.add("unterminated_string")
+    if closers:
+        _drop_trailing_comma(out)
+        out.extend(reversed(closers))
+        fixes.add("unclosed_brackets")
+    return "".join(out), sorted(fixes)
+
+def _drop_trailing_comma(out):
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+        return True
+    return False
+
+def top_level_members(text):
+    """
+    Split the outermost JSON object in text into its '"key": value' member
+    strings (string-aware). Returns [] if there is no object.
+    """
+    start = text.find("{")
+    if start < 0:
+        return []
+    members, depth, in_str, begin = [], 0, False, start + 1
+    i = start
+    while i < len(text):
+        c = text[i]
+        if in_str:
+            if c == "\\":
+                i += 1
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c in "{[":
+            depth += 1
+        elif c in "}]":
+            depth -= 1
+            if depth == 0:
+                members.append(text[begin:i])
+                break
+        elif c == "," and depth == 1:
+            members.append(text[begin:i])
+            begin = i + 1
+        i += 1
+    else:
+        members.append(text[begin:])
+    return [m.strip() for m in members if m.strip()]
+
+def extract_json_text(section):
+    """
+    The JSON text of a STATE_DELTA_JSON section: the first fenced block if
+    there is one, else from the first "{" to the last "}". Returns
+    (text or None, fenced).
+    """
+    lines = section.split("\n")
+    fence_start = None
+    for i, line in enumerate(lines):
+        if FENCE_RE.match(line):
+            if fence_start is None:
+                fence_start = i
+            else:
+                return "\n".join(lines[fence_start + 1:i]), True
+    if fence_start is not None:
+        # Opened but never closed (e.g. a truncated response).
+        return "\n".join(lines[fence_start + 1:]), True
+    start = section.find("{")
+    if start < 0:
+        return None, False
+    end = section.rfind("}")
+    return (section[start:end + 1] if end > start else section[start:]), False
+
+def parse_delta(text, diagnostics):
+    """
+    Parse delta JSON, repairing and then salvaging what it can. Appends to
+    diagnostics; returns a dict or None.
+    """
+    try:
+        value = json.loads(text)
+    except ValueError as e:
+        fixed, fixes = repair_json(text)
+        try:
+            value = json.loads(fixed)
+        except ValueError:
+            value = None
+        if value is not None:
+            diagnostics.append(_diag("warning", "json_repaired", f"repaired: {', '.join(fixes) or 'nothing'}"))
+        else:
+            value, dropped = {}, []
+            for member in top_level_members(fixed):
+                try:
+                    value.update(json.loads("{" + member + "}"))
+                except ValueError:
+                    dropped.append(member.split(":", 1)[0].strip()[:40])
+            if not value:
+                diagnostics.append(_diag("error", "json_invalid", f"{e.msg} at line {e.lineno} column {e.colno}"))
+                return None
+            diagnostics.append(_diag(
+                "warning", "json_salvaged",
+                f"{e.msg} at line {e.lineno} column {e.colno}; kept {', '.join(sorted(value))}; "
+                f"dropped {', '.join(dropped) or 'nothing'}",
+            ))
+    if not isinstance(value, dict):
+        diagnostics.append(_diag("error", "delta_not_object", f"delta is a JSON {type(value).__name__}, not an object"))
+        return None
+    return value
+
+class ResponseParser:
+    def __init__(self):
+        self.partial = ""
+        self.section = None  # None = before the first header
+        self.lines = {None: [], "GM_NARRATION": [], "ENGINE_NOTES": [], "STATE_DELTA_JSON": []}
+        self.seen = []
+        self.in_fence = False
+        self.fence_lines = None
+        self.last_json_fence = None
+
+    def feed(self, chunk):
+        if "\n" not in chunk:
+            self.partial += chunk
+            return
+        text = self.partial + chunk
+        lines = text.split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            self._line(line)
+
+    def _line(self, line):
+        if not self.in_fence:
+            m = HEADER_RE.match(line)
+            if m:
+                self.section = m.group(1).upper()
+                self.seen.append(self.section)
+                line = m.group(2)
+                if not line.strip():
+                    return
+        # Remember the last fenced JSON block anywhere, for a missing header.
+        if FENCE_RE.match(line):
+            if self.in_fence:
+                block = "\n".join(self.fence_lines)
+                if block.lstrip().startswith("{"):
+                    self.last_json_fence = block
+                self.fence_lines = None
+            else:
+                self.fence_lines = []
+            self.in_fence = not self.in_fence
+        elif self.in_fence:
+            self.fence_lines.append(line)
+        self.lines[self.section].append(line)
+
+    def finish(self):
+        """
+        Returns {"narration", "engine_notes", "delta", "delta_text",
+        "diagnostics"}; delta is None only if nothing could be recovered.
+        """
+        if self.partial:
+            self._line(self.partial)
+            self.partial = ""
+        diagnostics = []
+        text = {name: "\n".join(self.lines[name]).strip() for name in SECTIONS}
+        preamble = "\n".join(self.lines[None]).strip()
+
+        for name in SECTIONS:
+            if self.seen.count(name) > 1:
+                diagnostics.append(_diag("warning", "duplicate_section", f"{name} appeared {self.seen.count(name)} times"))
+        if "GM_NARRATION" not in self.seen:
+            if preamble and not preamble.startswith("```"):
+                text["GM_NARRATION"] = preamble
+                diagnostics.append(_diag("warning", "missing_header", "no GM_NARRATION header; used the text before the first header"))
+            else:
+                diagnostics.append(_diag("warning", "missing_header", "no GM_NARRATION section"))
+        if "ENGINE_NOTES" not in self.seen:
+            diagnostics.append(_diag("warning", "missing_header", "no ENGINE_NOTES section"))
+
+        delta, delta_text = None, None
+        if "STATE_DELTA_JSON" in self.seen:
+            delta_text, fenced = extract_json_text(text["STATE_DELTA_JSON"])
+            if delta_text is not None and not fenced:
+                diagnostics.append(_diag("warning", "unfenced_delta", "STATE_DELTA_JSON was not in a fenced block"))
+        elif self.last_json_fence is not None:
+            delta_text = self.last_json_fence
+            diagnostics.append(_diag("warning", "missing_header", "no STATE_DELTA_JSON header; used the last fenced JSON block"))
+
+        if delta_text is None or not delta_text.strip():
+            diagnostics.append(_diag("error", "no_delta", "no STATE_DELTA_JSON found"))
+        else:
+            delta = parse_delta(delta_text, diagnostics)
+
+        return {
+            "narration": text["GM_NARRATION"],
+            "engine_notes": text["ENGINE_NOTES"],
+            "delta": delta,
+            "delta_text": delta_text,
+            "diagnostics": diagnostics,
+        }
+
+def parse_response(text):
+    parser = ResponseParser()
+    parser.feed(text)
+    return parser.finish()
@@ -0,0 +1,267 @@
+"""
+Long-lived canon retriever for the GM loop.
+
+The Chroma client, the lore collection handle and the embedding provider are
+opened once and reused for every turn instead of being rebuilt per query.
+Results are kept in a small LRU cache that is dropped whenever ingest_lore.py
+rewrites its manifest.
+
+With a campaign state, retrieval is planned: the current region's canon first,
+then routes touching it and discovered factions, and only then a global query
+to fill the remaining slots.
+
+Every query is hybrid: vector ranks from Chroma and BM25 ranks from the local
+lexical index are merged with reciprocal rank fusion. Bare id lookups such as
+"faction_river_wardens" are answered from the lexical index alone.
+"""
+
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+import chromadb
+
+from embeddings import EmbeddingProvider
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from prompt_builder import format_chunk
+
+DB_PATH = "chroma_db"
+COLLECTION_NAME = "lore"
+TOP_K = 6
+CACHE_SIZE = 256
+MANIFEST_NAME = "ingest_manifest.json"
+LEXICAL_NAME = "lexical_index.json"
+IDENT_QUERY_RE = re.compile(r"^\s*[a-z]+(?:_[a-z0-9]+)+\s*$", re.IGNORECASE)
+
+def normalize_query(text):
+    """
+    Case-, punctuation- and whitespace-insensitive form of a query, so
+    "We keep searching the ridge." and "we keep searching the ridge" share
+    a cache entry.
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+def format_canon(chunks):
+    return "\n\n".join(format_chunk(c) for c in chunks)
+
+class CanonRetriever:
+    def __init__(self, db_path=DB_PATH, collection_name=COLLECTION_NAME, embedder=None, cache_size=CACHE_SIZE):
+        self.client = chromadb.PersistentClient(path=db_path)
+        self.collection = self.client.get_collection(collection_name)
+        self.embedder = embedder or EmbeddingProvider()
+        # Filled by every query(); the GM loop copies it into the session log.
+        self.last_timings = {}
+
+        self.manifest_path = os.path.join(db_path, MANIFEST_NAME)
+        self.lexical_path = os.path.join(db_path, LEXICAL_NAME)
+        self._lexical = None
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_invalidations = 0
+        self.generation = None
+        # Planner lookups; stay empty for a DB without a manifest (one built
+        # by an older ingest_lore.py, or a deleted manifest).
+        self.lore_types = {}
+        self.region_refs = {}
+        # Unlike None (no manifest), never equal to a stat result, so the
+        # first check always indexes.
+        self._manifest_stamp = ()
+        self._check_manifest()
+
+    def _check_manifest(self):
+        """
+        Drop cached results if the ingestion manifest changed on disk. A stat()
+        per query is all this costs; the manifest is only parsed on change.
+        """
+        try:
+            st = os.stat(self.manifest_path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self._manifest_stamp:
+            return
+
+        manifest = {}
+        if stamp is not None:
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                pass
+        if self._manifest_stamp != () or self.cache:
+            self.cache.clear()
+            self.cache_invalidations += 1
+        self._manifest_stamp = stamp
+        self.generation = manifest.get("generation")
+        self._lexical = None
+        self._index_manifest(manifest)
+
+    def _index_manifest(self, manifest):
+        """
+        Build the lookups the planner needs from the manifest's per-file
+        type/name/regions entries.
+        """
+        self.lore_types = {}
+        self.region_refs = {}
+        for entry in manifest.get("files", {}).values():
+            name = entry.get("name")
+            if not name:
+                continue
+            self.lore_types[name] = entry.get("type")
+            for rid in entry.get("regions", []):
+                self.region_refs.setdefault(rid, set()).add(name)
+
+    def plan(self, state, k=TOP_K):
+        """
+        Turn campaign state into an ordered list of (label, where, n) stages.
+        Earlier stages win when the same chunk is found twice.
+        """
+        self._check_manifest()
+        stages = []
+        location = (state.get("party") or {}).get("location") or {}
+        region_id = location.get("region_id")
+        if region_id:
+            # Other region files mention their neighbours; they are not local canon.
+            refs = self.region_refs.get(region_id, set())
+            local = sorted(
+                n for n in refs | {region_id}
+                if n == region_id or self.lore_types.get(n) not in ("region", "route", "faction")
+            )
+            if local:
+                stages.append(("region", {"name": {"$in": local}}, max(2, k // 2)))
+
+        nearby = []
+        if region_id:
+            nearby += sorted(n for n in self.region_refs.get(region_id, ()) if self.lore_types.get(n) == "route")
+        factions = (state.get("discovered") or {}).get("factions") or {}
+        nearby += sorted(fid for fid in factions if self.lore_types.get(fid) == "faction")
+        if nearby:
+            stages.append(("routes_factions", {"name": {"$in": nearby}}, max(1, k // 3)))
+
+        stages.append(("global", None, k))
+        return stages
+
+    def query_planned(self, text, state, k=TOP_K):
+        """
+        Run the planned stages and merge them, deduped by id, up to k chunks.
+        """
+        t0 = time.perf_counter()
+        merged, seen, stage_log = [], set(), []
+        for label, where, n in self.plan(state, k=k):
+            remaining = k - len(merged)
+            if remaining <= 0:
+                break
+            # The global stage over-fetches so deduping can still fill k slots.
+            got = self.query(text, k=n if where else n + len(merged), where=where)
+            added = 0
+            for c in got:
+                if c["id"] in seen or added >= remaining:
+                    continue
+                seen.add(c["id"])
+                merged.append(dict(c, stage=label))
+                added += 1
+            stage_log.append({"stage": label, "added": added, **self.last_timings})
+
+        self.last_timings = {
+            "total_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+            "results": len(merged),
+            "stages": stage_log,
+        }
+        return merged
+
+    @property
+    def lexical(self):
+        # Loaded on first use and again after every re-ingest.
+        if self._lexical is None:
+            self._lexical = LexicalIndex.load(self.lexical_path)
+        return self._lexical
+
+    def cache_stats(self):
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "invalidations": self.cache_invalidations,
+            "size": len(self.cache),
+            "generation": self.generation,
+        }
+
+    def warm(self):
+        """
+        Load the embedding model and touch the vector index so the first real
+        turn doesn't pay for either.
+        """
+        t0 = time.perf_counter()
+        self.embedder.model
+        self.lexical
+        self.query("warm-up query", k=1)
+        return (time.perf_counter() - t0) * 1000.0
+
+    def query(self, text, k=TOP_K, where=None):
+        """
+        Return up to k chunks as dicts: {id, doc, meta, distance}.
+        """
+        t0 = time.perf_counter()
+        self._check_manifest()
+        key = (normalize_query(text), k, json.dumps(where, sort_keys=True) if where else None)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.move_to_end(key)
+            self.cache_hits += 1
+            self.last_timings = {
+                "cache": "hit",
+                "total_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+                "results": len(cached),
+            }
+            return list(cached)
+        self.cache_misses += 1
+
+        lex_hits = self.lexical.search(text, k=k, where=where)
+        t1 = time.perf_counter()
+        timings = {"cache": "miss", "lexical_ms": round((t1 - t0) * 1000.0, 2)}
+
+        if lex_hits and IDENT_QUERY_RE.match(text):
+            chunks = [self._lexical_chunk(doc_id) for doc_id, _ in lex_hits]
+            timings["mode"] = "lexical"
+        else:
+            vec = self.embedder.embed_query(text)
+            t2 = time.perf_counter()
+            kwargs = {"query_embeddings": [vec], "n_results": k}
+            if where:
+                kwargs["where"] = where
+            res = self.collection.query(**kwargs)
+            t3 = time.perf_counter()
+
+            distances = (res.get("distances") or [[None] * len(res["ids"][0])])[0]
+            by_id = {
+                cid: {"id": cid, "doc": doc, "meta": meta or {}, "distance": dist}
+                for cid, doc, meta, dist in zip(res["ids"][0], res["documents"][0], res["metadatas"][0], distances)
+            }
+            fused = reciprocal_rank_fusion([list(by_id), [doc_id for doc_id, _ in lex_hits]])[:k]
+            chunks = [by_id.get(cid) or self._lexical_chunk(cid) for cid in fused]
+            timings.update({
+                "mode": "hybrid",
+                "embed_ms": round((t2 - t1) * 1000.0, 2),
+                "query_ms": round((t3 - t2) * 1000.0, 2),
+            })
+
+        self.cache[key] = chunks
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        timings["total_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+        timings["results"] = len(chunks)
+        self.last_timings = timings
+        return list(chunks)
+
+    def _lexical_chunk(self, doc_id):
+        doc, meta = self.lexical.get(doc_id)
+        return {"id": doc_id, "doc": doc, "meta": meta, "distance": None}
+
+    def retrieve(self, text, k=TOP_K, state=None):
+        if state is not None:
+            return format_canon(self.query_planned(text, state, k=k))
+        return format_canon(self.query(text, k=k))
@@ -0,0 +1,294 @@
+"""
+Searchable index of played turns: "what did the party promise the river
+wardens forty turns ago".
+
+Every turn's party input and narration is split into a few chunks and added
+to two indexes as the turn is written:
+- a SQLite FTS5 full-text table (chroma_db/session_history.sqlite), ranked
+  with BM25. Unlike the canon's LexicalIndex it is never loaded into memory:
+  a turn is one INSERT, and a search touches only the matching postings, so
+  it stays fast over thousands of turns;
+- a session_history Chroma collection, for paraphrased questions.
+
+search() fuses both with reciprocal rank fusion, like the canon retriever,
+and returns at most one chunk per turn. The lexical side alone answers in
+milliseconds, which is what the CLI uses unless asked for --semantic.
+
+Usage:
+  python scripts/session_history.py "river wardens promise"
+  python scripts/session_history.py "what did we owe the ferryman" --semantic
+  python scripts/session_history.py --rebuild     # reindex every logged turn
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from lexical_index import reciprocal_rank_fusion, tokenize
+from session_index import open_index
+
+DB_PATH = "chroma_db"
+HISTORY_COLLECTION = "session_history"
+HISTORY_LEXICAL_PATH = os.path.join(DB_PATH, "session_history.sqlite")
+CHUNK_CHARS = 1200
+RECALL_K = 3
+
+# terms holds lexical_index.tokenize() output, so ids such as region_001 match
+# whole and split, exactly as in canon retrieval; the rest is stored as is.
+FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS history USING fts5("
+    " terms, id UNINDEXED, turn UNINDEXED, chapter UNINDEXED, ts UNINDEXED, doc UNINDEXED,"
+    " tokenize=\"unicode61 tokenchars '_'\")"
+)
+
+PARTY_INPUT_RE = re.compile(r"## Party Input\n```text\n(.*?)```\n", re.DOTALL)
+
+def chunk_turn(turn_n, player_input, narration, chunk_chars=CHUNK_CHARS):
+    """
+    Split one turn into (id, text) chunks on paragraph boundaries. The party
+    input leads the first chunk, so a search for what was said finds it.
+    """
+    paras = [p.strip() for p in re.split(r"\n\s*\n", narration or "") if p.strip()]
+    chunks, cur = [], f"Party: {player_input.strip()}" if player_input and player_input.strip() else ""
+    for p in paras:
+        if cur and len(cur) + len(p) + 2 > chunk_chars:
+            chunks.append(cur)
+            cur = ""
+        cur = f"{cur}\n\n{p}" if cur else p
+    if cur:
+        chunks.append(cur)
+    return [(f"turn_{turn_n:04d}_{i}", text) for i, text in enumerate(chunks)]
+
+def read_turn(entry):
+    """
+    (party input, narration) of one turn, read back from its public log.
+    """
+    if not entry or not entry.get("public"):
+        return "", ""
+    try:
+        with open(entry["public"], "rb") as f:
+            data = f.read()
+    except OSError:
+        return "", ""
+    offset = entry.get("narration_offset")
+    head = data[:offset] if offset else data
+    m = PARTY_INPUT_RE.search(head.decode("utf-8", "replace"))
+    narration = data[offset:].decode("utf-8", "replace").strip() if offset else ""
+    return (m.group(1).strip() if m else ""), narration
+
+class HistoryIndex:
+    """
+    client and embedder are optional: without them the index is lexical only
+    (enough for the CLI, and no Chroma or model to load).
+    """
+
+    def __init__(self, client=None, embedder=None, lexical_path=HISTORY_LEXICAL_PATH, collection_name=HISTORY_COLLECTION):
+        self.lexical_path = lexical_path
+        self.embedder = embedder
+        self.client = client
+        self.collection_name = collection_name
+        self.collection = client.get_or_create_collection(collection_name) if client is not None else None
+        self.last_timings = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(lexical_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(lexical_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(FTS_SCHEMA)
+        self._db.commit()
+        self.turns = {row[0] for row in self._db.execute("SELECT DISTINCT turn FROM history")}
+
+    def __len__(self):
+        return len(self.turns)
+
+    def chunk_count(self):
+        return self._db.execute("SELECT count(*) FROM history").fetchone()[0]
+
+    def add_turn(self, turn_n, player_input, narration, chapter=None, ts=None):
+        """
+        Index one turn in both stores. Re-adding a turn replaces its chunks.
+        """
+        chunks = chunk_turn(turn_n, player_input, narration)
+        if not chunks:
+            return 0
+        with self._lock:
+            if turn_n in self.turns:
+                self._db.execute("DELETE FROM history WHERE turn = ?", (turn_n,))
+            self._db.executemany(
+                "INSERT INTO history (terms, id, turn, chapter, ts, doc) VALUES (?, ?, ?, ?, ?, ?)",
+                [(" ".join(tokenize(text)), doc_id, turn_n, chapter, ts, text) for doc_id, text in chunks],
+            )
+            self._db.commit()
+
+        if self.collection is not None:
+            meta = {"kind": "session", "turn": turn_n}
+            if chapter:
+                meta["chapter"] = chapter
+            docs = [text for _, text in chunks]
+            self.collection.upsert(
+                ids=[doc_id for doc_id, _ in chunks],
+                documents=docs,
+                metadatas=[meta] * len(chunks),
+                embeddings=self.embedder.embed(docs),
+            )
+        self.turns.add(turn_n)
+        return len(chunks)
+
+    def sync(self, index):
+        """
+        Add any turn in the session index that is not indexed yet (older
+        campaigns, or a crash between writing a turn and indexing it).
+        Returns how many turns were added.
+        """
+        added = 0
+        for turn_n in sorted(set(index.turns) - self.turns):
+            entry = index.get(turn_n)
+            player_input, narration = read_turn(entry)
+            if self.add_turn(turn_n, player_input, narration, entry.get("chapter"), entry.get("ts")):
+                added += 1
+        return added
+
+    def rebuild(self, index):
+        """
+        Drop both indexes and reindex every turn in the session index.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM history")
+            self._db.commit()
+        if self.collection is not None:
+            self.client.delete_collection(self.collection_name)
+            self.collection = self.client.get_or_create_collection(self.collection_name)
+        self.turns = set()
+        return self.sync(index)
+
+    def lexical_search(self, text, n, chapter=None):
+        """
+        BM25 top-n chunks from the full-text index, best first.
+        """
+        terms = sorted(set(tokenize(text)))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+        sql = "SELECT id, turn, chapter, doc FROM history WHERE history MATCH ?"
+        params = [match]
+        if chapter:
+            sql += " AND chapter = ?"
+            params.append(chapter)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(n)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        out = []
+        for cid, turn_n, ch, doc in rows:
+            meta = {"kind": "session", "turn": turn_n}
+            if ch:
+                meta["chapter"] = ch
+            out.append({"id": cid, "doc": doc, "meta": meta, "distance": None})
+        return out
+
+    def search(self, text, k=RECALL_K, semantic=True, chapter=None, exclude_turns=()):
+        """
+        The best chunk of each of the k most relevant turns, as {id, doc,
+        meta, distance} chunks. semantic=False (or no collection) skips the
+        vector query.
+        """
+        t0 = time.perf_counter()
+        # Over-fetch: several chunks of one turn collapse into one result.
+        n = k * 3 + len(exclude_turns)
+        by_id = {c["id"]: c for c in self.lexical_search(text, n, chapter)}
+        lex_hits = list(by_id)
+        t1 = time.perf_counter()
+        timings = {"lexical_ms": round((t1 - t0) * 1000.0, 2)}
+
+        vec_hits = []
+        # The FTS table and the collection can disagree (a lexical-only CLI
+        # run, a recreated collection): size the query by the collection.
+        size = self.collection.count() if semantic and self.collection is not None else 0
+        if size:
+            vec = self.embedder.embed_query(text)
+            kwargs = {"query_embeddings": [vec], "n_results": min(n, size)}
+            if chapter:
+                kwargs["where"] = {"chapter": chapter}
+            res = self.collection.query(**kwargs)
+            distances = (res.get("distances") or [[None] * len(res["ids"][0])])[0]
+            for cid, doc, meta, dist in zip(res["ids"][0], res["documents"][0], res["metadatas"][0], distances):
+                # The vector side carries the distance; prefer its copy.
+                by_id[cid] = {"id": cid, "doc": doc, "meta": meta or {}, "distance": dist}
+                vec_hits.append(cid)
+            timings["vector_ms"] = round((time.perf_counter() - t1) * 1000.0, 2)
+
+        ranked = reciprocal_rank_fusion([vec_hits, lex_hits]) if vec_hits else lex_hits
+        out, seen = [], set(exclude_turns)
+        for cid in ranked:
+            chunk = by_id[cid]
+            turn_n = chunk["meta"].get("turn")
+            if turn_n in seen:
+                continue
+            seen.add(turn_n)
+            out.append(chunk)
+            if len(out) >= k:
+                break
+        timings["total_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+        timings["results"] = len(out)
+        self.last_timings = timings
+        return out
+
+def snippet(doc, query, width=240):
+    """
+    The part of doc around the first query term it contains.
+    """
+    flat = " ".join(doc.split())
+    lower = flat.lower()
+    at = -1
+    for tok in tokenize(query):
+        at = lower.find(tok)
+        if at >= 0:
+            break
+    start = max(0, at - width // 3) if at >= 0 else 0
+    text = flat[start:start + width]
+    return ("…" if start else "") + text + ("…" if start + width < len(flat) else "")
+
+def main():
+    ap = argparse.ArgumentParser(description="Search the played turns (public journal) by text.")
+    ap.add_argument("query", nargs="?", help="What to look for")
+    ap.add_argument("--k", type=int, default=5, help="Number of turns to show")
+    ap.add_argument("--semantic", action="store_true", help="Also run a vector query (loads Chroma and the embedding model)")
+    ap.add_argument("--chapter", help="Only turns from this chapter slug")
+    ap.add_argument("--rebuild", action="store_true", help="Reindex every turn in sessions/index.jsonl")
+    args = ap.parse_args()
+
+    client = embedder = None
+    if args.semantic or args.rebuild:
+        import chromadb
+        from embeddings import EmbeddingProvider
+        client = chromadb.PersistentClient(path=DB_PATH)
+        embedder = EmbeddingProvider()
+
+    t0 = time.perf_counter()
+    history = HistoryIndex(client, embedder)
+    load_ms = (time.perf_counter() - t0) * 1000.0
+    index = open_index()
+    if args.rebuild:
+        n = history.rebuild(index)
+        print(f"Reindexed {n} turns.")
+    else:
+        n = history.sync(index) if client is not None else 0
+        if n:
+            print(f"Indexed {n} new turns.")
+    if not args.query:
+        print(f"{len(history)} turns indexed ({history.chunk_count()} chunks); loaded in {load_ms:.1f} ms")
+        return
+
+    results = history.search(args.query, k=args.k, semantic=args.semantic, chapter=args.chapter)
+    for c in results:
+        meta = c["meta"]
+        label = f"Turn {meta['turn']:04d}" + (f" ({meta['chapter']})" if meta.get("chapter") else "")
+        print(f"{label}\n  {snippet(c['doc'], args.query)}\n")
+    t = history.last_timings
+    print(f"{len(results)} of {len(history)} turns; load {load_ms:.1f} ms, search {t['total_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    main()
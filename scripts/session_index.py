@@ -0,0 +1,204 @@
+"""
+Persisted index of played turns: sessions/index.jsonl.
+
+One JSON line per turn with its timestamp, chapter, the paths and sizes of
+the public and private logs, and the byte offset of the narration inside the
+public log. The GM loop appends a line (fsynced) after each turn's logs are
+written, so next_turn_number, the chapter compiler and lookup tools never
+have to scan sessions/. A crash between the logs and the index line leaves
+logs past the last indexed turn; opening the index probes for those and
+indexes them, so a turn number is never handed out twice.
+
+Usage:
+  python scripts/session_index.py --rebuild     # regenerate from existing logs
+  python scripts/session_index.py --show 12     # print one turn's entry
+  python scripts/session_index.py               # summary
+"""
+
+import argparse
+import json
+import os
+import re
+
+SESSIONS_DIR = "sessions"
+PUBLIC_DIR = "public_journal"
+CHAPTER_STATE_PATH = os.path.join("state", "chapter.json")
+INDEX_PATH = os.path.join(SESSIONS_DIR, "index.jsonl")
+
+TURN_FILE_RE = re.compile(r"^turn_(\d{4,})\.md$")
+TIMESTAMP_RE = re.compile(rb"^- Timestamp: (.+?)\s*$", re.MULTILINE)
+NARRATION_HEADER = b"## Narration\n"
+
+def chapter_turns(chapter_state_path=CHAPTER_STATE_PATH):
+    """
+    {turn: slug} for the active chapter's turns; other chapters aren't kept.
+    """
+    if not os.path.exists(chapter_state_path):
+        return {}
+    with open(chapter_state_path, "r", encoding="utf-8") as f:
+        ch = json.load(f)
+    if not ch.get("active"):
+        return {}
+    return {t: ch.get("slug") for t in ch.get("turns", [])}
+
+def make_entry(turn_n, ts, chapter, public_path, private_path, narration_offset=None):
+    return {
+        "turn": turn_n,
+        "ts": ts,
+        "chapter": chapter,
+        "public": public_path,
+        "private": private_path,
+        "public_bytes": os.path.getsize(public_path) if os.path.exists(public_path) else 0,
+        "private_bytes": os.path.getsize(private_path) if os.path.exists(private_path) else 0,
+        "narration_offset": narration_offset,
+    }
+
+def entry_from_logs(turn_n, sessions_dir, public_dir, chapter=None):
+    """
+    An index entry recovered from a turn's logs on disk.
+    """
+    private_path = os.path.join(sessions_dir, f"turn_{turn_n:04d}.md")
+    public_path = os.path.join(public_dir, f"turn_{turn_n:04d}.md")
+    ts, narration_offset = None, None
+    for p in (private_path, public_path):
+        if not os.path.exists(p):
+            continue
+        with open(p, "rb") as f:
+            data = f.read()
+        m = TIMESTAMP_RE.search(data)
+        if m and ts is None:
+            ts = m.group(1).decode("utf-8")
+        if p == public_path:
+            i = data.find(NARRATION_HEADER)
+            narration_offset = i + len(NARRATION_HEADER) if i >= 0 else None
+    return make_entry(turn_n, ts, chapter, public_path, private_path, narration_offset)
+
+class SessionIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.turns = {}
+
+    @property
+    def last_turn(self):
+        return max(self.turns) if self.turns else 0
+
+    def next_turn(self):
+        return self.last_turn + 1
+
+    def get(self, turn_n):
+        return self.turns.get(turn_n)
+
+    def load(self):
+        """
+        Read the index; a torn last line (crash mid-append) is cut off.
+        """
+        self.turns = {}
+        if not os.path.exists(self.path):
+            return self
+        good_end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                self.turns[entry["turn"]] = entry
+                good_end += len(line)
+        if good_end != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good_end)
+        return self
+
+    def _append(self, entry):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.turns[entry["turn"]] = entry
+        return entry
+
+    def record(self, turn_n, ts, chapter, public_path, private_path, narration_offset=None):
+        return self._append(make_entry(turn_n, ts, chapter, public_path, private_path, narration_offset))
+
+    def reconcile(self, sessions_dir=SESSIONS_DIR, public_dir=PUBLIC_DIR, chapter_state_path=CHAPTER_STATE_PATH):
+        """
+        Index turns whose logs were written after the last indexed turn but
+        whose index line never was. Probes turn numbers one by one past the
+        last indexed turn, so this costs a stat or two on a clean start.
+        Returns the turn numbers added.
+        """
+        added = []
+        chapter_of = None
+        n = self.last_turn + 1
+        while any(os.path.exists(os.path.join(d, f"turn_{n:04d}.md")) for d in (sessions_dir, public_dir)):
+            if chapter_of is None:
+                chapter_of = chapter_turns(chapter_state_path)
+            self._append(entry_from_logs(n, sessions_dir, public_dir, chapter_of.get(n)))
+            added.append(n)
+            n += 1
+        return added
+
+    def rebuild(self, sessions_dir=SESSIONS_DIR, public_dir=PUBLIC_DIR, chapter_state_path=CHAPTER_STATE_PATH):
+        """
+        Regenerate the index from the turn logs on disk, replacing the file
+        atomically. Chapters are only known for the active chapter's turns.
+        """
+        chapter_of = chapter_turns(chapter_state_path)
+
+        numbers = set()
+        for d in (sessions_dir, public_dir):
+            if os.path.isdir(d):
+                for fn in os.listdir(d):
+                    m = TURN_FILE_RE.match(fn)
+                    if m:
+                        numbers.add(int(m.group(1)))
+
+        self.turns = {}
+        for n in sorted(numbers):
+            self.turns[n] = entry_from_logs(n, sessions_dir, public_dir, chapter_of.get(n))
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for n in sorted(self.turns):
+                f.write(json.dumps(self.turns[n], ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return self
+
+def open_index(path=INDEX_PATH, sessions_dir=SESSIONS_DIR, public_dir=PUBLIC_DIR):
+    """
+    Load the index and catch it up with any logs written past its last
+    entry, building it from the logs the first time it is used on a
+    campaign that predates it.
+    """
+    index = SessionIndex(path)
+    if os.path.exists(path):
+        index.load().reconcile(sessions_dir, public_dir)
+        return index
+    has_logs = any(
+        TURN_FILE_RE.match(fn)
+        for d in (sessions_dir, public_dir) if os.path.isdir(d)
+        for fn in os.listdir(d)
+    )
+    return index.rebuild(sessions_dir, public_dir) if has_logs else index
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or rebuild the session index.")
+    ap.add_argument("--rebuild", action="store_true", help="Regenerate sessions/index.jsonl from existing turn logs")
+    ap.add_argument("--show", type=int, metavar="TURN", help="Print the index entry for one turn")
+    args = ap.parse_args()
+
+    index = SessionIndex().rebuild() if args.rebuild else open_index()
+    if args.show is not None:
+        entry = index.get(args.show)
+        print(json.dumps(entry, indent=2, ensure_ascii=False) if entry else f"Turn {args.show} not in index.")
+        return
+    print(f"{len(index.turns)} turns indexed; last turn {index.last_turn:04d}; next {index.next_turn():04d}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Append-only campaign state store.
+
+state/current.json is a checkpoint; every turn's STATE_DELTA_JSON is appended
+to state/current.journal.jsonl (one JSON line, fsynced) and applied to the
+state held in memory. Every CHECKPOINT_EVERY turns, and on close, the journal
+is compacted into a fresh checkpoint. Opening the store replays whatever the
+journal holds on top of the checkpoint, so a crash loses at most the turn
+being written.
+
+Journal entries carry a sequence number and the checkpoint records the last
+one it includes (the "_journal_seq" key), so a crash between writing a
+checkpoint and emptying the journal never applies a delta twice.
+
+apply_delta is copy-on-write: only the branches a delta touches are copied.
+The store, which owns its state outright, applies deltas in place against a
+StateIndex (fact set, quest id -> position, NPC ids) kept across turns, so a
+commit costs O(delta) regardless of campaign length.
+
+Besides the model's delta keys, apply_delta understands "memory_compact",
+which campaign_memory uses to drop facts and notes it has folded into the
+running summary.
+"""
+
+import copy
+import json
+import os
+from datetime import datetime
+
+CHECKPOINT_EVERY = 50
+SEQ_KEY = "_journal_seq"
+
+def _fsync_dir(path):
+    # Make a rename durable; not supported on every platform.
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def write_json_atomic(path, obj, indent=2):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=indent, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+class StateIndex:
+    """
+    Hash indexes over a state's collections. Never serialized; rebuilt from
+    the state on load, then kept current by in-place apply_delta calls.
+    """
+
+    def __init__(self, state):
+        self.facts = set(state.get("facts") or [])
+        self.quests = {}
+        for i, q in enumerate(state.get("quests") or []):
+            if q.get("id") and q["id"] not in self.quests:
+                self.quests[q["id"]] = i
+        self.npcs = set(state.get("npcs") or {})
+
+DELTA_LIST_KEYS = ("quests_add", "quests_update", "facts_add", "npcs_upsert", "notes_add")
+DELTA_DICT_KEYS = ("time_advance", "party_move", "discover", "memory_compact")
+
+def check_delta(delta):
+    """
+    Reject deltas whose shape apply_delta cannot handle, before anything is
+    mutated. Raises ValueError.
+    """
+    if not isinstance(delta, dict):
+        raise ValueError("delta must be an object")
+    for key in DELTA_DICT_KEYS:
+        if delta.get(key) and not isinstance(delta[key], dict):
+            raise ValueError(f"{key} must be an object")
+    for kind in ("regions", "sites", "factions"):
+        items = (delta.get("discover") or {}).get(kind)
+        if items and not (isinstance(items, list) and all(isinstance(x, dict) for x in items)):
+            raise ValueError(f"discover.{kind} must be a list of objects")
+    mc = delta.get("memory_compact") or {}
+    for key in ("facts_drop", "notes_drop"):
+        if not isinstance(mc.get(key, 0), int) or mc.get(key, 0) < 0:
+            raise ValueError(f"memory_compact.{key} must be a non-negative integer")
+    for key in DELTA_LIST_KEYS:
+        items = delta.get(key)
+        if not items:
+            continue
+        if not isinstance(items, list):
+            raise ValueError(f"{key} must be a list")
+        want = str if key in ("facts_add", "notes_add") else dict
+        if not all(isinstance(x, want) for x in items):
+            raise ValueError(f"{key} items must be {'strings' if want is str else 'objects'}")
+
+def apply_delta(state, delta, index=None, in_place=False):
+    """
+    Apply a STATE_DELTA_JSON to state.
+
+    By default the input is left untouched and a new state is returned that
+    shares every branch the delta did not touch. With in_place=True (the
+    StateStore, which owns its state) nothing is copied, and index, if given,
+    is used for membership checks and kept up to date.
+    """
+    s = state if in_place else dict(state)
+    owned = set()
+
+    def own(parent, key, factory, path):
+        # Make parent[key] safe to mutate: copy it once per call unless in place.
+        value = parent.get(key)
+        if value is None:
+            value = factory()
+        elif not in_place and path not in owned:
+            value = copy.copy(value)
+        owned.add(path)
+        parent[key] = value
+        return value
+
+    # time advance
+    ta = delta.get("time_advance")
+    if ta:
+        t = own(s, "time", dict, ("time",))
+        for key in ("day", "watch"):
+            if key in ta and ta[key] is not None:
+                t[key] = ta[key]
+
+    # party move
+    pm = delta.get("party_move")
+    if pm:
+        party = own(s, "party", dict, ("party",))
+        loc = own(party, "location", dict, ("party", "location"))
+        for key in ("region_id", "site_id"):
+            if key in pm:
+                loc[key] = pm[key]
+
+    # discoveries
+    disc = delta.get("discover", {})
+    if disc:
+        d = own(s, "discovered", dict, ("discovered",))
+        for kind, id_key, extra in (
+            ("regions", "region_id", ("party_name",)),
+            ("sites", "site_id", ("party_name", "region_id")),
+            ("factions", "faction_id", ("party_name",)),
+        ):
+            bucket = own(d, kind, dict, ("discovered", kind))
+            for item in disc.get(kind, []) or []:
+                iid = item.get(id_key)
+                if not iid:
+                    continue
+                entry = own(bucket, iid, dict, ("discovered", kind, iid))
+                for key in extra:
+                    if item.get(key):
+                        entry[key] = item[key]
+
+    # quests
+    if delta.get("quests_add") or delta.get("quests_update"):
+        quests = own(s, "quests", list, ("quests",))
+        positions = index.quests if (in_place and index is not None) else None
+        if positions is None:
+            positions = {}
+            for i, q in enumerate(quests):
+                if q.get("id") and q["id"] not in positions:
+                    positions[q["id"]] = i
+
+        for q in delta.get("quests_add") or []:
+            if q.get("id") and q["id"] not in positions:
+                positions[q["id"]] = len(quests)
+                # A copy: updates below must not reach the caller's delta,
+                # which is what the journal records.
+                quests.append(copy.deepcopy(q))
+
+        for upd in delta.get("quests_update") or []:
+            qid = upd.get("id")
+            if qid and qid in positions:
+                i = positions[qid]
+                quest = quests[i] if in_place else dict(quests[i])
+                quests[i] = quest
+                if "status" in upd:
+                    quest["status"] = upd["status"]
+                if "notes" in upd and upd["notes"]:
+                    if in_place:
+                        notes = quest.setdefault("notes", [])
+                    else:
+                        notes = quest["notes"] = list(quest.get("notes") or [])
+                    notes.append(upd["notes"])
+
+    # facts
+    if delta.get("facts_add"):
+        facts = own(s, "facts", list, ("facts",))
+        seen = index.facts if (in_place and index is not None) else set(facts)
+        for fact in delta["facts_add"]:
+            if fact and fact not in seen:
+                seen.add(fact)
+                facts.append(fact)
+
+    # npcs
+    if delta.get("npcs_upsert"):
+        npcs = own(s, "npcs", dict, ("npcs",))
+        for npc in delta["npcs_upsert"]:
+            nid = npc.get("id")
+            if not nid:
+                continue
+            entry = own(npcs, nid, dict, ("npcs", nid))
+            entry.update({k: v for k, v in npc.items() if v is not None})
+            if in_place and index is not None:
+                index.npcs.add(nid)
+
+    # notes
+    if delta.get("notes_add"):
+        notes = own(s, "notes", list, ("notes",))
+        for n in delta["notes_add"]:
+            if n:
+                notes.append(n)
+
+    # campaign memory compaction (written by the GM loop, never by the model):
+    # the oldest facts/notes were folded into the summary, drop them here
+    mc = delta.get("memory_compact")
+    if mc:
+        dropped = {}
+        for key in ("facts", "notes"):
+            n = mc.get(f"{key}_drop") or 0
+            if n:
+                items = own(s, key, list, (key,))
+                dropped[key] = items[:n]
+                del items[:n]
+        if in_place and index is not None and dropped.get("facts"):
+            index.facts.difference_update(set(dropped["facts"]) - set(s["facts"]))
+        prev = s.get("memory") or {}
+        s["memory"] = {
+            "summary": mc.get("summary", prev.get("summary", "")),
+            "through_turn": mc.get("through_turn", prev.get("through_turn", 0)),
+            "folded_facts": prev.get("folded_facts", 0) + len(dropped.get("facts", [])),
+            "folded_notes": prev.get("folded_notes", 0) + len(dropped.get("notes", [])),
+            "compactions": prev.get("compactions", 0) + 1,
+        }
+
+    return s
+
+class StateStore:
+    def __init__(self, path, checkpoint_every=CHECKPOINT_EVERY):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + ".journal.jsonl"
+        self.checkpoint_every = checkpoint_every
+        self.state = None
+        self.index = None
+        self.seq = 0
+        self.since_checkpoint = 0
+        self._journal = None
+
+    def open(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.state = json.load(f)
+        self.seq = self.state.pop(SEQ_KEY, 0)
+        self.index = StateIndex(self.state)
+        self.since_checkpoint = self._replay()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        return self
+
+    def _replay(self):
+        """
+        Apply journal entries to the checkpoint. A torn last line (crash
+        mid-write) is cut off so later appends start on a clean line.
+        """
+        if not os.path.exists(self.journal_path):
+            return 0
+        replayed = 0
+        good_end = 0
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                good_end += len(line)
+                if entry["seq"] <= self.seq:
+                    continue  # already folded into the checkpoint
+                self._apply(entry["delta"])
+                self.seq = entry["seq"]
+                replayed += 1
+        if good_end != os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good_end)
+        return replayed
+
+    def _apply(self, delta):
+        check_delta(delta)
+        apply_delta(self.state, delta, index=self.index, in_place=True)
+
+    def commit(self, delta, turn=None):
+        """
+        Apply a delta and make it durable. The delta is shape-checked and
+        applied first, so one that cannot be applied never reaches the
+        journal; its journal line is serialized before that, so the journal
+        holds the delta as given, whatever applying it touches. Returns the
+        (same, updated) state object.
+        """
+        entry = {
+            "seq": self.seq + 1,
+            "turn": turn,
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "delta": delta,
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        self._apply(delta)
+        self._journal.write(line)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self.seq += 1
+        self.since_checkpoint += 1
+        if self.since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+        return self.state
+
+    def checkpoint(self):
+        """
+        Write the materialized state as the new checkpoint, then empty the
+        journal.
+        """
+        write_json_atomic(self.path, {**self.state, SEQ_KEY: self.seq})
+        self._journal.close()
+        self._journal = open(self.journal_path, "w", encoding="utf-8")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self.since_checkpoint = 0
+
+    def close(self):
+        if self._journal is None:
+            return
+        if self.since_checkpoint:
+            self.checkpoint()
+        self._journal.close()
+        self._journal = None
@@ -0,0 +1,224 @@
+"""
+Local OpenAI-compatible stub server for offline runs and benchmarks.
+
+Serves POST /v1/chat/completions (plain and streamed) with the same canned
+GM response as the in-process fake backend, paced by a configurable
+time-to-first-token and token rate, over HTTP/1.1 keep-alive.
+
+Faults can be injected to exercise retries and hedging: a fraction of
+requests can fail with HTTP 503, have their connection dropped, be slowed
+down by an extra delay, or (streams) be cut off halfway. A fault script
+fixes the faults of the first requests in arrival order, for checks that
+need an exact sequence (see scripts/check_model_calls.py).
+
+Usage:
+  python scripts/stub_llm_server.py --port 8080 --latency-ms 300 --tokens-per-s 60
+  python scripts/stub_llm_server.py --error-rate 0.1 --slow-rate 0.05 --slow-ms 2000
+  python scripts/stub_llm_server.py --script error,error,slow --slow-ms 2000
+  python scripts/gm_loop.py --backend http --base-url http://127.0.0.1:8080/v1
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_backends import canned_response, input_text, token_pieces
+from prompt_builder import estimate_tokens
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_ms = 0.0
+    tokens_per_s = 0.0
+    error_rate = 0.0
+    drop_rate = 0.0
+    slow_rate = 0.0
+    slow_ms = 0.0
+    cut_rate = 0.0
+    script = deque()
+    rng = random.Random()
+    rng_lock = threading.Lock()
+    quiet = False
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # the client's delayed ACK adds ~40 ms to every response.
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client hung up, e.g. a hedged request that lost the race.
+            pass
+
+    def _fault(self):
+        """
+        Pick this request's injected fault: "error", "drop", "slow", "cut" or
+        None. Counts the request in server.stats.
+        """
+        with self.rng_lock:
+            self.server.stats["requests"] += 1
+            if self.script:
+                return self.script.popleft() or None
+            r = self.rng.random()
+        for fault, rate in (("error", self.error_rate), ("drop", self.drop_rate),
+                            ("slow", self.slow_rate), ("cut", self.cut_rate)):
+            if r < rate:
+                return fault
+            r -= rate
+        return None
+
+    def log_message(self, fmt, *args):
+        if not self.quiet:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"no route {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON body"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"no route {self.path}"}})
+            return
+
+        messages = req.get("messages") or []
+        pieces = token_pieces(canned_response(messages))
+        usage = {
+            "prompt_tokens": estimate_tokens(input_text(messages)),
+            "completion_tokens": len(pieces),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = req.get("model") or "stub"
+
+        fault = self._fault()
+        if fault == "error":
+            self._send_json(503, {"error": {"message": "injected failure"}})
+            return
+        if fault == "drop":
+            self.close_connection = True
+            return
+        delay_ms = self.latency_ms + (self.slow_ms if fault == "slow" else 0.0)
+        if delay_ms:
+            time.sleep(delay_ms / 1000.0)
+
+        if not req.get("stream"):
+            if self.tokens_per_s:
+                time.sleep(len(pieces) / self.tokens_per_s)
+            self._send_json(200, {
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if fault == "cut":
+            # Part of the text, then the connection goes away mid-stream.
+            pieces = pieces[:max(1, len(pieces) // 2)]
+        start = time.perf_counter()
+        for i, piece in enumerate(pieces):
+            if self.tokens_per_s and i:
+                wait = start + i / self.tokens_per_s - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            event = {"object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": piece}}]}
+            self._chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        if fault == "cut":
+            self.close_connection = True
+            return
+        if (req.get("stream_options") or {}).get("include_usage"):
+            self._chunk(f"data: {json.dumps({'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+def make_server(host="127.0.0.1", port=8080, latency_ms=0.0, tokens_per_s=0.0,
+                error_rate=0.0, drop_rate=0.0, slow_rate=0.0, slow_ms=0.0, cut_rate=0.0,
+                script=None, seed=None, quiet=False):
+    """
+    A ThreadingHTTPServer with its own handler settings (port 0 picks a free
+    port; see server.server_address). Call serve_forever() to run it.
+    script is a sequence of faults ("error", "drop", "slow", "cut" or None)
+    for the first requests; the rates apply after it runs out.
+    server.stats["requests"] counts chat completion requests.
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency_ms": latency_ms,
+        "tokens_per_s": tokens_per_s,
+        "error_rate": error_rate,
+        "drop_rate": drop_rate,
+        "slow_rate": slow_rate,
+        "slow_ms": slow_ms,
+        "cut_rate": cut_rate,
+        "script": deque(script or ()),
+        "rng": random.Random(seed),
+        "rng_lock": threading.Lock(),
+        "quiet": quiet,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stats = {"requests": 0}
+    return server
+
+def main():
+    ap = argparse.ArgumentParser(description="OpenAI-compatible stub server returning canned GM responses.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="Delay before the first token")
+    ap.add_argument("--tokens-per-s", type=float, default=0.0, help="Output token rate (0 = unthrottled)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    ap.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of requests whose connection is dropped")
+    ap.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests delayed by --slow-ms")
+    ap.add_argument("--slow-ms", type=float, default=0.0, help="Extra delay for slowed requests")
+    ap.add_argument("--cut-rate", type=float, default=0.0, help="Fraction of streams cut off halfway")
+    ap.add_argument("--script", default="",
+                    help="Comma-separated faults for the first requests, e.g. error,slow,,cut (empty = none)")
+    ap.add_argument("--seed", type=int, default=None, help="Seed for fault injection")
+    ap.add_argument("--quiet", action="store_true", help="Don't log requests")
+    args = ap.parse_args()
+
+    server = make_server(
+        args.host, args.port,
+        latency_ms=args.latency_ms, tokens_per_s=args.tokens_per_s,
+        error_rate=args.error_rate, drop_rate=args.drop_rate,
+        slow_rate=args.slow_rate, slow_ms=args.slow_ms, cut_rate=args.cut_rate,
+        script=args.script.split(",") if args.script else None,
+        seed=args.seed, quiet=args.quiet,
+    )
+    print(f"[stub llm] http://{args.host}:{args.port}/v1 (latency {args.latency_ms:.0f} ms, "
+          f"{args.tokens_per_s or 'unthrottled'} tok/s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()